@@ -6,13 +6,21 @@ import json
 from pathlib import Path
 from typing import Any
 
+from markdownkeeper.config import CacheConfig, SearchConfig
+from markdownkeeper.query.trace import QueryTrace
 from markdownkeeper.storage.repository import (
+    SearchFilters,
     find_documents_by_concept,
     get_document,
     search_documents,
     semantic_search_documents,
+    semantic_search_many,
+    semantic_search_passages,
 )
 
+# Upper bound on the number of queries in one query_many request.
+_MAX_BATCH_QUERIES = 50
+
 
 def _rpc_success(request_id: Any, result: dict[str, Any]) -> dict[str, Any]:
     return {"jsonrpc": "2.0", "result": result, "id": request_id}
@@ -22,7 +30,29 @@ def _rpc_error(request_id: Any, code: int, message: str) -> dict[str, Any]:
     return {"jsonrpc": "2.0", "error": {"code": code, "message": message}, "id": request_id}
 
 
-def build_handler(database_path: Path):
+def _name_list(value: Any) -> tuple[str, ...]:
+    if value is None:
+        return ()
+    if isinstance(value, str):
+        return (value,)
+    return tuple(str(item) for item in value)
+
+
+def _search_filters(params: dict[str, Any]) -> SearchFilters:
+    return SearchFilters(
+        category=str(params["category"]) if params.get("category") else None,
+        tags=_name_list(params.get("tags")),
+        concepts=_name_list(params.get("concepts")),
+        path_prefix=str(params["path_prefix"]) if params.get("path_prefix") else None,
+        updated_after=str(params["updated_after"]) if params.get("updated_after") else None,
+    )
+
+
+def build_handler(
+    database_path: Path,
+    cache_config: CacheConfig | None = None,
+    search_config: SearchConfig | None = None,
+):
     class Handler(BaseHTTPRequestHandler):
         def _write_json(self, status: int, payload: dict[str, Any]) -> None:
             body = json.dumps(payload).encode("utf-8")
@@ -59,7 +89,21 @@ def build_handler(database_path: Path):
                 max_results = min(int(params.get("max_results", 10)), 100)
                 include_content = bool(params.get("include_content", False))
                 max_tokens = min(int(params.get("max_tokens", 200)), 10_000)
-                docs = semantic_search_documents(database_path, query, limit=max(1, max_results))
+                trace = QueryTrace() if params.get("explain") else None
+                try:
+                    docs = semantic_search_documents(
+                        database_path,
+                        query,
+                        limit=max(1, max_results),
+                        cache_config=cache_config,
+                        filters=_search_filters(params),
+                        search_config=search_config,
+                        trace=trace,
+                    )
+                except ValueError as exc:
+                    # A search config the server was started with, e.g. an unknown pipeline.
+                    self._write_json(500, _rpc_error(request_id, -32603, str(exc)))
+                    return
                 documents: list[dict[str, Any]] = []
                 for item in docs:
                     payload = asdict(item)
@@ -74,14 +118,67 @@ def build_handler(database_path: Path):
                         payload["content"] = detail.content if detail else ""
                     documents.append(payload)
 
+                result: dict[str, Any] = {
+                    "query": query,
+                    "documents": documents,
+                    "count": len(docs),
+                }
+                if trace is not None:
+                    result["timings"] = trace.to_dict()
+                self._write_json(200, _rpc_success(request_id, result))
+                return
+
+            if self.path == "/api/v1/query_many" and method == "semantic_query_many":
+                queries = params.get("queries")
+                if not isinstance(queries, list) or not all(isinstance(item, str) for item in queries):
+                    self._write_json(400, _rpc_error(request_id, -32602, "queries must be a list of strings"))
+                    return
+                if len(queries) > _MAX_BATCH_QUERIES:
+                    self._write_json(400, _rpc_error(request_id, -32602, f"at most {_MAX_BATCH_QUERIES} queries per request"))
+                    return
+                max_results = min(int(params.get("max_results", 10)), 100)
+                try:
+                    batches = semantic_search_many(
+                        database_path,
+                        [item.strip() for item in queries],
+                        limit=max(1, max_results),
+                        cache_config=cache_config,
+                        search_config=search_config,
+                    )
+                except ValueError as exc:
+                    self._write_json(500, _rpc_error(request_id, -32603, str(exc)))
+                    return
+                self._write_json(
+                    200,
+                    _rpc_success(
+                        request_id,
+                        {
+                            "results": [
+                                {
+                                    "query": query.strip(),
+                                    "documents": [asdict(item) for item in docs],
+                                    "count": len(docs),
+                                }
+                                for query, docs in zip(queries, batches)
+                            ],
+                            "count": len(batches),
+                        },
+                    ),
+                )
+                return
+
+            if self.path == "/api/v1/passages" and method == "semantic_passages":
+                query = str(params.get("query", "")).strip()
+                max_results = min(int(params.get("max_results", 10)), 100)
+                passages = semantic_search_passages(database_path, query, limit=max(1, max_results))
                 self._write_json(
                     200,
                     _rpc_success(
                         request_id,
                         {
                             "query": query,
-                            "documents": documents,
-                            "count": len(docs),
+                            "passages": [asdict(item) for item in passages],
+                            "count": len(passages),
                         },
                     ),
                 )
@@ -127,6 +224,12 @@ def build_handler(database_path: Path):
     return Handler
 
 
-def run_api_server(host: str, port: int, database_path: Path) -> None:
-    server = ThreadingHTTPServer((host, port), build_handler(database_path))
+def run_api_server(
+    host: str,
+    port: int,
+    database_path: Path,
+    cache_config: CacheConfig | None = None,
+    search_config: SearchConfig | None = None,
+) -> None:
+    server = ThreadingHTTPServer((host, port), build_handler(database_path, cache_config, search_config))
     server.serve_forever()
@@ -1,19 +1,21 @@
 from __future__ import annotations
 
 import argparse
-from dataclasses import asdict
+from dataclasses import asdict, replace
 import json
 import sys
 from pathlib import Path
 
 from markdownkeeper.api.server import run_api_server
-from markdownkeeper.config import DEFAULT_CONFIG_PATH, load_config
+from markdownkeeper.config import DEFAULT_CONFIG_PATH, ConfigError, IndexConfig, load_config
 from markdownkeeper.daemon import reload_background, restart_background, start_background, status_background, stop_background
 from markdownkeeper.indexer.generator import generate_all_indexes
 from markdownkeeper.links.validator import validate_links
 from markdownkeeper.processor.parser import parse_markdown
+from markdownkeeper.query.embeddings import EMBEDDING_BATCH_SIZE
+from markdownkeeper.query.trace import QueryTrace
 from markdownkeeper.service import write_systemd_units
-from markdownkeeper.storage.repository import benchmark_semantic_queries, embedding_coverage, evaluate_semantic_precision, find_documents_by_concept, generate_health_report, get_document, regenerate_embeddings, search_documents, semantic_search_documents, system_stats, upsert_document
+from markdownkeeper.storage.repository import SearchFilters, benchmark_candidate_indexes, benchmark_chunk_embeddings, benchmark_fallback_candidates, check_candidate_index, benchmark_semantic_queries, embedding_coverage, evaluate_semantic_precision, find_documents_by_concept, generate_health_report, get_document, rebuild_search_index, regenerate_embeddings, search_documents, semantic_search_documents, semantic_search_passages, system_stats, upsert_document
 from markdownkeeper.storage.schema import initialize_database
 from markdownkeeper.watcher.service import is_watchdog_available, watch_loop, watch_loop_watchdog
 
@@ -47,6 +49,13 @@ def build_parser() -> argparse.ArgumentParser:
     query.add_argument("--include-content", action="store_true")
     query.add_argument("--max-tokens", type=int, default=200)
     query.add_argument("--search-mode", choices=["semantic", "lexical"], default="semantic")
+    query.add_argument("--granularity", choices=["document", "chunk"], default="document")
+    query.add_argument("--explain", action="store_true", help="Report per-stage timings and counts (semantic mode)")
+    query.add_argument("--category", type=str, default=None, help="Only documents in this category (semantic mode)")
+    query.add_argument("--tag", action="append", default=[], help="Require this tag; repeatable (semantic mode)")
+    query.add_argument("--concept", action="append", default=[], help="Require this concept; repeatable (semantic mode)")
+    query.add_argument("--path-prefix", type=str, default=None, help="Only documents whose stored path starts with this (semantic mode)")
+    query.add_argument("--updated-after", type=str, default=None, help="Only documents updated after this ISO-8601 timestamp (semantic mode)")
 
     get_doc = subparsers.add_parser("get-doc", help="Retrieve document metadata by id")
     get_doc.add_argument("id", type=int, help="Document id")
@@ -109,6 +118,20 @@ def build_parser() -> argparse.ArgumentParser:
     embeddings_generate = subparsers.add_parser("embeddings-generate", help="Generate/rebuild document embeddings")
     embeddings_generate.add_argument("--db-path", type=Path, default=None, help="Override DB path")
     embeddings_generate.add_argument("--model", type=str, default="all-MiniLM-L6-v2")
+    embeddings_generate.add_argument(
+        "--precision",
+        choices=["float32", "float16", "int8"],
+        default=None,
+        help="Store and hold vectors at this precision from now on",
+    )
+    embeddings_generate.add_argument(
+        "--batch-size", type=int, default=EMBEDDING_BATCH_SIZE, help="Documents encoded per model call"
+    )
+
+    search_index_rebuild = subparsers.add_parser(
+        "search-index-rebuild", help="Rebuild the full-text (BM25) search index from indexed documents"
+    )
+    search_index_rebuild.add_argument("--db-path", type=Path, default=None, help="Override DB path")
 
     embeddings_status = subparsers.add_parser("embeddings-status", help="Show embedding coverage")
     embeddings_status.add_argument("--db-path", type=Path, default=None, help="Override DB path")
@@ -119,6 +142,11 @@ def build_parser() -> argparse.ArgumentParser:
     embeddings_eval.add_argument("--db-path", type=Path, default=None, help="Override DB path")
     embeddings_eval.add_argument("--k", type=int, default=5)
     embeddings_eval.add_argument("--format", choices=["text", "json"], default="json")
+    embeddings_eval.add_argument(
+        "--compare-precision",
+        action="store_true",
+        help="Also report precision@k with vectors held at float32, float16 and int8",
+    )
 
     semantic_benchmark = subparsers.add_parser("semantic-benchmark", help="Run semantic latency/precision benchmark")
     semantic_benchmark.add_argument("cases_file", type=Path, help="JSON file with [{query, expected_ids}] entries")
@@ -126,6 +154,35 @@ def build_parser() -> argparse.ArgumentParser:
     semantic_benchmark.add_argument("--k", type=int, default=5)
     semantic_benchmark.add_argument("--iterations", type=int, default=3)
     semantic_benchmark.add_argument("--format", choices=["text", "json"], default="json")
+    semantic_benchmark.add_argument(
+        "--index-sizes",
+        type=str,
+        default=None,
+        help="Comma-separated synthetic corpus sizes (e.g. 10000,50000) for an index type comparison",
+    )
+    semantic_benchmark.add_argument(
+        "--fallback-sizes",
+        type=str,
+        default=None,
+        help="Comma-separated synthetic corpus sizes (e.g. 1000,10000) for a brute-force fallback comparison",
+    )
+    semantic_benchmark.add_argument(
+        "--embedding-batch-sizes",
+        type=str,
+        default=None,
+        help="Comma-separated batch sizes (e.g. 16,64) for a chunk embedding throughput comparison",
+    )
+    semantic_benchmark.add_argument(
+        "--pipeline",
+        choices=["blend", "staged"],
+        default=None,
+        help="Ranking pipeline to benchmark (default: [search] pipeline)",
+    )
+    semantic_benchmark.add_argument(
+        "--compare-pipeline",
+        action="store_true",
+        help="Also report precision@k of the staged pipeline against the full blend",
+    )
 
     stats = subparsers.add_parser("stats", help="Show operational metrics summary")
     stats.add_argument("--db-path", type=Path, default=None, help="Override DB path")
@@ -205,12 +262,67 @@ def _handle_scan_file(args: argparse.Namespace) -> int:
     return 0
 
 
+def _print_trace(trace: QueryTrace) -> None:
+    for name, elapsed_ms in trace.stages.items():
+        print(f"  {name}: {elapsed_ms:.3f} ms")
+    for name, value in trace.counts.items():
+        print(f"  {name}={value}")
+
+
+def _handle_passage_query(args: argparse.Namespace, db_path: Path, filters: SearchFilters) -> int:
+    trace = QueryTrace() if args.explain else None
+    passages = semantic_search_passages(db_path, args.query, limit=max(1, args.limit), filters=filters, trace=trace)
+    if args.format == "json":
+        output: dict[str, object] = {"query": args.query, "granularity": "chunk", "count": len(passages), "passages": [asdict(item) for item in passages]}
+        if trace is not None:
+            output["timings"] = trace.to_dict()
+        print(json.dumps(output, indent=2))
+    else:
+        if not passages:
+            print("No passages matched query")
+        for passage in passages:
+            print(f"[{passage.document_id}#{passage.chunk_index}] {passage.heading_path or passage.title} ({passage.path}) score={passage.score:.3f}")
+            print(passage.content)
+        if trace is not None:
+            _print_trace(trace)
+    return 0
+
+
 def _handle_query(args: argparse.Namespace) -> int:
+    filters = SearchFilters(
+        category=args.category,
+        tags=tuple(args.tag),
+        concepts=tuple(args.concept),
+        path_prefix=args.path_prefix,
+        updated_after=args.updated_after,
+    )
+    if args.search_mode == "lexical":
+        # Lexical search and chunk retrieval are separate paths; refuse options that
+        # only the semantic path honours rather than silently dropping them.
+        if args.granularity == "chunk":
+            print("--granularity chunk requires --search-mode semantic")
+            return 1
+        if args.explain or not filters.is_empty():
+            print("--explain and the filter options require --search-mode semantic")
+            return 1
     db_path = _resolve_db_path(args.config, args.db_path)
     initialize_database(db_path)
+    if args.granularity == "chunk":
+        return _handle_passage_query(args, db_path, filters)
     if args.search_mode == "semantic":
-        results = semantic_search_documents(db_path, args.query, limit=max(1, args.limit))
+        config = load_config(args.config)
+        trace = QueryTrace() if args.explain else None
+        results = semantic_search_documents(
+            db_path,
+            args.query,
+            limit=max(1, args.limit),
+            cache_config=config.cache,
+            filters=filters,
+            search_config=config.search,
+            trace=trace,
+        )
     else:
+        trace = None
         results = search_documents(db_path, args.query, limit=max(1, args.limit))
 
     docs_payload: list[dict[str, object]] = []
@@ -227,12 +339,17 @@ def _handle_query(args: argparse.Namespace) -> int:
         docs_payload.append(payload)
 
     if args.format == "json":
-        print(json.dumps({"query": args.query, "search_mode": args.search_mode, "count": len(results), "documents": docs_payload}, indent=2))
+        output: dict[str, object] = {"query": args.query, "search_mode": args.search_mode, "count": len(results), "documents": docs_payload}
+        if trace is not None:
+            output["timings"] = trace.to_dict()
+        print(json.dumps(output, indent=2))
     else:
         if not results:
             print("No documents matched query")
         for result in results:
             print(f"[{result.id}] {result.title} ({result.path})")
+        if trace is not None:
+            _print_trace(trace)
     return 0
 
 
@@ -305,10 +422,23 @@ def _handle_build_index(args: argparse.Namespace) -> int:
     return 0
 
 
+def _check_candidate_index(db_path: Path, index_config: IndexConfig) -> None:
+    status = check_candidate_index(db_path, index_config)
+    if status["status"] == "absent":
+        return
+    reason = f" ({status['reason']})" if status["reason"] else ""
+    print(
+        f"candidate index {status['status']}{reason}: generation={status['generation']} "
+        f"documents={status['documents']} changes={status['changes']}",
+        file=sys.stderr,
+    )
+
+
 def _handle_watch(args: argparse.Namespace) -> int:
     config = load_config(args.config)
     db_path = _resolve_db_path(args.config, args.db_path)
     initialize_database(db_path)
+    _check_candidate_index(db_path, config.index)
 
     roots = [Path(root) for root in config.watch.roots]
     mode = args.mode
@@ -348,10 +478,11 @@ def _handle_serve_api(args: argparse.Namespace) -> int:
     config = load_config(args.config)
     db_path = _resolve_db_path(args.config, args.db_path)
     initialize_database(db_path)
+    _check_candidate_index(db_path, config.index)
     host = args.host or config.api.host
     port = args.port or config.api.port
     print(f"Starting API server on {host}:{port}")
-    run_api_server(host, port, db_path)
+    run_api_server(host, port, db_path, cache_config=config.cache, search_config=config.search)
     return 0
 
 
@@ -423,8 +554,31 @@ def _handle_daemon_reload(args: argparse.Namespace) -> int:
 def _handle_embeddings_generate(args: argparse.Namespace) -> int:
     db_path = _resolve_db_path(args.config, args.db_path)
     initialize_database(db_path)
-    count = regenerate_embeddings(db_path, model_name=args.model)
-    print(f"Generated embeddings for {count} documents using model={args.model}")
+    try:
+        count = regenerate_embeddings(
+            db_path,
+            model_name=args.model,
+            precision=args.precision,
+            index_config=load_config(args.config).index,
+            batch_size=max(1, int(args.batch_size)),
+        )
+    except ValueError as exc:
+        print(str(exc))
+        return 1
+    suffix = f" precision={args.precision}" if args.precision else ""
+    print(f"Generated embeddings for {count} documents using model={args.model}{suffix}")
+    return 0
+
+
+def _handle_search_index_rebuild(args: argparse.Namespace) -> int:
+    db_path = _resolve_db_path(args.config, args.db_path)
+    initialize_database(db_path)
+    try:
+        count = rebuild_search_index(db_path)
+    except RuntimeError as exc:
+        print(str(exc))
+        return 1
+    print(f"Rebuilt search index for {count} documents")
     return 0
 
 
@@ -463,6 +617,11 @@ def _handle_report(args: argparse.Namespace) -> int:
     db_path = _resolve_db_path(args.config, args.db_path)
     initialize_database(db_path)
     report = generate_health_report(db_path)
+    tiers = report["cache_tiers"]
+    coverage = f"{report['embedding_coverage_pct']}%"
+    hit_miss = f"{tiers['memory_hits']} mem / {tiers['sqlite_hits']} db / {tiers['misses']} miss"
+    evictions = f"{tiers['memory_evictions']} mem / {tiers['sqlite_evictions']} db"
+    queue = f"{report['queue_queued']} queued / {report['queue_failed']} failed"
 
     if args.format == "json":
         print(json.dumps(report, indent=2))
@@ -477,10 +636,12 @@ def _handle_report(args: argparse.Namespace) -> int:
             f"│ Broken External Links: {report['broken_external_links']:<18}│",
             f"│ Unchecked External Links: {report['unchecked_external_links']:<15}│",
             f"│ Missing Summaries: {report['missing_summaries']:<22}│",
-            f"│ Embedding Coverage: {f'{report['embedding_coverage_pct']}%':<21}│",
+            f"│ Embedding Coverage: {coverage:<21}│",
             f"│ Cache Entries: {report['cache_entries']:<26}│",
             f"│ Cache Hits: {report['cache_total_hits']:<29}│",
-            f"│ Event Queue: {f'{report['queue_queued']} queued / {report['queue_failed']} failed':<28}│",
+            f"│ Cache Hit/Miss: {hit_miss:<25}│",
+            f"│ Cache Evictions: {evictions:<24}│",
+            f"│ Event Queue: {queue:<28}│",
             "└──────────────────────────────────────────┘",
         ]
         print("\n".join(lines))
@@ -499,20 +660,98 @@ def _handle_semantic_benchmark(args: argparse.Namespace) -> int:
         print("Cases file must be a JSON array")
         return 1
 
-    result = benchmark_semantic_queries(
-        db_path,
-        payload,
-        k=max(1, int(args.k)),
-        iterations=max(1, int(args.iterations)),
-    )
+    sizes: list[int] = []
+    if args.index_sizes:
+        try:
+            sizes = [int(item) for item in args.index_sizes.split(",") if item.strip()]
+        except ValueError:
+            print("--index-sizes must be comma-separated integers")
+            return 1
+    fallback_sizes: list[int] = []
+    if args.fallback_sizes:
+        try:
+            fallback_sizes = [int(item) for item in args.fallback_sizes.split(",") if item.strip()]
+        except ValueError:
+            print("--fallback-sizes must be comma-separated integers")
+            return 1
+    batch_sizes: list[int] = []
+    if args.embedding_batch_sizes:
+        try:
+            batch_sizes = [int(item) for item in args.embedding_batch_sizes.split(",") if item.strip()]
+        except ValueError:
+            print("--embedding-batch-sizes must be comma-separated integers")
+            return 1
+
+    search_config = load_config(args.config).search
+    if args.pipeline:
+        search_config = replace(search_config, pipeline=args.pipeline)
+    try:
+        result = benchmark_semantic_queries(
+            db_path,
+            payload,
+            k=max(1, int(args.k)),
+            iterations=max(1, int(args.iterations)),
+            search_config=search_config,
+        )
+    except ValueError as exc:
+        print(str(exc))
+        return 1
+    result["pipeline"] = search_config.pipeline
+    if args.compare_pipeline:
+        k = max(1, int(args.k))
+        blend = evaluate_semantic_precision(db_path, payload, k=k, search_config=replace(search_config, pipeline="blend"))
+        staged = evaluate_semantic_precision(db_path, payload, k=k, search_config=replace(search_config, pipeline="staged"))
+        result["pipeline_comparison"] = {
+            "blend": {"precision_at_k": blend["precision_at_k"]},
+            "staged": {
+                "precision_at_k": staged["precision_at_k"],
+                "delta": round(float(staged["precision_at_k"]) - float(blend["precision_at_k"]), 6),
+                "first_stage": search_config.first_stage,
+                "candidates": search_config.candidates,
+            },
+        }
+    if sizes:
+        result["index_tradeoff"] = benchmark_candidate_indexes(sizes, load_config(args.config).index)
+    if fallback_sizes:
+        result["fallback_search"] = benchmark_fallback_candidates(fallback_sizes)
+    if batch_sizes:
+        result["embedding_throughput"] = benchmark_chunk_embeddings(db_path, batch_sizes)
     if args.format == "json":
         print(json.dumps(result, indent=2))
     else:
         lat = result["latency_ms"]
         print(
             f"precision@{result['k']}={result['precision_at_k']:.3f} "
-            f"avg_ms={lat['avg']} p50_ms={lat['p50']} p95_ms={lat['p95']} max_ms={lat['max']}"
+            f"avg_ms={lat['avg']} p50_ms={lat['p50']} p95_ms={lat['p95']} max_ms={lat['max']} "
+            f"sql_avg={result['sql_statements']['avg']} sql_max={result['sql_statements']['max']}"
         )
+        for name, summary in result["stages_ms"].items():
+            print(f"  {name}: p50_ms={summary['p50']} p95_ms={summary['p95']} max_ms={summary['max']}")
+        if "pipeline_comparison" in result:
+            comparison = result["pipeline_comparison"]
+            print(
+                f"  pipeline blend precision@{result['k']}={comparison['blend']['precision_at_k']:.3f} "
+                f"staged precision@{result['k']}={comparison['staged']['precision_at_k']:.3f} "
+                f"delta={comparison['staged']['delta']:+.3f}"
+            )
+        if sizes and not result["index_tradeoff"]:
+            print("index comparison skipped: faiss-cpu is not installed")
+        for row in result.get("index_tradeoff", []):
+            print(
+                f"  index documents={row['documents']} type={row['index_type']} recall={row['recall_at_k']} "
+                f"p50_ms={row['latency_ms']['p50']} p95_ms={row['latency_ms']['p95']} build_ms={row['build_ms']}"
+            )
+        for row in result.get("fallback_search", []):
+            print(
+                f"  fallback documents={row['documents']} storage={row['storage']} "
+                f"p50_ms={row['latency_ms']['p50']} baseline_p50_ms={row['baseline_latency_ms']['p50']} "
+                f"speedup={row['speedup']}"
+            )
+        for row in result.get("embedding_throughput", []):
+            print(
+                f"  embeddings batch_size={row['batch_size'] or 'per-chunk'} chunks={row['chunks']} "
+                f"chunks_per_second={row['chunks_per_second']} speedup={row['speedup']} model={row['model']}"
+            )
     return 0
 
 
@@ -528,7 +767,17 @@ def _handle_embeddings_eval(args: argparse.Namespace) -> int:
         print("Cases file must be a JSON array")
         return 1
 
-    result = evaluate_semantic_precision(db_path, payload, k=max(1, int(args.k)))
+    k = max(1, int(args.k))
+    result = evaluate_semantic_precision(db_path, payload, k=k)
+    if args.compare_precision:
+        comparison: dict[str, dict[str, float]] = {}
+        for precision in ("float32", "float16", "int8"):
+            report = evaluate_semantic_precision(db_path, payload, k=k, precision=precision)
+            comparison[precision] = {"precision_at_k": float(report["precision_at_k"])}
+        baseline = comparison["float32"]["precision_at_k"]
+        for values in comparison.values():
+            values["delta"] = round(values["precision_at_k"] - baseline, 6)
+        result["precision_comparison"] = comparison
     if args.format == "json":
         print(json.dumps(result, indent=2))
     else:
@@ -536,6 +785,8 @@ def _handle_embeddings_eval(args: argparse.Namespace) -> int:
             f"precision@{result['k']}={result['precision_at_k']:.3f} "
             f"cases={result['cases']}"
         )
+        for precision, values in result.get("precision_comparison", {}).items():
+            print(f"  {precision}: precision@{result['k']}={values['precision_at_k']:.3f} delta={values['delta']:+.3f}")
     return 0
 
 def _handle_write_systemd(args: argparse.Namespace) -> int:
@@ -571,6 +822,7 @@ def main() -> int:
         "daemon-reload": _handle_daemon_reload,
         "embeddings-generate": _handle_embeddings_generate,
         "embeddings-status": _handle_embeddings_status,
+        "search-index-rebuild": _handle_search_index_rebuild,
         "embeddings-eval": _handle_embeddings_eval,
         "stats": _handle_stats,
         "report": _handle_report,
@@ -583,7 +835,12 @@ def main() -> int:
         parser.error(f"Unknown command: {args.command}")
         return 2
 
-    return handler(args)
+    try:
+        return handler(args)
+    except ConfigError as exc:
+        # load_config rejected a value; report it rather than a traceback.
+        print(f"Invalid config {args.config}: {exc}")
+        return 1
 
 
 if __name__ == "__main__":
@@ -36,6 +36,75 @@ class MetadataConfig:
 class CacheConfig:
     enabled: bool = True
     ttl_seconds: int = 3600
+    max_entries: int = 10_000
+    memory_max_entries: int = 256
+    memory_max_bytes: int = 4_194_304
+
+
+SEARCH_PIPELINES = ("blend", "staged")
+FIRST_STAGES = ("ann", "bm25", "rrf")
+INDEX_TYPES = ("flat", "ivf", "hnsw")
+
+
+class ConfigError(ValueError):
+    """A config file value outside its allowed set."""
+
+
+@dataclass(slots=True)
+class SearchConfig:
+    # Worker processes for semantic scoring; 0 or 1 scores in-process.
+    workers: int = 0
+    # Corpora with fewer document vectors than this are always scored in-process.
+    parallel_min_documents: int = 20_000
+    # "blend" scores every document with the full blend; "staged" blends only the
+    # candidates of a cheap first stage.
+    pipeline: str = "blend"
+    # Staged first stage: "ann" (document vectors), "bm25", or "rrf" (both, fused by rank).
+    first_stage: str = "rrf"
+    # Candidates the first stage passes on (at least the requested limit).
+    candidates: int = 200
+    # Reciprocal rank fusion constant: a document scores 1 / (rrf_k + rank) per list.
+    rrf_k: int = 60
+    # Second-stage blend weights.
+    vector_weight: float = 0.45
+    chunk_weight: float = 0.30
+    lexical_weight: float = 0.20
+    concept_weight: float = 0.05
+    freshness_bonus: float = 0.05
+
+    def ranking_key(self) -> str:
+        """Identifies the ranking this config produces; empty for the default blend."""
+        if self.pipeline != "staged":
+            return ""
+        return ":".join(
+            str(value)
+            for value in (
+                self.pipeline,
+                self.first_stage,
+                self.candidates,
+                self.rrf_k,
+                self.vector_weight,
+                self.chunk_weight,
+                self.lexical_weight,
+                self.concept_weight,
+                self.freshness_bonus,
+            )
+        )
+
+
+@dataclass(slots=True)
+class IndexConfig:
+    # FAISS candidate index: "flat" (exact), "ivf" or "hnsw" (approximate).
+    type: str = "flat"
+    # IVF inverted lists; 0 picks about 4 * sqrt(documents).
+    nlist: int = 0
+    # IVF lists probed per query.
+    nprobe: int = 8
+    # HNSW neighbours per node.
+    hnsw_m: int = 32
+    # HNSW candidate list size at query and build time.
+    ef_search: int = 64
+    ef_construction: int = 80
 
 
 @dataclass(slots=True)
@@ -45,6 +114,8 @@ class AppConfig:
     api: ApiConfig = field(default_factory=ApiConfig)
     metadata: MetadataConfig = field(default_factory=MetadataConfig)
     cache: CacheConfig = field(default_factory=CacheConfig)
+    search: SearchConfig = field(default_factory=SearchConfig)
+    index: IndexConfig = field(default_factory=IndexConfig)
 
 
 DEFAULT_CONFIG_PATH = Path("markdownkeeper.toml")
@@ -62,6 +133,18 @@ def load_config(path: Path = DEFAULT_CONFIG_PATH) -> AppConfig:
     api = raw.get("api", {})
     metadata = raw.get("metadata", {})
     cache = raw.get("cache", {})
+    search = raw.get("search", {})
+    index = raw.get("index", {})
+
+    pipeline = str(search.get("pipeline", "blend")).lower()
+    if pipeline not in SEARCH_PIPELINES:
+        raise ConfigError(f"unknown search pipeline: {pipeline}")
+    first_stage = str(search.get("first_stage", "rrf")).lower()
+    if first_stage not in FIRST_STAGES:
+        raise ConfigError(f"unknown first stage: {first_stage}")
+    index_type = str(index.get("type", "flat")).lower()
+    if index_type not in INDEX_TYPES:
+        raise ConfigError(f"unknown index type: {index_type}")
 
     return AppConfig(
         watch=WatchConfig(
@@ -83,5 +166,29 @@ def load_config(path: Path = DEFAULT_CONFIG_PATH) -> AppConfig:
         cache=CacheConfig(
             enabled=bool(cache.get("enabled", True)),
             ttl_seconds=int(cache.get("ttl_seconds", 3600)),
+            max_entries=int(cache.get("max_entries", 10_000)),
+            memory_max_entries=int(cache.get("memory_max_entries", 256)),
+            memory_max_bytes=int(cache.get("memory_max_bytes", 4_194_304)),
+        ),
+        search=SearchConfig(
+            workers=int(search.get("workers", 0)),
+            parallel_min_documents=int(search.get("parallel_min_documents", 20_000)),
+            pipeline=pipeline,
+            first_stage=first_stage,
+            candidates=int(search.get("candidates", 200)),
+            rrf_k=int(search.get("rrf_k", 60)),
+            vector_weight=float(search.get("vector_weight", 0.45)),
+            chunk_weight=float(search.get("chunk_weight", 0.30)),
+            lexical_weight=float(search.get("lexical_weight", 0.20)),
+            concept_weight=float(search.get("concept_weight", 0.05)),
+            freshness_bonus=float(search.get("freshness_bonus", 0.05)),
+        ),
+        index=IndexConfig(
+            type=index_type,
+            nlist=int(index.get("nlist", 0)),
+            nprobe=int(index.get("nprobe", 8)),
+            hnsw_m=int(index.get("hnsw_m", 32)),
+            ef_search=int(index.get("ef_search", 64)),
+            ef_construction=int(index.get("ef_construction", 80)),
         ),
     )
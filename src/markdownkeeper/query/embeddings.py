@@ -1,23 +1,87 @@
 from __future__ import annotations
 
+from collections import OrderedDict
 import hashlib
 import math
 import re
-from typing import Iterable
+import threading
+import time
+from typing import Callable, Iterable, Sequence
 
 
 _MODEL_CACHE: dict[str, object] = {}
 
+QUERY_EMBEDDING_CACHE_SIZE = 1024
+EMBEDDING_BATCH_SIZE = 64
+
+
+class _EmbeddingLRU:
+    """Bounded, thread-safe LRU of ``(model_name, normalized text) -> (vector, model)``."""
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._drained = (0, 0)
+        self._entries: OrderedDict[tuple[str, str], tuple[tuple[float, ...], str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple[str, str]) -> tuple[tuple[float, ...], str] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: tuple[str, str], value: tuple[tuple[float, ...], str]) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self._drained = (0, 0)
+
+    def drain(self) -> tuple[int, int]:
+        """Hits and misses since the previous call."""
+        with self._lock:
+            hits, misses = self.hits - self._drained[0], self.misses - self._drained[1]
+            self._drained = (self.hits, self.misses)
+            return hits, misses
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+_QUERY_EMBEDDINGS = _EmbeddingLRU(QUERY_EMBEDDING_CACHE_SIZE)
+
 
 def _tokenize(text: str) -> set[str]:
     return {token for token in re.findall(r"[a-z0-9]+", text.lower()) if len(token) > 1}
 
 
-def _hash_embedding(text: str, dimensions: int = 64) -> list[float]:
+def _token_bucket(token: str, dimensions: int) -> int:
+    digest = hashlib.sha256(token.encode("utf-8")).digest()
+    return int.from_bytes(digest[:2], "big") % dimensions
+
+
+def _bucket_vector(buckets: Iterable[int], dimensions: int) -> list[float]:
     vector = [0.0] * dimensions
-    for token in _tokenize(text):
-        digest = hashlib.sha256(token.encode("utf-8")).digest()
-        bucket = int.from_bytes(digest[:2], "big") % dimensions
+    for bucket in buckets:
         vector[bucket] += 1.0
 
     norm = math.sqrt(sum(value * value for value in vector))
@@ -26,6 +90,23 @@ def _hash_embedding(text: str, dimensions: int = 64) -> list[float]:
     return [value / norm for value in vector]
 
 
+def _hash_embedding(text: str, dimensions: int = 64) -> list[float]:
+    return _bucket_vector((_token_bucket(token, dimensions) for token in _tokenize(text)), dimensions)
+
+
+def _hash_embeddings(texts: Sequence[str], dimensions: int = 64) -> list[list[float]]:
+    """``_hash_embedding`` for several texts, hashing each distinct token once per batch."""
+    buckets: dict[str, int] = {}
+    vectors: list[list[float]] = []
+    for text in texts:
+        tokens = _tokenize(text)
+        for token in tokens:
+            if token not in buckets:
+                buckets[token] = _token_bucket(token, dimensions)
+        vectors.append(_bucket_vector((buckets[token] for token in tokens), dimensions))
+    return vectors
+
+
 def _normalize(vector: Iterable[float]) -> list[float]:
     values = [float(item) for item in vector]
     norm = math.sqrt(sum(value * value for value in values))
@@ -65,6 +146,139 @@ def compute_embedding(text: str, model_name: str = "all-MiniLM-L6-v2") -> tuple[
         return _hash_embedding(text), "token-hash-v1"
 
 
+def compute_embeddings(
+    texts: Sequence[str],
+    model_name: str = "all-MiniLM-L6-v2",
+    batch_size: int = EMBEDDING_BATCH_SIZE,
+) -> tuple[list[list[float]], str]:
+    """``compute_embedding`` for several texts with a single model ``encode`` call.
+
+    The model runs ``batch_size`` texts per forward pass. Every vector comes from the
+    same model: if encoding fails, the whole batch falls back to the hash baseline.
+    """
+    if not texts:
+        return [], model_name
+    model = _load_model(model_name)
+    if model is None:
+        return _hash_embeddings(texts), "token-hash-v1"
+
+    try:
+        vectors = model.encode(
+            [text or "" for text in texts], batch_size=max(1, batch_size), normalize_embeddings=True
+        )
+        return [_normalize(vector) for vector in vectors], model_name
+    except Exception:
+        return _hash_embeddings(texts), "token-hash-v1"
+
+
+def benchmark_embedding_throughput(
+    texts: Sequence[str],
+    batch_sizes: Sequence[int],
+    model_name: str = "all-MiniLM-L6-v2",
+) -> list[dict[str, object]]:
+    """Texts encoded per second, one ``compute_embedding`` call per text against
+    ``compute_embeddings`` at each batch size.
+
+    The first row (``batch_size`` 0) is the per-text baseline; ``speedup`` compares each
+    batched run with it. ``model`` is the model that actually produced the vectors.
+    """
+    if not texts:
+        return []
+
+    def run(encode: Callable[[], str]) -> tuple[float, str]:
+        start = time.perf_counter()
+        resolved = encode()
+        return time.perf_counter() - start, resolved
+
+    def sequential() -> str:
+        resolved = model_name
+        for text in texts:
+            _, resolved = compute_embedding(text, model_name=model_name)
+        return resolved
+
+    # Load the model outside the timed runs.
+    compute_embedding("", model_name=model_name)
+    baseline_seconds, resolved = run(sequential)
+    rows: list[tuple[int, float, str]] = [(0, baseline_seconds, resolved)]
+    for batch_size in batch_sizes:
+        size = max(1, int(batch_size))
+        seconds, resolved = run(lambda: compute_embeddings(texts, model_name=model_name, batch_size=size)[1])
+        rows.append((size, seconds, resolved))
+
+    return [
+        {
+            "batch_size": size,
+            "texts": len(texts),
+            "model": resolved,
+            "seconds": round(seconds, 4),
+            "texts_per_second": round(len(texts) / seconds, 1) if seconds > 0 else 0.0,
+            "speedup": round(baseline_seconds / seconds, 2) if seconds > 0 else 0.0,
+        }
+        for size, seconds, resolved in rows
+    ]
+
+
+def compute_query_embedding(text: str, model_name: str = "all-MiniLM-L6-v2") -> tuple[list[float], str]:
+    """``compute_embedding`` behind the process-wide query LRU.
+
+    Keyed by model name and whitespace-normalized text. The LRU is independent of the
+    SQLite result cache, so it stays warm when document writes invalidate results.
+    Document and chunk encodes call ``compute_embeddings`` directly so they never evict
+    hot queries. Hash-fallback vectors are not cached, so a query encoded while the model
+    was unavailable is encoded by the model once it works.
+    """
+    key = (model_name, " ".join(text.split()))
+    cached = _QUERY_EMBEDDINGS.get(key)
+    if cached is not None:
+        return list(cached[0]), cached[1]
+    vector, resolved_model = compute_embedding(key[1], model_name=model_name)
+    if resolved_model == model_name:
+        _QUERY_EMBEDDINGS.put(key, (tuple(vector), resolved_model))
+    return vector, resolved_model
+
+
+def compute_query_embeddings(
+    texts: Sequence[str], model_name: str = "all-MiniLM-L6-v2"
+) -> tuple[list[list[float]], str]:
+    """``compute_query_embedding`` for several queries; LRU misses are encoded in one batch."""
+    keys = [(model_name, " ".join(text.split())) for text in texts]
+    vectors: list[list[float] | None] = [None] * len(keys)
+    resolved_model = model_name
+    missing: dict[tuple[str, str], list[int]] = {}
+    for position, key in enumerate(keys):
+        cached = _QUERY_EMBEDDINGS.get(key)
+        if cached is not None:
+            vectors[position], resolved_model = list(cached[0]), cached[1]
+        else:
+            missing.setdefault(key, []).append(position)
+
+    if missing:
+        encoded, resolved_model = compute_embeddings([key[1] for key in missing], model_name=model_name)
+        if resolved_model != model_name and len(missing) < len(keys):
+            # The misses fell back to hashing; hash the cached queries too so every
+            # vector in the batch comes from the same model.
+            return _hash_embeddings([key[1] for key in keys]), resolved_model
+        for (key, positions), vector in zip(missing.items(), encoded):
+            if resolved_model == model_name:
+                _QUERY_EMBEDDINGS.put(key, (tuple(vector), resolved_model))
+            for position in positions:
+                vectors[position] = list(vector)
+    return [vector or [] for vector in vectors], resolved_model
+
+
+def query_embedding_cache_stats() -> dict[str, int]:
+    return _QUERY_EMBEDDINGS.stats()
+
+
+def drain_query_embedding_counts() -> tuple[int, int]:
+    """Query LRU ``(hits, misses)`` since the previous call, for persisting elsewhere."""
+    return _QUERY_EMBEDDINGS.drain()
+
+
+def clear_query_embedding_cache() -> None:
+    _QUERY_EMBEDDINGS.clear()
+
+
 def cosine_similarity(left: list[float], right: list[float]) -> float:
     if len(left) != len(right) or not left or not right:
         return 0.0
@@ -1,127 +1,732 @@
 """Optional FAISS-backed vector index for accelerated similarity search.
 
-Used by repository.py to rebuild a FAISS index after embedding regeneration.
-Falls back to brute-force cosine similarity when faiss-cpu is not installed.
+Used by repository.py to rebuild a FAISS index after embedding regeneration and
+to generate semantic query candidates from the saved index. Falls back to brute-force cosine similarity when faiss-cpu is not installed.
 If this module's API changes, update the import in storage/repository.py.
+
+Without FAISS the index falls back to exact search over unit-normalized vectors kept in
+one contiguous buffer (a NumPy array when NumPy is installed, ``array('f')``
+otherwise), scored a block of rows at a time into a k-entry heap.
+
+The index type comes from ``IndexConfig``: ``flat`` is exact and linear in corpus
+size; ``ivf`` (inverted lists, trained on the embeddings being indexed) and ``hnsw``
+(navigable small-world graph) trade a little recall for sub-linear search. The type
+and its parameters are saved with the index, so a loaded index searches exactly as
+it was built.
 """
 
 from __future__ import annotations
 
+from array import array
+import heapq
 import json
 import math
+import mmap
+import os
 from pathlib import Path
+import random
+import statistics
+import struct
+import sys
+import time
+from typing import Sequence
+import zlib
+
+from markdownkeeper.config import INDEX_TYPES, IndexConfig
+from markdownkeeper.query.vector_store import _dot
+from markdownkeeper.storage.files import atomic_file
 
 try:
-    import faiss  # type: ignore[import-untyped]
     import numpy as np  # type: ignore[import-untyped]
 except ImportError:
-    faiss = None
     np = None
 
+try:
+    import faiss  # type: ignore[import-untyped]
+except ImportError:
+    faiss = None
+
+
+# FAISS wants about this many training vectors per IVF list; with fewer documents the
+# list count is reduced, and below two lists a flat index is built instead.
+_IVF_TRAINING_PER_LIST = 39
+
+
+# Labels and parameters saved next to a FAISS index.
+META_SUFFIX = ".meta.json"
+
+# Rows the brute-force fallback scores at once; only one block of scores is held per query.
+_SEARCH_BLOCK_ROWS = 4096
+
+# Binary file the brute-force fallback is saved to, next to where FAISS would write.
+# Little-endian: a 32-byte header (magic b"MKFI", version uint8, reserved uint8,
+# model name length uint16, dims uint32, count uint64, generation int64, CRC-32 of
+# everything after the header uint32), the UTF-8 model name padded to 8 bytes, count
+# int64 document ids, then count x dims float32 unit vectors.
+FALLBACK_SUFFIX = ".fallback"
+_FALLBACK_MAGIC = b"MKFI"
+_FALLBACK_VERSION = 1
+_FALLBACK_HEADER = struct.Struct("<4sBBHIQqI")
+
 
 def is_faiss_available() -> bool:
     return faiss is not None and np is not None
 
 
+def _unit(vector: Sequence[float]) -> list[float]:
+    norm = math.sqrt(_dot(vector, vector))
+    if norm == 0.0:
+        return [float(value) for value in vector]
+    return [value / norm for value in vector]
+
+
+class _BruteForceVectors:
+    """Unit-normalized vectors in fixed-size slots of one contiguous float32 buffer.
+
+    Vectors are normalized once when added, so a search is a dot product per row.
+    Removed slots go on a free list and are reused by later additions.
+    """
+
+    def __init__(self, dimensions: int) -> None:
+        self.dimensions = dimensions
+        self._ids: list[int | None] = []
+        self._free: list[int] = []
+        if np is not None:
+            self._rows: object = np.zeros((0, dimensions), dtype=np.float32)
+            self._live: object = np.zeros(0, dtype=bool)
+        else:
+            self._rows = array("f")
+            self._live = None
+
+    def __len__(self) -> int:
+        return len(self._ids) - len(self._free)
+
+    @property
+    def slot_count(self) -> int:
+        return len(self._ids)
+
+    def _ensure_capacity(self, slots: int) -> None:
+        capacity = int(self._rows.shape[0])  # type: ignore[attr-defined]
+        if slots <= capacity:
+            return
+        rows = np.zeros((max(slots, capacity * 2, 64), self.dimensions), dtype=np.float32)
+        rows[:capacity] = self._rows
+        live = np.zeros(rows.shape[0], dtype=bool)
+        live[:capacity] = self._live
+        self._rows, self._live = rows, live
+
+    def add(self, doc_id: int, vector: Sequence[float]) -> int:
+        """Store ``vector`` (normalized) for ``doc_id`` and return its slot."""
+        if self._free:
+            slot = self._free.pop()
+            self._ids[slot] = doc_id
+        else:
+            slot = len(self._ids)
+            self._ids.append(doc_id)
+        if np is not None:
+            self._ensure_capacity(slot + 1)
+            row = np.asarray(vector, dtype=np.float32)
+            norm = float(np.linalg.norm(row))
+            self._rows[slot] = row / norm if norm else row  # type: ignore[index]
+            self._live[slot] = True  # type: ignore[index]
+        else:
+            values = array("f", _unit(vector))
+            start = slot * self.dimensions
+            if start == len(self._rows):  # type: ignore[arg-type]
+                self._rows.extend(values)  # type: ignore[attr-defined]
+            else:
+                self._rows[start : start + self.dimensions] = values  # type: ignore[index]
+        return slot
+
+    def remove(self, slot: int) -> None:
+        self._ids[slot] = None
+        self._free.append(slot)
+        if self._live is not None:
+            self._live[slot] = False  # type: ignore[index]
+
+    def packed(self) -> tuple[list[int], bytes]:
+        """Ids of the occupied slots and their rows as little-endian float32 bytes."""
+        if np is not None:
+            slots = np.flatnonzero(self._live[: len(self._ids)])  # type: ignore[index]
+            ids = [int(self._ids[slot]) for slot in slots.tolist()]  # type: ignore[arg-type]
+            return ids, self._rows[slots].astype("<f4").tobytes()  # type: ignore[index]
+        dims = self.dimensions
+        ids = []
+        rows = array("f")
+        for slot, doc_id in enumerate(self._ids):
+            if doc_id is not None:
+                ids.append(doc_id)
+                rows.extend(self._rows[slot * dims : (slot + 1) * dims])  # type: ignore[index]
+        if sys.byteorder != "little":
+            rows.byteswap()
+        return ids, rows.tobytes()
+
+    @classmethod
+    def from_rows(cls, dimensions: int, ids: list[int], rows: memoryview) -> "_BruteForceVectors":
+        """Store over already-normalized little-endian float32 ``rows`` (as from ``packed``), copied once."""
+        store = cls(dimensions)
+        store._ids = list(ids)
+        if np is not None:
+            count = len(ids)
+            store._rows = np.frombuffer(rows, dtype="<f4", count=count * dimensions).astype(np.float32).reshape(count, dimensions)
+            store._live = np.ones(count, dtype=bool)
+        else:
+            store._rows.frombytes(rows)  # type: ignore[attr-defined]
+            if sys.byteorder != "little":
+                store._rows.byteswap()  # type: ignore[attr-defined]
+        return store
+
+    def entries(self) -> list[tuple[int, list[float]]]:
+        """``(doc_id, normalized vector)`` for every occupied slot."""
+        dims = self.dimensions
+        if np is not None:
+            return [
+                (doc_id, self._rows[slot].tolist())  # type: ignore[index]
+                for slot, doc_id in enumerate(self._ids)
+                if doc_id is not None
+            ]
+        return [
+            (doc_id, self._rows[slot * dims : (slot + 1) * dims].tolist())  # type: ignore[index, attr-defined]
+            for slot, doc_id in enumerate(self._ids)
+            if doc_id is not None
+        ]
+
+    def search(self, query_vector: Sequence[float], k: int) -> list[tuple[int, float]]:
+        """Exact top ``k`` by cosine similarity, scored ``_SEARCH_BLOCK_ROWS`` rows at a time."""
+        if k <= 0 or not len(self) or len(query_vector) != self.dimensions:
+            return []
+        heap: list[tuple[float, int]] = []
+        slots = len(self._ids)
+        if np is not None:
+            q = np.asarray(query_vector, dtype=np.float32)
+            norm = float(np.linalg.norm(q))
+            if norm:
+                q = q / norm
+            for start in range(0, slots, _SEARCH_BLOCK_ROWS):
+                end = min(slots, start + _SEARCH_BLOCK_ROWS)
+                scores = self._rows[start:end] @ q  # type: ignore[index]
+                scores[~self._live[start:end]] = -np.inf  # type: ignore[index, operator]
+                if k < end - start:
+                    best = np.argpartition(-scores, k - 1)[:k]
+                else:
+                    best = np.arange(end - start)
+                for offset, score in zip(best.tolist(), scores[best].tolist()):
+                    doc_id = self._ids[start + offset]
+                    if doc_id is None:
+                        continue
+                    if len(heap) < k:
+                        heapq.heappush(heap, (score, doc_id))
+                    elif (score, doc_id) > heap[0]:
+                        heapq.heapreplace(heap, (score, doc_id))
+        else:
+            dims = self.dimensions
+            q_values = array("f", _unit(query_vector))
+            with memoryview(self._rows) as view:  # type: ignore[arg-type]
+                for start in range(0, slots, _SEARCH_BLOCK_ROWS):
+                    block = [
+                        (_dot(view[slot * dims : (slot + 1) * dims], q_values), doc_id)
+                        for slot, doc_id in enumerate(self._ids[start : start + _SEARCH_BLOCK_ROWS], start)
+                        if doc_id is not None
+                    ]
+                    for entry in heapq.nlargest(k, block):
+                        if len(heap) < k:
+                            heapq.heappush(heap, entry)
+                        elif entry > heap[0]:
+                            heapq.heapreplace(heap, entry)
+        return [(doc_id, score) for score, doc_id in sorted(heap, reverse=True)]
+
+
 class FaissIndex:
-    """Optional FAISS-backed vector index. Falls back to brute-force when FAISS not installed."""
+    """Optional FAISS-backed vector index. Falls back to brute-force when FAISS not installed.
+
+    Documents can be added, replaced and removed in place. FAISS vectors carry internal
+    labels mapped to document ids; an HNSW graph cannot delete vectors, so removed
+    labels stay in it as tombstones that searches skip. The brute-force fallback keeps
+    vectors in a compact slot list and reuses freed slots.
+    """
 
-    def __init__(self) -> None:
+    def __init__(self, config: IndexConfig | None = None) -> None:
+        self.config = config or IndexConfig()
+        if self.config.type not in INDEX_TYPES:
+            raise ValueError(f"unknown index type: {self.config.type}")
         self._index: object | None = None
-        self._id_map: list[int] = []
-        self._embeddings: list[tuple[int, list[float]]] = []
         self._dimensions: int = 0
+        # Document id -> FAISS label (or fallback slot), and FAISS label -> document id.
+        self._labels: dict[int, int] = {}
+        self._documents: dict[int, int] = {}
+        self._next_label = 0
+        self._tombstones = 0
+        # False for indexes saved before labels existed; those can only be rebuilt.
+        self._mutable = True
+        self._fallback: _BruteForceVectors | None = None
+        # Type and parameters of the index actually built or loaded.
+        self.index_type = "flat"
+        self.parameters: dict[str, int] = {}
+        # document_changes generation the index was built from; -1 when unknown.
+        self.generation: int = -1
+        # Embedding model the indexed vectors came from; empty when unknown.
+        self.model_name = ""
+
+    def __len__(self) -> int:
+        return len(self._labels)
+
+    def __contains__(self, doc_id: object) -> bool:
+        return doc_id in self._labels
+
+    @property
+    def dimensions(self) -> int:
+        return self._dimensions
+
+    @property
+    def tombstones(self) -> int:
+        """Removed vectors still held by an HNSW graph (rebuild to reclaim them)."""
+        return self._tombstones
+
+    def _reset(self) -> None:
+        self._index = None
+        self._dimensions = 0
+        self._labels = {}
+        self._documents = {}
+        self._next_label = 0
+        self._tombstones = 0
+        self._mutable = True
+        self._fallback = None
+        self.index_type = "flat"
+        self.parameters = {}
 
     def build(self, embeddings: list[tuple[int, list[float]]]) -> None:
-        self._embeddings = list(embeddings)
+        self._reset()
         if not embeddings:
-            self._index = None
-            self._id_map = []
-            self._dimensions = 0
             return
-
         self._dimensions = len(embeddings[0][1])
-        self._id_map = [doc_id for doc_id, _ in embeddings]
+        if is_faiss_available():
+            vectors = self._unit_rows([vec for _, vec in embeddings])
+            self._index = self._build_index(vectors)
+            self._add_rows([doc_id for doc_id, _ in embeddings], vectors)
+        else:
+            for doc_id, vec in embeddings:
+                self._add_slot(doc_id, vec)
+
+    @staticmethod
+    def _unit_rows(vectors: list[list[float]]) -> object:
+        rows = np.array(vectors, dtype=np.float32).reshape(len(vectors), -1)
+        faiss.normalize_L2(rows)
+        return rows
+
+    def _build_index(self, vectors: object) -> object:
+        """An empty index of the configured type, trained on ``vectors`` when it needs training."""
+        count, dimensions = vectors.shape  # type: ignore[attr-defined]
+        if self.config.type == "ivf":
+            nlist = self.config.nlist or int(4 * math.sqrt(count))
+            nlist = min(nlist, count // _IVF_TRAINING_PER_LIST)
+            if nlist >= 2:
+                quantizer = faiss.IndexFlatIP(dimensions)
+                index = faiss.IndexIVFFlat(quantizer, dimensions, nlist, faiss.METRIC_INNER_PRODUCT)
+                index.train(vectors)
+                self.index_type = "ivf"
+                self.parameters = {"nlist": nlist, "nprobe": max(1, min(self.config.nprobe, nlist))}
+                self._apply_search_parameters(index)
+                return index
+        elif self.config.type == "hnsw":
+            m = max(2, self.config.hnsw_m)
+            graph = faiss.IndexHNSWFlat(dimensions, m, faiss.METRIC_INNER_PRODUCT)
+            graph.hnsw.efConstruction = max(1, self.config.ef_construction)
+            self.index_type = "hnsw"
+            self.parameters = {
+                "hnsw_m": m,
+                "ef_construction": max(1, self.config.ef_construction),
+                "ef_search": max(1, self.config.ef_search),
+            }
+            self._apply_search_parameters(graph)
+            return faiss.IndexIDMap2(graph)
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(dimensions))
+
+    def _apply_search_parameters(self, index: object) -> None:
+        if self.index_type == "ivf":
+            faiss.extract_index_ivf(index).nprobe = int(self.parameters["nprobe"])
+        elif self.index_type == "hnsw":
+            graph = faiss.downcast_index(index.index) if hasattr(index, "id_map") else index  # type: ignore[attr-defined]
+            graph.hnsw.efSearch = int(self.parameters["ef_search"])
 
+    def _add_rows(self, doc_ids: list[int], vectors: object) -> None:
+        labels = list(range(self._next_label, self._next_label + len(doc_ids)))
+        self._next_label += len(doc_ids)
+        for doc_id, label in zip(doc_ids, labels):
+            self._labels[doc_id] = label
+            self._documents[label] = doc_id
+        self._index.add_with_ids(vectors, np.asarray(labels, dtype=np.int64))  # type: ignore[attr-defined]
+
+    def _add_slot(self, doc_id: int, vector: Sequence[float]) -> None:
+        if self._fallback is None:
+            self._fallback = _BruteForceVectors(len(vector))
+        self._labels[doc_id] = self._fallback.add(doc_id, vector)
+
+    def add(self, ids: list[int], vectors: list[list[float]]) -> bool:
+        """Add documents, replacing any already indexed under the same ids.
+
+        Returns False (changing nothing) for an index saved before in-place updates were
+        supported; such an index has to be rebuilt. Raises ValueError for vectors whose
+        length differs from the index's.
+        """
+        if not self._mutable:
+            return False
+        if not ids:
+            return True
+        dimensions = self._dimensions or len(vectors[0])
+        if len(ids) != len(vectors) or any(len(vec) != dimensions for vec in vectors):
+            raise ValueError("vectors must match the ids and the index dimensions")
+        self.remove([doc_id for doc_id in ids if doc_id in self._labels])
+        self._dimensions = dimensions
         if is_faiss_available():
-            vectors = np.array([vec for _, vec in embeddings], dtype=np.float32)
-            faiss.normalize_L2(vectors)
-            index = faiss.IndexFlatIP(self._dimensions)
-            index.add(vectors)
-            self._index = index
+            doc_ids = list(ids)
+            if self._index is None and self._fallback is not None:
+                # Loaded from a fallback file: move its vectors into the FAISS index too,
+                # or every document indexed before would drop out of the search.
+                moved = self._fallback.entries()
+                self._fallback = None
+                self._labels = {}
+                doc_ids = [doc_id for doc_id, _ in moved] + doc_ids
+                vectors = [vec for _, vec in moved] + list(vectors)
+            rows = self._unit_rows(vectors)
+            if self._index is None:
+                self._index = self._build_index(rows)
+            self._add_rows(doc_ids, rows)
         else:
-            self._index = None
+            for doc_id, vec in zip(ids, vectors):
+                self._add_slot(doc_id, vec)
+        return True
+
+    def update(self, ids: list[int], vectors: list[list[float]]) -> bool:
+        """Replace the vectors of ``ids`` (adding those not indexed yet)."""
+        return self.add(ids, vectors)
+
+    def remove(self, ids: list[int]) -> bool:
+        """Drop ``ids`` from the index; unknown ids are ignored. False as for ``add``."""
+        if not self._mutable:
+            return False
+        labels = [self._labels.pop(doc_id) for doc_id in ids if doc_id in self._labels]
+        if not labels:
+            return True
+        if is_faiss_available() and self._index is not None:
+            for label in labels:
+                self._documents.pop(label, None)
+            if self.index_type == "hnsw":
+                self._tombstones += len(labels)
+            else:
+                self._index.remove_ids(np.asarray(labels, dtype=np.int64))  # type: ignore[attr-defined]
+        elif self._fallback is not None:
+            for slot in labels:
+                self._fallback.remove(slot)
+        if not self._labels:
+            self._reset()
+        return True
 
     def search(self, query_vector: list[float], k: int = 10) -> list[tuple[int, float]]:
-        if not self._id_map:
+        if not self._labels:
             return []
 
-        k = min(k, len(self._id_map))
+        k = min(k, len(self._labels))
 
         if is_faiss_available() and self._index is not None:
             q = np.array([query_vector], dtype=np.float32)
             faiss.normalize_L2(q)
-            distances, indices = self._index.search(q, k)
+            fetch = min(k + self._tombstones, int(self._index.ntotal))  # type: ignore[attr-defined]
+            distances, labels = self._index.search(q, fetch)  # type: ignore[attr-defined]
             results: list[tuple[int, float]] = []
-            for i in range(k):
-                idx = int(indices[0][i])
-                if idx < 0 or idx >= len(self._id_map):
+            for label, distance in zip(labels[0].tolist(), distances[0].tolist()):
+                doc_id = self._documents.get(label)
+                if doc_id is None:
                     continue
-                results.append((self._id_map[idx], float(distances[0][i])))
+                results.append((doc_id, float(distance)))
+                if len(results) == k:
+                    break
             return results
 
-        # Brute-force fallback
-        return self._brute_force_search(query_vector, k)
-
-    def _brute_force_search(self, query_vector: list[float], k: int) -> list[tuple[int, float]]:
-        q_norm = self._normalize(query_vector)
-        scored: list[tuple[float, int]] = []
-        for doc_id, vec in self._embeddings:
-            v_norm = self._normalize(vec)
-            sim = sum(a * b for a, b in zip(q_norm, v_norm))
-            scored.append((sim, doc_id))
-        scored.sort(reverse=True)
-        return [(doc_id, score) for score, doc_id in scored[:k]]
-
-    @staticmethod
-    def _normalize(vector: list[float]) -> list[float]:
-        norm = math.sqrt(sum(v * v for v in vector))
-        if norm == 0.0:
-            return vector
-        return [v / norm for v in vector]
+        if self._fallback is None:
+            return []
+        return self._fallback.search(query_vector, k)
 
     def save(self, path: Path) -> None:
         path.parent.mkdir(parents=True, exist_ok=True)
         if is_faiss_available() and self._index is not None:
-            faiss.write_index(self._index, str(path))
-            meta_path = path.with_suffix(".meta.json")
-            meta_path.write_text(
-                json.dumps({"id_map": self._id_map, "dimensions": self._dimensions}),
-                encoding="utf-8",
-            )
-        else:
-            # Save as JSON for brute-force fallback
-            data = {
-                "id_map": self._id_map,
+            data = faiss.serialize_index(self._index)
+            meta = {
+                "labels": [[doc_id, label] for doc_id, label in self._labels.items()],
+                "next_label": self._next_label,
+                "tombstones": self._tombstones,
                 "dimensions": self._dimensions,
-                "embeddings": [[doc_id, vec] for doc_id, vec in self._embeddings],
+                "generation": self.generation,
+                "index_type": self.index_type,
+                "parameters": self.parameters,
+                "model_name": self.model_name,
+                "index_crc32": zlib.crc32(data),
             }
-            path.with_suffix(".json").write_text(json.dumps(data), encoding="utf-8")
+            # Both files are replaced atomically, index first; the checksum lets a reader
+            # that catches the new index with the old labels reject the pair.
+            with atomic_file(path) as handle:
+                handle.write(memoryview(data))
+            with atomic_file(path.with_suffix(META_SUFFIX)) as handle:
+                handle.write(json.dumps(meta).encode("utf-8"))
+        else:
+            ids, rows = ([], b"") if self._fallback is None else self._fallback.packed()
+            _write_fallback(path.with_suffix(FALLBACK_SUFFIX), self._dimensions, self.generation, self.model_name, ids, rows)
+            # A fallback saved by older versions as JSON is superseded.
+            path.with_suffix(".json").unlink(missing_ok=True)
 
-    def load(self, path: Path) -> None:
+    def load(self, path: Path) -> bool:
+        """Load an index written by ``save``. Returns False when nothing was found.
+
+        Raises ValueError when the FAISS index and its metadata come from different saves.
+        """
+        self._reset()
         if is_faiss_available() and path.exists():
-            self._index = faiss.read_index(str(path))
-            meta_path = path.with_suffix(".meta.json")
-            if meta_path.exists():
-                meta = json.loads(meta_path.read_text(encoding="utf-8"))
-                self._id_map = meta["id_map"]
+            meta_path = path.with_suffix(META_SUFFIX)
+            meta = json.loads(meta_path.read_text(encoding="utf-8")) if meta_path.exists() else None
+            data = path.read_bytes()
+            if meta is not None and "index_crc32" in meta and zlib.crc32(data) != int(meta["index_crc32"]):
+                raise ValueError(f"index does not match its metadata: {path}")
+            self._index = faiss.deserialize_index(np.frombuffer(data, dtype=np.uint8))
+            if meta is not None:
+                if "labels" in meta:
+                    self._labels = {int(doc_id): int(label) for doc_id, label in meta["labels"]}
+                    self._next_label = int(meta.get("next_label", len(self._labels)))
+                    self._tombstones = int(meta.get("tombstones", 0))
+                else:
+                    # Written before labels: FAISS positions are the labels.
+                    self._labels = {int(doc_id): position for position, doc_id in enumerate(meta["id_map"])}
+                    self._next_label = len(self._labels)
+                    self._mutable = False
+                self._documents = {label: doc_id for doc_id, label in self._labels.items()}
                 self._dimensions = meta["dimensions"]
-            return
+                self.generation = int(meta.get("generation", -1))
+                self.index_type = str(meta.get("index_type", "flat"))
+                self.parameters = {str(key): int(value) for key, value in meta.get("parameters", {}).items()}
+                self.model_name = str(meta.get("model_name", ""))
+                self._apply_search_parameters(self._index)
+            return True
+
+        fallback = _read_fallback(path.with_suffix(FALLBACK_SUFFIX))
+        if fallback is not None:
+            self._dimensions, self.generation, self.model_name, store = fallback
+            if len(store):
+                self._fallback = store
+                self._labels = {doc_id: slot for slot, doc_id in enumerate(store._ids)}  # type: ignore[misc]
+            return True
 
-        # Fallback: load from JSON
+        # Fallback saved as JSON by older versions
         json_path = path.with_suffix(".json")
         if json_path.exists():
             data = json.loads(json_path.read_text(encoding="utf-8"))
-            self._id_map = data["id_map"]
             self._dimensions = data["dimensions"]
-            self._embeddings = [(e[0], e[1]) for e in data["embeddings"]]
+            self.generation = int(data.get("generation", -1))
+            for doc_id, vec in data["embeddings"]:
+                self._add_slot(int(doc_id), vec)
+            return True
+        return False
+
+
+def _write_fallback(path: Path, dimensions: int, generation: int, model_name: str, ids: list[int], rows: bytes) -> None:
+    """Write a fallback index file atomically (temporary file, fsync, rename)."""
+    model = model_name.encode("utf-8")[:0xFFFF]
+    body = model + b"\0" * (-len(model) % 8) + struct.pack(f"<{len(ids)}q", *ids) + rows
+    header = _FALLBACK_HEADER.pack(
+        _FALLBACK_MAGIC,
+        _FALLBACK_VERSION,
+        0,
+        len(model),
+        dimensions,
+        len(ids),
+        generation,
+        zlib.crc32(body),
+    )
+    with atomic_file(path) as handle:
+        handle.write(header)
+        handle.write(body)
+
+
+def _read_fallback(path: Path) -> tuple[int, int, str, _BruteForceVectors] | None:
+    """``(dimensions, generation, model name, vectors)`` from a fallback index file.
+
+    Returns None when the file is missing; raises ValueError when it is truncated,
+    corrupt or of an unknown version.
+    """
+    try:
+        handle = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    with handle:
+        size = os.fstat(handle.fileno()).st_size
+        if size < _FALLBACK_HEADER.size:
+            raise ValueError(f"truncated fallback index: {path}")
+        with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+            magic, version, _, model_length, dimensions, count, generation, checksum = _FALLBACK_HEADER.unpack_from(view)
+            if magic != _FALLBACK_MAGIC or version != _FALLBACK_VERSION:
+                raise ValueError(f"not a fallback index: {path}")
+            ids_offset = _FALLBACK_HEADER.size + model_length + (-model_length % 8)
+            rows_offset = ids_offset + 8 * count
+            if size != rows_offset + 4 * count * dimensions or zlib.crc32(view[_FALLBACK_HEADER.size :]) != checksum:
+                raise ValueError(f"corrupt fallback index: {path}")
+            model_name = bytes(view[_FALLBACK_HEADER.size : _FALLBACK_HEADER.size + model_length]).decode("utf-8")
+            ids = list(struct.unpack_from(f"<{count}q", view, ids_offset))
+            store = _BruteForceVectors.from_rows(int(dimensions), ids, view[rows_offset:])
+    return int(dimensions), int(generation), model_name, store
+
+
+def _synthetic_vectors(count: int, dimensions: int, seed: int) -> object:
+    """Unit vectors scattered around ``count // 200`` topic centres, like a real corpus."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((max(8, count // 200), dimensions)).astype(np.float32)
+    vectors = centres[rng.integers(0, len(centres), count)]
+    vectors += 0.6 * rng.standard_normal((count, dimensions)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def _synthetic_lists(count: int, dimensions: int, seed: int) -> list[list[float]]:
+    """``_synthetic_vectors`` as lists of floats, generated without NumPy when it is missing."""
+    if np is not None:
+        return _synthetic_vectors(count, dimensions, seed).tolist()  # type: ignore[attr-defined]
+    rng = random.Random(seed)
+    centres = [[rng.gauss(0.0, 1.0) for _ in range(dimensions)] for _ in range(max(8, count // 200))]
+    return [
+        _unit([value + rng.gauss(0.0, 0.6) for value in rng.choice(centres)]) for _ in range(count)
+    ]
+
+
+def _latency_summary(latencies: list[float]) -> dict[str, float]:
+    ordered = sorted(latencies)
+    return {
+        "avg": round(statistics.fmean(ordered), 4),
+        "p50": round(statistics.median(ordered), 4),
+        "p95": round(ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))], 4),
+    }
+
+
+def benchmark_index_types(
+    sizes: list[int],
+    config: IndexConfig | None = None,
+    dimensions: int = 384,
+    queries: int = 50,
+    k: int = 10,
+    seed: int = 0,
+) -> list[dict[str, object]]:
+    """recall@k against the flat index, per-query latency and build time for each index type.
+
+    Runs on synthetic vectors of each corpus size in ``sizes``; the approximate types
+    use ``config``'s parameters. Returns an empty list when FAISS is not installed.
+    """
+    if not is_faiss_available():
+        return []
+    base = config or IndexConfig()
+    report: list[dict[str, object]] = []
+    for size in sizes:
+        vectors = _synthetic_vectors(size, dimensions, seed)
+        rng = np.random.default_rng(seed + 1)
+        probes = vectors[rng.integers(0, size, queries)] + 0.3 * rng.standard_normal((queries, dimensions)).astype(np.float32)
+        embeddings = list(enumerate(vectors))
+        exact: list[set[int]] = []
+        for index_type in INDEX_TYPES:
+            index_config = IndexConfig(
+                type=index_type,
+                nlist=base.nlist,
+                nprobe=base.nprobe,
+                hnsw_m=base.hnsw_m,
+                ef_search=base.ef_search,
+                ef_construction=base.ef_construction,
+            )
+            index = FaissIndex(index_config)
+            start = time.perf_counter()
+            index.build(embeddings)  # type: ignore[arg-type]
+            build_ms = (time.perf_counter() - start) * 1000.0
+
+            latencies: list[float] = []
+            found: list[set[int]] = []
+            for probe in probes:
+                start = time.perf_counter()
+                hits = index.search(probe, k=k)  # type: ignore[arg-type]
+                latencies.append((time.perf_counter() - start) * 1000.0)
+                found.append({doc_id for doc_id, _ in hits})
+            if index_type == "flat":
+                exact = found
+            recall = sum(len(got & truth) for got, truth in zip(found, exact)) / max(1, sum(map(len, exact)))
+            report.append(
+                {
+                    "documents": size,
+                    "index_type": index.index_type,
+                    "parameters": dict(index.parameters),
+                    "recall_at_k": round(recall, 4),
+                    "latency_ms": _latency_summary(latencies),
+                    "build_ms": round(build_ms, 1),
+                }
+            )
+    return report
+
+
+def _baseline_search(
+    embeddings: list[tuple[int, list[float]]], query_vector: list[float], k: int
+) -> list[tuple[int, float]]:
+    """The fallback before vectors were pre-normalized: every stored list of floats is
+    normalized again on each search and all scores are sorted. Kept as a benchmark baseline."""
+
+    def normalize(vector: list[float]) -> list[float]:
+        norm = math.sqrt(sum(v * v for v in vector))
+        if norm == 0.0:
+            return vector
+        return [v / norm for v in vector]
+
+    q_norm = normalize(query_vector)
+    scored = [(sum(a * b for a, b in zip(q_norm, normalize(vec))), doc_id) for doc_id, vec in embeddings]
+    scored.sort(reverse=True)
+    return [(doc_id, score) for score, doc_id in scored[:k]]
+
+
+def benchmark_fallback_search(
+    sizes: list[int],
+    dimensions: int = 384,
+    queries: int = 5,
+    k: int = 10,
+    seed: int = 0,
+) -> list[dict[str, object]]:
+    """Per-query latency of the brute-force fallback against its list-based baseline.
+
+    Runs on synthetic vectors of each corpus size in ``sizes`` whether or not FAISS is
+    installed. ``storage`` says which buffer the fallback used; ``agreement`` is the
+    fraction of top-k ids both implementations returned.
+    """
+    report: list[dict[str, object]] = []
+    for size in sizes:
+        vectors = _synthetic_lists(size, dimensions, seed)
+        embeddings = list(enumerate(vectors))
+        probes = [vectors[(position * 7919) % size] for position in range(queries)]
+
+        start = time.perf_counter()
+        store = _BruteForceVectors(dimensions)
+        for doc_id, vector in embeddings:
+            store.add(doc_id, vector)
+        build_ms = (time.perf_counter() - start) * 1000.0
+
+        latencies: list[float] = []
+        baseline_latencies: list[float] = []
+        shared = 0
+        for probe in probes:
+            start = time.perf_counter()
+            hits = store.search(probe, k)
+            latencies.append((time.perf_counter() - start) * 1000.0)
+            start = time.perf_counter()
+            expected = _baseline_search(embeddings, probe, k)
+            baseline_latencies.append((time.perf_counter() - start) * 1000.0)
+            shared += len({doc_id for doc_id, _ in hits} & {doc_id for doc_id, _ in expected})
+        latency = _latency_summary(latencies)
+        baseline = _latency_summary(baseline_latencies)
+        report.append(
+            {
+                "documents": size,
+                "storage": "numpy" if np is not None else "array",
+                "latency_ms": latency,
+                "baseline_latency_ms": baseline,
+                "speedup": round(baseline["avg"] / max(latency["avg"], 1e-6), 1),
+                "agreement": round(shared / max(1, queries * min(k, size)), 4),
+                "build_ms": round(build_ms, 1),
+            }
+        )
+    return report
@@ -0,0 +1,279 @@
+"""Process-pool scoring of resident vectors held in shared memory.
+
+``SharedVectorSnapshot`` copies the document and chunk matrices of a resident vector
+store into one ``multiprocessing.shared_memory`` segment, with rows grouped into
+shards by document id. Each pool worker attaches to the segment once, scores its own
+shard (document rows and the chunk rows of the same documents, so a document's blend
+never spans workers) and returns only the documents that can still reach the shard's
+top ``limit``. The caller merges the shards into one partial-score table.
+
+Memory layout of the segment (all little-endian, native alignment):
+
+    document vectors   n_documents x dims float32
+    chunk vectors      n_chunks x dims float32
+    document keys      n_documents int64, padded to 8 bytes
+    chunk owners       n_chunks int64
+"""
+
+from __future__ import annotations
+
+from array import array
+import atexit
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+import heapq
+import multiprocessing
+from multiprocessing import shared_memory
+import threading
+import weakref
+from typing import Sequence
+
+from markdownkeeper.query.vector_store import VectorMatrix, _dot
+
+try:
+    import numpy as np  # type: ignore[import-untyped]
+except ImportError:
+    np = None
+
+# (segment name, dims, n_documents, n_chunks, document row ranges, chunk row ranges)
+SnapshotDescriptor = tuple[str, int, int, int, tuple[tuple[int, int], ...], tuple[tuple[int, int], ...]]
+
+
+def _aligned(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def _layout(dims: int, n_documents: int, n_chunks: int) -> tuple[int, int, int, int]:
+    """Byte offsets of the chunk vectors, document keys and chunk owners, and the total size."""
+    chunk_vectors = n_documents * dims * 4
+    document_keys = _aligned(chunk_vectors + n_chunks * dims * 4)
+    chunk_owners = document_keys + n_documents * 8
+    return chunk_vectors, document_keys, chunk_owners, chunk_owners + n_chunks * 8
+
+
+def _shard_order(ids: Sequence[int], shards: int) -> tuple[list[int], tuple[tuple[int, int], ...]]:
+    """Row order grouping ``ids`` by ``id % shards`` (then by id), and each shard's row range."""
+    order = sorted(range(len(ids)), key=lambda row: (ids[row] % shards, ids[row]))
+    ranges: list[tuple[int, int]] = []
+    start = 0
+    for shard in range(shards):
+        end = start
+        while end < len(order) and ids[order[end]] % shards == shard:
+            end += 1
+        ranges.append((start, end))
+        start = end
+    return order, tuple(ranges)
+
+
+def _release(segment: shared_memory.SharedMemory) -> None:
+    segment.close()
+    try:
+        segment.unlink()
+    except FileNotFoundError:
+        pass
+
+
+class SharedVectorSnapshot:
+    """Read-only copy of document and chunk vectors in one shared-memory segment.
+
+    The segment is unlinked when the snapshot is garbage-collected (or at exit), so a
+    replaced snapshot stays readable for queries that still hold it.
+    """
+
+    def __init__(self, documents: VectorMatrix, chunks: VectorMatrix, shards: int) -> None:
+        self.shards = max(1, shards)
+        dims = documents.dimensions or chunks.dimensions
+        if chunks.dimensions and documents.dimensions and chunks.dimensions != documents.dimensions:
+            chunks = VectorMatrix()
+        document_keys = documents.keys()
+        chunk_owners = chunks.owners()
+        document_order, document_ranges = _shard_order(document_keys, self.shards)
+        chunk_order, chunk_ranges = _shard_order(chunk_owners, self.shards)
+        chunk_offset, keys_offset, owners_offset, size = _layout(dims, len(document_keys), len(chunk_owners))
+
+        self._segment = shared_memory.SharedMemory(create=True, size=max(1, size))
+        self._finalizer = weakref.finalize(self, _release, self._segment)
+        buffer = self._segment.buf
+        row_bytes = dims * 4
+        for offset, matrix, order in ((0, documents, document_order), (chunk_offset, chunks, chunk_order)):
+            if not order:
+                continue
+            with matrix.buffer() as source:
+                if np is not None:
+                    rows = np.frombuffer(source, dtype=np.float32).reshape(len(order), dims)
+                    target = np.ndarray((len(order), dims), dtype=np.float32, buffer=buffer, offset=offset)
+                    target[:] = rows[np.asarray(order, dtype=np.int64)]
+                    del rows, target
+                else:
+                    for index, row in enumerate(order):
+                        start = offset + index * row_bytes
+                        buffer[start : start + row_bytes] = source[row * row_bytes : (row + 1) * row_bytes]
+        for offset, ids, order in ((keys_offset, document_keys, document_order), (owners_offset, chunk_owners, chunk_order)):
+            packed = array("q", (ids[row] for row in order)).tobytes()
+            buffer[offset : offset + len(packed)] = packed
+
+        self.descriptor: SnapshotDescriptor = (
+            self._segment.name,
+            dims,
+            len(document_keys),
+            len(chunk_owners),
+            document_ranges,
+            chunk_ranges,
+        )
+
+    def close(self) -> None:
+        self._finalizer()
+
+
+# Segments attached by this (worker) process, by name.
+_ATTACHED: dict[str, shared_memory.SharedMemory] = {}
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    segment = _ATTACHED.get(name)
+    if segment is None:
+        # A new snapshot replaces the previous one; drop the old mapping.
+        for stale in _ATTACHED.values():
+            try:
+                stale.close()
+            except BufferError:
+                pass
+        _ATTACHED.clear()
+        segment = shared_memory.SharedMemory(name=name)
+        _ATTACHED[name] = segment
+    return segment
+
+
+def _shard_scores(
+    descriptor: SnapshotDescriptor, query: Sequence[float], shard: int
+) -> tuple[dict[int, float], dict[int, float]]:
+    """Vector score per document and best chunk score per owner for one shard."""
+    name, dims, n_documents, n_chunks, document_ranges, chunk_ranges = descriptor
+    chunk_offset, keys_offset, owners_offset, _ = _layout(dims, n_documents, n_chunks)
+    buffer = _attach(name).buf
+    doc_start, doc_end = document_ranges[shard]
+    chunk_start, chunk_end = chunk_ranges[shard]
+    if len(query) != dims:
+        return {}, {}
+
+    if np is not None:
+        q = np.asarray(query, dtype=np.float32)
+        vectors = np.ndarray((n_documents, dims), dtype=np.float32, buffer=buffer)
+        keys = np.ndarray((n_documents,), dtype=np.int64, buffer=buffer, offset=keys_offset)
+        document_scores = dict(zip(keys[doc_start:doc_end].tolist(), (vectors[doc_start:doc_end] @ q).tolist()))
+        chunk_maxima: dict[int, float] = {}
+        if chunk_end > chunk_start:
+            chunk_vectors = np.ndarray((n_chunks, dims), dtype=np.float32, buffer=buffer, offset=chunk_offset)
+            owners = np.ndarray((n_chunks,), dtype=np.int64, buffer=buffer, offset=owners_offset)[chunk_start:chunk_end]
+            scores = chunk_vectors[chunk_start:chunk_end] @ q
+            # Rows are sorted by owner within the shard, so each owner is one run.
+            starts = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]])
+            chunk_maxima = dict(zip(owners[starts].tolist(), np.maximum.reduceat(scores, starts).tolist()))
+            del chunk_vectors, owners, scores
+        del vectors, keys
+        return document_scores, chunk_maxima
+
+    q_values = array("f", query)
+    with buffer[: n_documents * dims * 4].cast("f") as vectors, buffer[keys_offset:owners_offset].cast("q") as keys:
+        document_scores = {
+            keys[row]: _dot(vectors[row * dims : (row + 1) * dims], q_values) for row in range(doc_start, doc_end)
+        }
+    chunk_maxima = {}
+    chunk_bytes = buffer[chunk_offset : chunk_offset + n_chunks * dims * 4]
+    owner_bytes = buffer[owners_offset : owners_offset + n_chunks * 8]
+    with chunk_bytes.cast("f") as vectors, owner_bytes.cast("q") as owners:
+        for row in range(chunk_start, chunk_end):
+            score = _dot(vectors[row * dims : (row + 1) * dims], q_values)
+            current = chunk_maxima.get(owners[row])
+            if current is None or score > current:
+                chunk_maxima[owners[row]] = score
+    chunk_bytes.release()
+    owner_bytes.release()
+    return document_scores, chunk_maxima
+
+
+def score_shard(
+    descriptor: SnapshotDescriptor,
+    query: Sequence[float],
+    shard: int,
+    limit: int,
+    weights: tuple[float, float],
+    bound: float,
+    excluded: Sequence[int] = (),
+) -> list[tuple[int, float]]:
+    """Partial scores of one shard's documents that can still reach its top ``limit``.
+
+    A document is kept when its partial score plus ``bound`` reaches the shard's k-th
+    partial score; the shard's k-th score never exceeds the global one, so nothing that
+    could enter the global top ``limit`` is dropped. Documents in ``excluded`` (rows the
+    snapshot holds stale copies of) are neither returned nor counted toward the cutoff.
+    """
+    document_scores, chunk_maxima = _shard_scores(descriptor, query, shard)
+    vector_weight, chunk_weight = weights
+    skip = set(excluded)
+    partial = [
+        (document_id, vector_weight * document_scores.get(document_id, 0.0) + chunk_weight * chunk_maxima.get(document_id, 0.0))
+        for document_id in document_scores.keys() | chunk_maxima.keys()
+        if document_id not in skip
+    ]
+    largest = heapq.nlargest(max(1, limit), (score for _, score in partial))
+    if len(largest) < max(1, limit) or largest[-1] - bound <= 0.0:
+        return partial
+    cutoff = largest[-1] - bound
+    return [(document_id, score) for document_id, score in partial if score >= cutoff]
+
+
+_EXECUTORS: dict[int, ProcessPoolExecutor] = {}
+_EXECUTORS_LOCK = threading.Lock()
+
+
+def _executor(workers: int) -> ProcessPoolExecutor:
+    with _EXECUTORS_LOCK:
+        executor = _EXECUTORS.get(workers)
+        if executor is None:
+            # Spawned workers never inherit the parent's threads or SQLite handles.
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _EXECUTORS[workers] = executor
+        return executor
+
+
+def shutdown_workers() -> None:
+    with _EXECUTORS_LOCK:
+        executors = list(_EXECUTORS.values())
+        _EXECUTORS.clear()
+    for executor in executors:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+atexit.register(shutdown_workers)
+
+
+def parallel_partial_scores(
+    snapshot: SharedVectorSnapshot,
+    query: Sequence[float],
+    limit: int,
+    weights: tuple[float, float],
+    bound: float,
+    excluded: Sequence[int] = (),
+) -> dict[int, float]:
+    """Merge of every shard's surviving partial scores, computed on the worker pool.
+
+    Documents in ``excluded`` are left out (see ``score_shard``).
+    """
+    executor = _executor(snapshot.shards)
+    query_values = [float(value) for value in query]
+    skip = tuple(excluded)
+    futures = [
+        executor.submit(score_shard, snapshot.descriptor, query_values, shard, limit, weights, bound, skip)
+        for shard in range(snapshot.shards)
+    ]
+    merged: dict[int, float] = {}
+    try:
+        for future in futures:
+            merged.update(future.result())
+    except BrokenExecutor:
+        # A worker died; start a fresh pool on the next query.
+        with _EXECUTORS_LOCK:
+            if _EXECUTORS.get(snapshot.shards) is executor:
+                del _EXECUTORS[snapshot.shards]
+        raise
+    return merged
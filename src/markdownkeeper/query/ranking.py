@@ -0,0 +1,67 @@
+"""Streaming top-k selection for ranked search results.
+
+``TopK`` keeps the best ``k`` items seen so far in a min-heap, so selecting the top
+results costs O(n log k) instead of sorting every scored document. ``could_enter``
+lets callers skip scoring work for items whose best possible score cannot displace
+the current k-th result.
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+from typing import Generic, Iterable, TypeVar
+
+T = TypeVar("T")
+
+
+class TopK(Generic[T]):
+    """The ``k`` highest ``(score, tiebreak)`` items pushed so far.
+
+    Ties on score are broken by ``tiebreak`` (larger wins), matching a descending sort
+    on ``(score, tiebreak)``.
+    """
+
+    def __init__(self, k: int) -> None:
+        self.k = max(1, k)
+        self._heap: list[tuple[float, str, int, T]] = []
+        self._sequence = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def threshold(self) -> float | None:
+        """Score of the current k-th item, or None while fewer than ``k`` are held."""
+        if len(self._heap) < self.k:
+            return None
+        return self._heap[0][0]
+
+    def could_enter(self, upper_bound: float) -> bool:
+        """Whether an item scoring at most ``upper_bound`` could still be selected."""
+        threshold = self.threshold()
+        return threshold is None or upper_bound >= threshold
+
+    def push(self, score: float, tiebreak: str, item: T) -> bool:
+        # The sequence number is negated so that, on equal (score, tiebreak), the item
+        # pushed first ranks higher, as a stable sort would leave it.
+        entry = (score, tiebreak, -next(self._sequence), item)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+            return True
+        if entry[:3] <= self._heap[0][:3]:
+            return False
+        heapq.heapreplace(self._heap, entry)
+        return True
+
+    def results(self) -> list[tuple[float, T]]:
+        """Held items as ``(score, item)``, best first."""
+        ordered = sorted(self._heap, key=lambda entry: entry[:3], reverse=True)
+        return [(score, item) for score, _, _, item in ordered]
+
+
+def kth_largest(values: Iterable[float], k: int) -> float | None:
+    """The k-th largest value, or None when there are fewer than ``k`` values."""
+    largest = heapq.nlargest(max(1, k), values)
+    if len(largest) < max(1, k):
+        return None
+    return largest[-1]
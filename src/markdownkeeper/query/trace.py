@@ -0,0 +1,49 @@
+"""Per-stage timing and counters for one semantic query.
+
+A ``QueryTrace`` is passed into the search functions by callers that want a breakdown
+(``query --explain``, the JSON-RPC ``explain`` flag, ``semantic-benchmark``). Search
+code wraps each stage in ``stage(trace, name)``, which costs nothing when no trace is
+being recorded.
+"""
+
+from __future__ import annotations
+
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+import time
+from typing import ContextManager, Iterator
+
+
+@dataclass(slots=True)
+class QueryTrace:
+    """Milliseconds spent per stage and row/vector counts, in the order first recorded."""
+
+    stages: dict[str, float] = field(default_factory=dict)
+    counts: dict[str, int] = field(default_factory=dict)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000.0
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed_ms
+
+    def count(self, name: str, value: int = 1) -> None:
+        self.counts[name] = self.counts.get(name, 0) + int(value)
+
+    def to_dict(self) -> dict[str, object]:
+        return {
+            "stages_ms": {name: round(elapsed, 3) for name, elapsed in self.stages.items()},
+            "counts": dict(self.counts),
+        }
+
+
+def stage(trace: QueryTrace | None, name: str) -> ContextManager[None]:
+    return nullcontext() if trace is None else trace.stage(name)
+
+
+def count(trace: QueryTrace | None, name: str, value: int = 1) -> None:
+    if trace is not None:
+        trace.count(name, value)
@@ -0,0 +1,519 @@
+"""Resident vector matrix used by semantic search.
+
+All vectors live in one contiguous buffer (a NumPy array when NumPy is installed, a
+``bytearray`` read through a typed ``memoryview`` otherwise) so a query is scored
+with a single matrix-vector product instead of decoding and looping over every
+stored embedding.
+
+Rows are held at one of three precisions:
+
+    float32   4 bytes per component
+    float16   2 bytes per component
+    int8      1 byte per component plus one float32 scale per row
+
+Quantized rows are scored in place: NumPy widens a bounded block of rows at a time,
+and the pure-Python path multiplies each int8 dot product by its row scale.
+"""
+
+from __future__ import annotations
+
+from array import array
+import heapq
+import math
+import operator
+import struct
+from typing import Sequence
+
+from markdownkeeper.storage.codec import quantize_int8
+
+try:
+    import numpy as np  # type: ignore[import-untyped]
+except ImportError:
+    np = None
+
+# memoryview format, bytes per component and NumPy dtype for each precision.
+_FORMATS = {"float32": ("f", 4, "float32"), "float16": ("e", 2, "float16"), "int8": ("b", 1, "int8")}
+
+# Rows widened to float32 at once when scoring quantized rows with NumPy.
+_BLOCK_ROWS = 8192
+
+
+def is_numpy_available() -> bool:
+    return np is not None
+
+
+def _dot(left: Sequence[float], right: Sequence[float]) -> float:
+    sumprod = getattr(math, "sumprod", None)
+    if sumprod is not None:
+        return float(sumprod(left, right))
+    return float(sum(map(operator.mul, left, right)))
+
+
+class _HalfFloatRows:
+    """Sliceable float16 components of a pure-Python row buffer.
+
+    ``memoryview.cast("e")`` is only supported from Python 3.12, so slices are decoded
+    with ``struct`` instead.
+    """
+
+    def __init__(self, data: bytearray | memoryview) -> None:
+        self._data = data
+        with memoryview(data) as view:
+            self._length = view.nbytes // 2
+
+    def __enter__(self) -> "_HalfFloatRows":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        return None
+
+    def __getitem__(self, items: slice) -> tuple[float, ...]:
+        start, stop, _ = items.indices(self._length)
+        return struct.unpack_from(f"={max(0, stop - start)}e", self._data, start * 2)
+
+
+class VectorMatrix:
+    """Keyed rows of equal-length vectors, stored contiguously at one precision.
+
+    Each row has a key (document or chunk id) and an owner (the document id the
+    row belongs to; equal to the key for document vectors). Removing a row moves
+    the last row into its slot so the buffer never has holes.
+    """
+
+    def __init__(self, precision: str = "float32") -> None:
+        if precision not in _FORMATS:
+            raise ValueError(f"unknown vector precision: {precision}")
+        self._precision = precision
+        self._format, self._itemsize, self._np_dtype = _FORMATS[precision]
+        self._dimensions = 0
+        self._count = 0
+        self._keys: list[int] = []
+        self._owners: list[int] = []
+        self._rows: dict[int, int] = {}
+        self._owned: dict[int, set[int]] = {}
+        self._data: object = self._allocate(0)
+        self._scales: object = self._allocate_scales(0)
+        self._grouping: tuple[list[int], object] | None = None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._rows
+
+    @property
+    def dimensions(self) -> int:
+        return self._dimensions
+
+    @property
+    def precision(self) -> str:
+        return self._precision
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the stored rows (and their int8 scales)."""
+        scale_bytes = 4 if self._precision == "int8" else 0
+        return self._count * (self._dimensions * self._itemsize + scale_bytes)
+
+    def keys(self) -> list[int]:
+        return list(self._keys)
+
+    def owners(self) -> list[int]:
+        return list(self._owners)
+
+    def buffer(self) -> memoryview:
+        """Byte view of the rows as float32 in row order (``len(self)`` x ``dimensions``).
+
+        float32 matrices return a view of their storage; quantized ones a dequantized copy.
+        """
+        if self._precision == "float32":
+            if np is not None:
+                return memoryview(self._data[: self._count]).cast("B")  # type: ignore[index]
+            return memoryview(self._data).cast("B")  # type: ignore[arg-type]
+        if np is not None:
+            return memoryview(self._widen(np.arange(self._count))).cast("B")
+        dims = self._dimensions
+        values = array("f")
+        with self._components() as view:
+            for row in range(self._count):
+                scale = self._row_scale(row)
+                values.extend(value * scale for value in view[row * dims : (row + 1) * dims])
+        return memoryview(values).cast("B")
+
+    def raw_rows(self) -> memoryview:
+        """Byte view of the stored rows at their own precision, in row order."""
+        if self._count == 0:
+            return memoryview(b"")
+        if np is not None:
+            return memoryview(np.ascontiguousarray(self._data[: self._count])).cast("B")  # type: ignore[index]
+        return memoryview(self._data).cast("B")  # type: ignore[arg-type]
+
+    def raw_scales(self) -> memoryview | None:
+        """Byte view of the float32 row scales of an int8 matrix; None for other precisions."""
+        if self._scales is None:
+            return None
+        if self._count == 0:
+            return memoryview(b"")
+        if np is not None:
+            return memoryview(np.ascontiguousarray(self._scales[: self._count])).cast("B")  # type: ignore[index]
+        return memoryview(self._scales).cast("B")  # type: ignore[arg-type]
+
+    @classmethod
+    def from_buffer(
+        cls,
+        precision: str,
+        dimensions: int,
+        keys: Sequence[int],
+        owners: Sequence[int],
+        rows: memoryview,
+        scales: memoryview | None = None,
+    ) -> "VectorMatrix":
+        """Matrix over existing row bytes (as written by ``raw_rows``) without copying them.
+
+        ``rows`` must stay valid for the matrix's lifetime. With NumPy the rows are used
+        in place (a writable buffer, such as a copy-on-write ``mmap``, is modified in place
+        by ``set``/``remove``); the pure-Python path copies them on the first change.
+        """
+        matrix = cls(precision)
+        count = len(keys)
+        if count == 0 or dimensions <= 0:
+            return matrix
+        matrix._dimensions = dimensions
+        matrix._count = count
+        matrix._keys = [int(key) for key in keys]
+        matrix._owners = [int(owner) for owner in owners]
+        matrix._rows = {key: row for row, key in enumerate(matrix._keys)}
+        for key, owner in zip(matrix._keys, matrix._owners):
+            matrix._owned.setdefault(owner, set()).add(key)
+        if np is not None:
+            matrix._data = np.frombuffer(rows, dtype=matrix._np_dtype, count=count * dimensions).reshape(count, dimensions)
+            if scales is not None and precision == "int8":
+                matrix._scales = np.frombuffer(scales, dtype=np.float32, count=count)
+        else:
+            matrix._data = rows
+            if scales is not None and precision == "int8":
+                matrix._scales = array("f", bytes(scales))
+        return matrix
+
+    def _own_buffer(self) -> None:
+        """Copy rows held in a borrowed buffer into a resizable one before they change."""
+        if np is None and not isinstance(self._data, bytearray):
+            self._data = bytearray(self._data)  # type: ignore[arg-type]
+
+    def clear(self) -> None:
+        self._dimensions = 0
+        self._count = 0
+        self._keys = []
+        self._owners = []
+        self._rows = {}
+        self._owned = {}
+        self._data = self._allocate(0)
+        self._scales = self._allocate_scales(0)
+        self._grouping = None
+
+    def _allocate(self, capacity: int) -> object:
+        if np is not None:
+            return np.zeros((capacity, max(1, self._dimensions)), dtype=self._np_dtype)
+        return bytearray()
+
+    def _allocate_scales(self, capacity: int) -> object:
+        if self._precision != "int8":
+            return None
+        if np is not None:
+            return np.ones(capacity, dtype=np.float32)
+        return array("f")
+
+    def _ensure_capacity(self, rows: int) -> None:
+        if np is None:
+            return
+        capacity = int(self._data.shape[0])  # type: ignore[attr-defined]
+        if rows <= capacity:
+            return
+        capacity = max(rows, capacity * 2, 64)
+        grown = self._allocate(capacity)
+        grown[: self._count] = self._data[: self._count]  # type: ignore[index]
+        self._data = grown
+        if self._scales is not None:
+            scales = self._allocate_scales(capacity)
+            scales[: self._count] = self._scales[: self._count]  # type: ignore[index]
+            self._scales = scales
+
+    def _components(self) -> memoryview | _HalfFloatRows:
+        """The pure-Python buffer as one flat, sliceable sequence of row components."""
+        if self._precision == "float16":
+            return _HalfFloatRows(self._data)  # type: ignore[arg-type]
+        return memoryview(self._data).cast(self._format)  # type: ignore[arg-type]
+
+    def _row_scale(self, row: int) -> float:
+        return 1.0 if self._scales is None else float(self._scales[row])  # type: ignore[index]
+
+    def _encoded(self, vector: Sequence[float]) -> tuple[bytes, float]:
+        """Row bytes for the pure-Python buffer, and the row scale."""
+        if self._precision == "int8":
+            values, scale = quantize_int8(vector)
+            return array("b", values).tobytes(), scale
+        if self._precision == "float16":
+            return struct.pack(f"={len(vector)}e", *vector), 1.0
+        if getattr(vector, "format", getattr(vector, "typecode", None)) == "f":
+            return bytes(memoryview(vector).cast("B")), 1.0  # type: ignore[arg-type]
+        return array("f", vector).tobytes(), 1.0
+
+    def _write(self, row: int, vector: Sequence[float]) -> None:
+        self._own_buffer()
+        if np is not None:
+            if self._precision == "int8":
+                values, scale = quantize_int8(vector)
+                self._data[row] = values  # type: ignore[index]
+                self._scales[row] = scale  # type: ignore[index]
+            else:
+                self._data[row] = vector  # type: ignore[index]
+            return
+        encoded, scale = self._encoded(vector)
+        if row == self._count:
+            self._data.extend(encoded)  # type: ignore[attr-defined]
+            if self._scales is not None:
+                self._scales.append(scale)  # type: ignore[attr-defined]
+            return
+        start = row * len(encoded)
+        self._data[start : start + len(encoded)] = encoded  # type: ignore[index]
+        if self._scales is not None:
+            self._scales[row] = scale  # type: ignore[index]
+
+    def set(self, key: int, vector: Sequence[float], owner: int | None = None) -> bool:
+        """Insert or replace the row for ``key``. Returns False if the vector is unusable."""
+        if len(vector) == 0:
+            self.remove(key)
+            return False
+        if self._count == 0:
+            self._dimensions = len(vector)
+            self._data = self._allocate(0)
+            self._scales = self._allocate_scales(0)
+        if len(vector) != self._dimensions:
+            self.remove(key)
+            return False
+
+        owner_id = key if owner is None else owner
+        self._grouping = None
+        row = self._rows.get(key)
+        if row is None:
+            row = self._count
+            self._ensure_capacity(row + 1)
+            self._write(row, vector)
+            self._keys.append(key)
+            self._owners.append(owner_id)
+            self._rows[key] = row
+            self._count += 1
+        else:
+            previous_owner = self._owners[row]
+            if previous_owner != owner_id:
+                self._owned.get(previous_owner, set()).discard(key)
+                self._owners[row] = owner_id
+            self._write(row, vector)
+        self._owned.setdefault(owner_id, set()).add(key)
+        return True
+
+    def remove(self, key: int) -> bool:
+        row = self._rows.pop(key, None)
+        if row is None:
+            return False
+        self._grouping = None
+        owner = self._owners[row]
+        owned = self._owned.get(owner)
+        if owned is not None:
+            owned.discard(key)
+            if not owned:
+                del self._owned[owner]
+
+        self._own_buffer()
+        last = self._count - 1
+        row_bytes = self._dimensions * self._itemsize
+        if row != last:
+            moved_key = self._keys[last]
+            self._keys[row] = moved_key
+            self._owners[row] = self._owners[last]
+            self._rows[moved_key] = row
+            if np is not None:
+                self._data[row] = self._data[last]  # type: ignore[index]
+            else:
+                self._data[row * row_bytes : (row + 1) * row_bytes] = self._data[last * row_bytes : (last + 1) * row_bytes]  # type: ignore[index]
+            if self._scales is not None:
+                self._scales[row] = self._scales[last]  # type: ignore[index]
+        self._keys.pop()
+        self._owners.pop()
+        if np is None:
+            del self._data[last * row_bytes :]  # type: ignore[attr-defined]
+            if self._scales is not None:
+                del self._scales[last:]  # type: ignore[attr-defined]
+        self._count = last
+        return True
+
+    def remove_owner(self, owner: int) -> int:
+        keys = list(self._owned.get(owner, ()))
+        for key in keys:
+            self.remove(key)
+        return len(keys)
+
+    def _widen(self, rows: object) -> object:
+        """float32 copy of the rows at index array ``rows``, with int8 scales applied."""
+        values = self._data[rows].astype(np.float32)  # type: ignore[index]
+        if self._scales is not None:
+            values *= self._scales[rows][:, None]  # type: ignore[index]
+        return values
+
+    def _product(self, q: object, rows: object = None) -> object:
+        """Stored rows (all, or the index array ``rows``) times ``q``: a vector or dims x m."""
+        if self._precision == "float32":
+            data = self._data[: self._count] if rows is None else self._data[rows]  # type: ignore[index]
+            return data @ q
+        if rows is None:
+            rows = np.arange(self._count)
+        out = np.empty((len(rows),) + tuple(q.shape[1:]), dtype=np.float32)  # type: ignore[arg-type, attr-defined]
+        for start in range(0, len(rows), _BLOCK_ROWS):  # type: ignore[arg-type]
+            block = rows[start : start + _BLOCK_ROWS]  # type: ignore[index]
+            out[start : start + len(block)] = self._widen(block) @ q
+        return out
+
+    def _raw_scores(self, query: Sequence[float]) -> object:
+        if np is not None:
+            if self._count == 0 or len(query) != self._dimensions:
+                return np.zeros(self._count, dtype=np.float32)
+            return self._product(np.asarray(query, dtype=np.float32))
+        return self.scores(query)
+
+    def _row_scores(self, query: Sequence[float], rows: Sequence[int]) -> list[float]:
+        dims = self._dimensions
+        q_values = array("f", query)
+        with self._components() as view:
+            if self._scales is None:
+                return [_dot(view[row * dims : (row + 1) * dims], q_values) for row in rows]
+            scales = self._scales
+            return [_dot(view[row * dims : (row + 1) * dims], q_values) * scales[row] for row in rows]  # type: ignore[index]
+
+    def scores(self, query: Sequence[float]) -> list[float]:
+        """Dot product of ``query`` with every row, in row order."""
+        if np is not None:
+            return self._raw_scores(query).tolist()  # type: ignore[attr-defined]
+        if self._count == 0 or len(query) != self._dimensions:
+            return [0.0] * self._count
+        return self._row_scores(query, range(self._count))
+
+    def score_by_key(self, query: Sequence[float]) -> dict[int, float]:
+        return dict(zip(self._keys, self.scores(query)))
+
+    def _raw_scores_many(self, queries: Sequence[Sequence[float]]) -> object:
+        """``len(self)`` x ``len(queries)`` scores from one matrix-matrix product."""
+        q = np.zeros((len(queries), self._dimensions), dtype=np.float32)
+        for column, query in enumerate(queries):
+            if len(query) == self._dimensions:
+                q[column] = query
+        return self._product(q.T)
+
+    def _scores_many(self, queries: Sequence[Sequence[float]]) -> list[list[float]]:
+        """Per row, the score against each query, in one pass over the rows."""
+        dims = self._dimensions
+        q_values = [array("f", query) if len(query) == dims else None for query in queries]
+        with self._components() as view:
+            rows: list[list[float]] = []
+            for row in range(self._count):
+                vector = view[row * dims : (row + 1) * dims]
+                scale = self._row_scale(row)
+                rows.append([0.0 if q is None else _dot(vector, q) * scale for q in q_values])
+            return rows
+
+    def score_by_key_many(self, queries: Sequence[Sequence[float]]) -> list[dict[int, float]]:
+        """``score_by_key`` for each query, scoring every row once for the whole batch."""
+        if not queries:
+            return []
+        if self._count == 0:
+            return [{} for _ in queries]
+        if np is not None:
+            columns = self._raw_scores_many(queries).T.tolist()  # type: ignore[attr-defined]
+            return [dict(zip(self._keys, column)) for column in columns]
+        rows = self._scores_many(queries)
+        return [
+            {key: scores[column] for key, scores in zip(self._keys, rows)} for column in range(len(queries))
+        ]
+
+    def _owner_grouping(self) -> tuple[list[int], object]:
+        if self._grouping is None:
+            owners, inverse = np.unique(np.asarray(self._owners, dtype=np.int64), return_inverse=True)
+            self._grouping = (owners.tolist(), inverse.reshape(-1))
+        return self._grouping
+
+    def max_score_by_owner_many(self, queries: Sequence[Sequence[float]]) -> list[dict[int, float]]:
+        """``max_score_by_owner`` for each query, scoring every row once for the whole batch."""
+        if not queries:
+            return []
+        if self._count == 0:
+            return [{} for _ in queries]
+        if np is not None:
+            owner_ids, inverse = self._owner_grouping()
+            maxima = np.full((len(owner_ids), len(queries)), -np.inf, dtype=np.float32)
+            np.maximum.at(maxima, inverse, self._raw_scores_many(queries))
+            return [dict(zip(owner_ids, column)) for column in maxima.T.tolist()]
+
+        best: list[dict[int, float]] = [{} for _ in queries]
+        for owner, scores in zip(self._owners, self._scores_many(queries)):
+            for column, score in enumerate(scores):
+                current = best[column].get(owner)
+                if current is None or score > current:
+                    best[column][owner] = score
+        return best
+
+    def top_k(self, query: Sequence[float], k: int) -> list[tuple[int, float]]:
+        """The ``k`` best ``(key, score)`` pairs, highest score first."""
+        if k <= 0 or self._count == 0 or len(query) != self._dimensions:
+            return []
+        if np is not None:
+            raw = self._raw_scores(query)
+            if k < self._count:
+                rows = np.argpartition(-raw, k - 1)[:k]  # type: ignore[operator]
+            else:
+                rows = np.arange(self._count)
+            rows = rows[np.argsort(-raw[rows], kind="stable")]  # type: ignore[index]
+            return [(self._keys[row], float(raw[row])) for row in rows.tolist()]  # type: ignore[index]
+        return heapq.nlargest(k, zip(self._keys, self.scores(query)), key=lambda item: item[1])
+
+    def _subset_scores(self, query: Sequence[float], rows: list[int]) -> list[float]:
+        if not rows or len(query) != self._dimensions:
+            return [0.0] * len(rows)
+        if np is not None:
+            q = np.asarray(query, dtype=np.float32)
+            return self._product(q, np.asarray(rows, dtype=np.int64)).tolist()  # type: ignore[attr-defined]
+        return self._row_scores(query, rows)
+
+    def score_keys(self, query: Sequence[float], keys: Sequence[int]) -> dict[int, float]:
+        """Scores for the given keys only; unknown keys are skipped."""
+        present = [key for key in keys if key in self._rows]
+        rows = [self._rows[key] for key in present]
+        return dict(zip(present, self._subset_scores(query, rows)))
+
+    def max_score_for_owners(self, query: Sequence[float], owners: Sequence[int]) -> dict[int, float]:
+        """Like ``max_score_by_owner`` but only scores rows belonging to ``owners``."""
+        row_owners: list[int] = []
+        rows: list[int] = []
+        for owner in owners:
+            for key in self._owned.get(owner, ()):
+                row_owners.append(owner)
+                rows.append(self._rows[key])
+        best: dict[int, float] = {}
+        for owner, score in zip(row_owners, self._subset_scores(query, rows)):
+            current = best.get(owner)
+            if current is None or score > current:
+                best[owner] = score
+        return best
+
+    def max_score_by_owner(self, query: Sequence[float]) -> dict[int, float]:
+        """Best row score per owner, e.g. the best chunk score for each document."""
+        if np is not None and self._count:
+            owner_ids, inverse = self._owner_grouping()
+            maxima = np.full(len(owner_ids), -np.inf, dtype=np.float32)
+            np.maximum.at(maxima, inverse, self._raw_scores(query))
+            return dict(zip(owner_ids, maxima.tolist()))
+
+        best: dict[int, float] = {}
+        for owner, score in zip(self._owners, self.scores(query)):
+            current = best.get(owner)
+            if current is None or score > current:
+                best[owner] = score
+        return best
@@ -0,0 +1,143 @@
+"""Binary encoding for embedding vectors stored in SQLite.
+
+A stored vector is a little-endian BLOB:
+
+    magic      4 bytes   b"MKEV"
+    version    uint8     format version (1)
+    dtype      uint8     0 = float32, 1 = float16, 2 = int8
+    model_len  uint16    length of the model name in bytes
+    dims       uint32    number of components
+    model      model_len bytes of UTF-8, zero-padded to a 4-byte boundary
+    data       float32:  dims little-endian float32 values
+               float16:  dims little-endian IEEE half-precision values
+               int8:     one little-endian float32 scale, then dims int8 values;
+                         component i is ``value[i] * scale``
+
+Rows written before the BLOB format hold ``json.dumps`` lists; ``decode_embedding``
+still accepts those so mixed databases keep working until they are migrated.
+"""
+
+from __future__ import annotations
+
+from array import array
+import json
+import struct
+import sys
+from typing import Sequence
+
+try:
+    import numpy as np  # type: ignore[import-untyped]
+except ImportError:
+    np = None
+
+MAGIC = b"MKEV"
+FORMAT_VERSION = 1
+DTYPE_FLOAT32 = 0
+DTYPE_FLOAT16 = 1
+DTYPE_INT8 = 2
+
+# Names accepted for stored and resident vector precision, and their dtype codes.
+PRECISIONS = {"float32": DTYPE_FLOAT32, "float16": DTYPE_FLOAT16, "int8": DTYPE_INT8}
+
+_HEADER = struct.Struct("<4sBBHI")
+_SCALE = struct.Struct("<f")
+
+
+def _padded(length: int) -> int:
+    return (length + 3) & ~3
+
+
+def is_encoded_embedding(raw: object) -> bool:
+    return isinstance(raw, (bytes, bytearray, memoryview)) and bytes(raw[:4]) == MAGIC
+
+
+def quantize_int8(vector: Sequence[float]) -> tuple[list[int], float]:
+    """Symmetric per-vector scalar quantization: ``vector ~= values * scale``."""
+    peak = max((abs(float(value)) for value in vector), default=0.0)
+    scale = peak / 127.0 if peak > 0.0 else 1.0
+    return [max(-127, min(127, round(float(value) / scale))) for value in vector], scale
+
+
+def encode_embedding(vector: Sequence[float], model_name: str = "", dtype: int = DTYPE_FLOAT32) -> bytes:
+    model_bytes = model_name.encode("utf-8")
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, dtype, len(model_bytes), len(vector))
+    model_field = model_bytes.ljust(_padded(len(model_bytes)), b"\0")
+    if dtype == DTYPE_FLOAT16:
+        data = struct.pack(f"<{len(vector)}e", *vector)
+    elif dtype == DTYPE_INT8:
+        values, scale = quantize_int8(vector)
+        data = _SCALE.pack(scale) + array("b", values).tobytes()
+    elif dtype == DTYPE_FLOAT32:
+        floats = array("f", vector)
+        if sys.byteorder != "little":
+            floats.byteswap()
+        data = floats.tobytes()
+    else:
+        raise ValueError(f"unknown embedding dtype: {dtype}")
+    return header + model_field + data
+
+
+def embedding_dtype(raw: object) -> int | None:
+    """The dtype code of an encoded BLOB, or None for legacy or unusable input."""
+    if not is_encoded_embedding(raw):
+        return None
+    return int(_HEADER.unpack_from(memoryview(raw))[2])  # type: ignore[arg-type]
+
+
+def _decode_quantized(buffer: memoryview, dtype: int, offset: int, dims: int) -> Sequence[float] | None:
+    if dtype == DTYPE_FLOAT16:
+        if offset + dims * 2 > len(buffer):
+            return None
+        if np is not None:
+            return np.frombuffer(buffer, dtype="<f2", count=dims, offset=offset).astype(np.float32)
+        return list(struct.unpack_from(f"<{dims}e", buffer, offset))
+    if offset + _SCALE.size + dims > len(buffer):
+        return None
+    (scale,) = _SCALE.unpack_from(buffer, offset)
+    if np is not None:
+        values = np.frombuffer(buffer, dtype=np.int8, count=dims, offset=offset + _SCALE.size)
+        return values.astype(np.float32) * np.float32(scale)
+    return [value * scale for value in buffer[offset + _SCALE.size : offset + _SCALE.size + dims].cast("b")]
+
+
+def decode_embedding(raw: object) -> tuple[Sequence[float], str]:
+    """Decode a stored vector into ``(values, model_name)``.
+
+    float32 BLOBs are returned as zero-copy views over the row bytes: a read-only
+    NumPy array when NumPy is installed, a ``memoryview`` of format ``'f'`` otherwise.
+    float16 and int8 BLOBs are dequantized into a new float32 array (a list without
+    NumPy). Legacy JSON text decodes to a list. Unusable input decodes to ``([], "")``.
+    """
+    if raw is None:
+        return [], ""
+    if isinstance(raw, (bytes, bytearray, memoryview)):
+        buffer = memoryview(raw)
+        if len(buffer) < _HEADER.size or bytes(buffer[:4]) != MAGIC:
+            return [], ""
+        _, version, dtype, model_len, dims = _HEADER.unpack_from(buffer)
+        if version != FORMAT_VERSION or dtype not in PRECISIONS.values():
+            return [], ""
+        offset = _HEADER.size + _padded(model_len)
+        model_name = bytes(buffer[_HEADER.size : _HEADER.size + model_len]).decode("utf-8", errors="replace")
+        if dtype != DTYPE_FLOAT32:
+            values = _decode_quantized(buffer, dtype, offset, dims)
+            return ([], "") if values is None else (values, model_name)
+        end = offset + dims * 4
+        if end > len(buffer):
+            return [], ""
+        if np is not None:
+            return np.frombuffer(buffer, dtype="<f4", count=dims, offset=offset), model_name
+        if sys.byteorder != "little":
+            values = array("f", bytes(buffer[offset:end]))
+            values.byteswap()
+            return values, model_name
+        return buffer[offset:end].cast("f"), model_name
+
+    try:
+        payload = json.loads(str(raw))
+    except (ValueError, TypeError, json.JSONDecodeError):
+        return [], ""
+    try:
+        return [float(item) for item in payload], ""
+    except (ValueError, TypeError):
+        return [], ""
@@ -0,0 +1,41 @@
+"""Atomic replacement of files that readers in other processes may open at any time."""
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+import os
+from pathlib import Path
+import secrets
+from typing import BinaryIO, Iterator
+
+
+@contextmanager
+def atomic_file(path: Path) -> Iterator[BinaryIO]:
+    """Binary handle on a temporary file that replaces ``path`` when the block exits cleanly.
+
+    The data is fsynced before the rename, so readers see either the old file or the
+    complete new one. The temporary file is created with mode 0o666 less the umask, as
+    a plain ``open`` would create ``path``; ``tempfile.mkstemp`` would make it
+    owner-only, shutting out readers running as another user. On error the temporary
+    file is removed and ``path`` is left untouched.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    while True:
+        temporary = path.with_name(f".{path.name}.{secrets.token_hex(4)}")
+        try:
+            descriptor = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o666)
+        except FileExistsError:
+            continue
+        break
+    try:
+        with os.fdopen(descriptor, "wb") as handle:
+            yield handle
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(temporary, path)
+    except BaseException:
+        try:
+            os.unlink(temporary)
+        except FileNotFoundError:
+            pass
+        raise
@@ -1,18 +1,50 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from pathlib import Path
+import atexit
 import hashlib
 import json
+import os
 import sqlite3
 import statistics
+import threading
 import time
+from typing import Sequence
 
+from markdownkeeper.config import FIRST_STAGES, SEARCH_PIPELINES, CacheConfig, IndexConfig, SearchConfig
 from markdownkeeper.metadata.summarizer import generate_summary
 from markdownkeeper.processor.parser import ParsedDocument
-from markdownkeeper.query.embeddings import compute_embedding, cosine_similarity, is_model_embedding_available
-from markdownkeeper.query.faiss_index import FaissIndex, is_faiss_available as is_faiss_index_available
+from markdownkeeper.query.embeddings import (
+    EMBEDDING_BATCH_SIZE,
+    benchmark_embedding_throughput,
+    compute_embedding,
+    compute_embeddings,
+    compute_query_embedding,
+    compute_query_embeddings,
+    cosine_similarity,
+    drain_query_embedding_counts,
+    is_model_embedding_available,
+    query_embedding_cache_stats,
+)
+from markdownkeeper.query.faiss_index import (
+    FALLBACK_SUFFIX,
+    META_SUFFIX,
+    FaissIndex,
+    benchmark_fallback_search,
+    benchmark_index_types,
+    is_faiss_available as is_faiss_index_available,
+)
+from markdownkeeper.query.parallel import SharedVectorSnapshot, parallel_partial_scores
+from markdownkeeper.query.ranking import TopK, kth_largest
+from markdownkeeper.query.trace import QueryTrace, count as trace_count, stage as trace_stage
+from markdownkeeper.query.vector_store import VectorMatrix
+from markdownkeeper.storage.codec import PRECISIONS, decode_embedding, encode_embedding
+from markdownkeeper.storage.files import atomic_file
+from markdownkeeper.storage.schema import refresh_trigram_index
+from markdownkeeper.storage.vector_file import open_vector_file, read_vector_file_header, write_vector_file
 
 
 @dataclass(slots=True)
@@ -26,6 +58,57 @@ class DocumentRecord:
     updated_at: str
 
 
+@dataclass(slots=True)
+class DocumentMatch(DocumentRecord):
+    matches: list[dict[str, object]]
+
+
+@dataclass(slots=True)
+class PassageRecord:
+    chunk_id: int
+    document_id: int
+    path: str
+    title: str
+    heading_path: str
+    chunk_index: int
+    content: str
+    token_count: int
+    score: float
+
+
+@dataclass(slots=True)
+class SearchFilters:
+    """Restrictions applied to semantic search before any document is scored.
+
+    Every given field must hold: ``tags`` and ``concepts`` require all listed names,
+    ``path_prefix`` matches the stored path, and ``updated_after`` compares against the
+    ISO-8601 ``updated_at`` timestamp.
+    """
+
+    category: str | None = None
+    tags: tuple[str, ...] = ()
+    concepts: tuple[str, ...] = ()
+    path_prefix: str | None = None
+    updated_after: str | None = None
+
+    def is_empty(self) -> bool:
+        return not (self.category or self.tags or self.concepts or self.path_prefix or self.updated_after)
+
+    def cache_key(self) -> str:
+        if self.is_empty():
+            return ""
+        return json.dumps(
+            [
+                self.category or "",
+                sorted({tag.strip().lower() for tag in self.tags}),
+                sorted({concept.strip().lower() for concept in self.concepts}),
+                self.path_prefix or "",
+                self.updated_after or "",
+            ],
+            separators=(",", ":"),
+        )
+
+
 @dataclass(slots=True)
 class DocumentDetail(DocumentRecord):
     headings: list[dict[str, object]]
@@ -92,17 +175,634 @@ def _chunk_document(parsed: ParsedDocument, max_words: int = 120) -> list[tuple[
     return chunks
 
 
+def _decode_embedding(raw: object) -> Sequence[float]:
+    """Zero-copy view of a stored embedding (see ``storage.codec``)."""
+    vector, _ = decode_embedding(raw)
+    return vector
+
+
 def _deserialize_embedding(raw: object) -> list[float]:
-    if raw is None:
-        return []
+    return [float(item) for item in _decode_embedding(raw)]
+
+
+def _vector_precision(connection: sqlite3.Connection) -> str:
+    """Precision new embeddings are stored and held in memory at (``float32`` by default)."""
     try:
-        payload = json.loads(str(raw))
-    except (ValueError, TypeError, json.JSONDecodeError):
-        return []
+        row = connection.execute("SELECT value FROM settings WHERE key = 'vector_precision'").fetchone()
+    except sqlite3.OperationalError:
+        return "float32"
+    return str(row[0]) if row is not None and str(row[0]) in PRECISIONS else "float32"
+
+
+def _set_vector_precision(connection: sqlite3.Connection, precision: str) -> None:
+    if precision not in PRECISIONS:
+        raise ValueError(f"unknown vector precision: {precision}")
+    connection.execute(
+        "INSERT INTO settings(key, value) VALUES('vector_precision', ?) ON CONFLICT(key) DO UPDATE SET value=excluded.value",
+        (precision,),
+    )
+
+
+# Number of document_changes rows kept for incremental refresh of resident state.
+_CHANGE_LOG_RETENTION = 10_000
+
+
+def _record_change(connection: sqlite3.Connection, document_id: int | None, change_type: str) -> int:
+    cursor = connection.execute(
+        "INSERT INTO document_changes(document_id, change_type, changed_at) VALUES(?, ?, ?)",
+        (document_id, change_type, _utc_now_iso()),
+    )
+    generation = int(cursor.lastrowid or 0)
+    connection.execute(
+        "DELETE FROM document_changes WHERE id <= ?",
+        (generation - _CHANGE_LOG_RETENTION,),
+    )
+    return generation
+
+
+def _current_generation(connection: sqlite3.Connection) -> int:
+    row = connection.execute("SELECT COALESCE(MAX(id), 0) FROM document_changes").fetchone()
+    return int(row[0])
+
+
+class _ResidentVectors:
+    """Document and chunk embeddings for one database, kept in memory between queries.
+
+    The matrices follow the database's ``vector_precision`` setting unless the store
+    was created with a fixed ``precision`` (as ``evaluate_semantic_precision`` does).
+    """
+
+    def __init__(self, identity: tuple[int, int], precision: str | None = None) -> None:
+        self.identity = identity
+        self.generation = -1
+        self.precision = precision
+        self.documents = VectorMatrix(precision or "float32")
+        self.chunks = VectorMatrix(precision or "float32")
+        self.lock = threading.Lock()
+        # Shared-memory copy for the worker pool. Documents changed since it was built
+        # are listed in ``snapshot_stale`` and scored in-process; None means the store
+        # was reloaded and the snapshot must be rebuilt.
+        self.snapshot: SharedVectorSnapshot | None = None
+        self.snapshot_stale: set[int] | None = None
+        self.snapshot_built = 0.0
+
+
+_RESIDENT_VECTORS: dict[str, _ResidentVectors] = {}
+_RESIDENT_VECTORS_LOCK = threading.Lock()
+
+# Per-thread precision override used while comparing precisions; see
+# ``evaluate_semantic_precision``.
+_PRECISION_OVERRIDE = threading.local()
+
+
+def _load_resident_rows(
+    connection: sqlite3.Connection,
+    resident: _ResidentVectors,
+    document_ids: list[int] | None = None,
+) -> None:
+    if document_ids is None:
+        precision = resident.precision or _vector_precision(connection)
+        if precision != resident.documents.precision:
+            resident.documents = VectorMatrix(precision)
+            resident.chunks = VectorMatrix(precision)
+        resident.documents.clear()
+        resident.chunks.clear()
+        doc_rows = connection.execute("SELECT document_id, embedding FROM embeddings").fetchall()
+        chunk_rows = connection.execute("SELECT id, document_id, embedding FROM document_chunks").fetchall()
+    else:
+        if not document_ids:
+            return
+        for document_id in document_ids:
+            resident.documents.remove(document_id)
+            resident.chunks.remove_owner(document_id)
+        placeholders = ",".join("?" for _ in document_ids)
+        doc_rows = connection.execute(
+            f"SELECT document_id, embedding FROM embeddings WHERE document_id IN ({placeholders})",
+            tuple(document_ids),
+        ).fetchall()
+        chunk_rows = connection.execute(
+            f"SELECT id, document_id, embedding FROM document_chunks WHERE document_id IN ({placeholders})",
+            tuple(document_ids),
+        ).fetchall()
+
+    for document_id, raw in doc_rows:
+        resident.documents.set(int(document_id), _decode_embedding(raw))
+    for chunk_id, document_id, raw in chunk_rows:
+        resident.chunks.set(int(chunk_id), _decode_embedding(raw), owner=int(document_id))
+
+
+def _changes_since(connection: sqlite3.Connection, generation: int) -> tuple[int, set[int] | None]:
+    """Return the current generation and the document ids changed after ``generation``.
+
+    The id set is None when the change log cannot describe the gap (unknown or
+    future generation, pruned log entries, or a full rebuild in between).
+    """
+    current = _current_generation(connection)
+    if generation < 0 or generation > current:
+        return current, None
+    if generation == current:
+        return current, set()
+    changes = connection.execute(
+        "SELECT id, document_id, change_type FROM document_changes WHERE id > ? ORDER BY id ASC",
+        (generation,),
+    ).fetchall()
+    if not changes or int(changes[0][0]) != generation + 1:
+        return current, None
+    if any(str(row[2]) == "rebuild" for row in changes):
+        return current, None
+    return current, {int(row[1]) for row in changes if row[1] is not None}
+
+
+def _vector_file_path(database_path: Path) -> Path:
+    return database_path.parent / "vectors.bin"
+
+
+def _vector_file_token(connection: sqlite3.Connection) -> bytes | None:
     try:
-        return [float(item) for item in payload]
-    except (ValueError, TypeError):
-        return []
+        row = connection.execute("SELECT value FROM settings WHERE key = 'vector_file_token'").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    try:
+        return bytes.fromhex(str(row[0])) if row is not None else None
+    except ValueError:
+        return None
+
+
+def _map_vector_file(connection: sqlite3.Connection, resident: _ResidentVectors, database_path: Path) -> bool:
+    """Point ``resident`` at the memory-mapped vector file when it can stand in for a full reload.
+
+    The file must have been written for this database at its current precision, and the
+    change log must still cover every change made after the file's generation.
+    """
+    if resident.precision is not None:
+        return False
+    token = _vector_file_token(connection)
+    if token is None:
+        return False
+    mapped = open_vector_file(_vector_file_path(database_path))
+    if mapped is None or mapped.header.token != token or mapped.header.precision != _vector_precision(connection):
+        return False
+    if _changes_since(connection, mapped.header.generation)[1] is None:
+        return False
+    resident.documents = mapped.documents
+    resident.chunks = mapped.chunks
+    resident.generation = mapped.header.generation
+    return True
+
+
+def _sync_resident_vectors(
+    connection: sqlite3.Connection,
+    resident: _ResidentVectors,
+    database_path: Path | None = None,
+) -> None:
+    generation, changed_ids = _changes_since(connection, resident.generation)
+    if changed_ids is None:
+        # Whether the rows are mapped or reloaded, the shared snapshot no longer matches.
+        resident.snapshot_stale = None
+    if changed_ids is None and database_path is not None and _map_vector_file(connection, resident, database_path):
+        generation, changed_ids = _changes_since(connection, resident.generation)
+    if changed_ids is None:
+        _load_resident_rows(connection, resident)
+    elif changed_ids:
+        _load_resident_rows(connection, resident, sorted(changed_ids))
+        if resident.snapshot_stale is not None:
+            resident.snapshot_stale |= changed_ids
+    resident.generation = generation
+
+
+def _resident_vectors(connection: sqlite3.Connection, database_path: Path) -> _ResidentVectors:
+    """Return the in-process vector store for ``database_path``, refreshed to the latest generation.
+
+    Callers must hold ``resident.lock`` while scoring against the returned store.
+    """
+    stat = os.stat(database_path)
+    identity = (int(stat.st_dev), int(stat.st_ino))
+    key = str(Path(database_path).resolve())
+    precision = getattr(_PRECISION_OVERRIDE, "value", None)
+    if precision is not None:
+        key = f"{key}#{precision}"
+    with _RESIDENT_VECTORS_LOCK:
+        resident = _RESIDENT_VECTORS.get(key)
+        if resident is None or resident.identity != identity:
+            resident = _ResidentVectors(identity, precision)
+            _RESIDENT_VECTORS[key] = resident
+    with resident.lock:
+        _sync_resident_vectors(connection, resident, database_path)
+    return resident
+
+
+# Logged changes an upsert lets the vector file fall behind before rewriting it; readers
+# apply the changes in between from SQLite, so the full rewrite is amortized.
+_VECTOR_FILE_REFRESH_CHANGES = 256
+
+
+def _refresh_vector_file(connection: sqlite3.Connection, database_path: Path, force: bool = False) -> None:
+    """Rewrite the vector file at the current generation when it is missing, foreign or lagging.
+
+    The file is only an accelerator (SQLite stays authoritative), so write failures are ignored.
+    """
+    path = _vector_file_path(database_path)
+    if not force:
+        header = read_vector_file_header(path)
+        if (
+            header is not None
+            and header.token == _vector_file_token(connection)
+            and _current_generation(connection) - header.generation < _VECTOR_FILE_REFRESH_CHANGES
+        ):
+            return
+    resident = _ResidentVectors((0, 0))
+    _sync_resident_vectors(connection, resident, database_path)
+    token = os.urandom(16)
+    try:
+        write_vector_file(path, resident.documents, resident.chunks, resident.generation, token)
+    except OSError:
+        return
+    connection.execute(
+        "INSERT INTO settings(key, value) VALUES('vector_file_token', ?) ON CONFLICT(key) DO UPDATE SET value=excluded.value",
+        (token.hex(),),
+    )
+    connection.commit()
+
+
+# Minimum number of documents taken from the FAISS index before the full ranking blend.
+_CANDIDATE_BUDGET = 200
+
+_CANDIDATE_INDEXES: dict[str, tuple[tuple[int, ...], FaissIndex | None]] = {}
+# Guards the cache and the cached indexes, which writes update in place.
+_CANDIDATE_INDEXES_LOCK = threading.Lock()
+
+# In-place index updates applied since the index was last saved, keyed like the cache.
+# The saved index may lag by this many changes; queries re-score the lagging documents
+# from the change log, so the save is amortized.
+_INDEX_SAVE_CHANGES = 64
+_UNSAVED_INDEX_CHANGES: dict[str, tuple[Path, int]] = {}
+
+# Changes a startup check applies to a lagging index before rebuilding it instead.
+_INDEX_DELTA_LIMIT = 1_000
+_INDEX_MANIFEST_VERSION = 1
+
+
+def _faiss_index_path(database_path: Path) -> Path:
+    return database_path.parent / "faiss.index"
+
+
+def _index_manifest_path(database_path: Path) -> Path:
+    return database_path.parent / "faiss.manifest.json"
+
+
+def _index_checksum(index_path: Path) -> str:
+    """SHA-256 over the saved index files (FAISS index and metadata, or the fallback file)."""
+    digest = hashlib.sha256()
+    for candidate in (index_path, index_path.with_suffix(META_SUFFIX), index_path.with_suffix(FALLBACK_SUFFIX)):
+        if not candidate.exists():
+            continue
+        digest.update(candidate.name.encode("utf-8"))
+        with open(candidate, "rb") as handle:
+            for block in iter(lambda: handle.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def _embedding_model(connection: sqlite3.Connection) -> str:
+    """The model most stored document embeddings came from; empty when there are none."""
+    row = connection.execute(
+        "SELECT model_name FROM embeddings GROUP BY model_name ORDER BY COUNT(*) DESC, model_name LIMIT 1"
+    ).fetchone()
+    return str(row[0] or "") if row is not None else ""
+
+
+def _stored_index_manifest(connection: sqlite3.Connection) -> dict[str, object] | None:
+    try:
+        row = connection.execute("SELECT value FROM settings WHERE key = 'index_manifest'").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    try:
+        return json.loads(str(row[0])) if row is not None else None
+    except ValueError:
+        return None
+
+
+def _read_index_manifest(database_path: Path) -> dict[str, object] | None:
+    try:
+        manifest = json.loads(_index_manifest_path(database_path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    return manifest if isinstance(manifest, dict) else None
+
+
+def _write_index_manifest(connection: sqlite3.Connection, database_path: Path, index: FaissIndex) -> None:
+    """Record what the just-saved index holds, next to it and in the database (caller commits).
+
+    The file is replaced atomically. The database copy is what a startup check trusts:
+    an index whose manifest file or checksum disagrees with it is rebuilt.
+    """
+    index_path = _faiss_index_path(database_path)
+    manifest = {
+        "version": _INDEX_MANIFEST_VERSION,
+        "generation": index.generation,
+        "documents": len(index),
+        "dimensions": index.dimensions,
+        "model_name": index.model_name,
+        "index_type": index.index_type,
+        "checksum": _index_checksum(index_path),
+    }
+    encoded = json.dumps(manifest, sort_keys=True)
+    with atomic_file(_index_manifest_path(database_path)) as handle:
+        handle.write(encoded.encode("utf-8"))
+    connection.execute(
+        "INSERT INTO settings(key, value) VALUES('index_manifest', ?) ON CONFLICT(key) DO UPDATE SET value=excluded.value",
+        (encoded,),
+    )
+
+
+def _candidate_index_stamp(index_path: Path) -> tuple[int, ...] | None:
+    """Modification times of the index files, or None when no index has been saved.
+
+    Covers the metadata too, since a save replaces the index and its labels one after
+    the other.
+    """
+    candidates = (
+        index_path,
+        index_path.with_suffix(META_SUFFIX),
+        index_path.with_suffix(FALLBACK_SUFFIX),
+        index_path.with_suffix(".json"),
+    )
+    stamps = tuple(candidate.stat().st_mtime_ns if candidate.exists() else -1 for candidate in candidates)
+    return None if max(stamps) < 0 else stamps
+
+
+def _candidate_index(database_path: Path) -> FaissIndex | None:
+    """Load the index saved by ``regenerate_embeddings`` once per process, reloading when it is rewritten."""
+    index_path = _faiss_index_path(database_path)
+    stamp = _candidate_index_stamp(index_path)
+    if stamp is None:
+        return None
+    key = str(index_path.resolve())
+    with _CANDIDATE_INDEXES_LOCK:
+        cached = _CANDIDATE_INDEXES.get(key)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        index: FaissIndex | None = FaissIndex()
+        try:
+            if not index.load(index_path) or not len(index):
+                index = None
+        except (OSError, ValueError, KeyError, RuntimeError):
+            index = None
+        _CANDIDATE_INDEXES[key] = (stamp, index)
+        _UNSAVED_INDEX_CHANGES.pop(key, None)
+    return index
+
+
+def _save_candidate_index(database_path: Path, key: str, index: FaissIndex) -> None:
+    """Persist an updated cached index and its manifest unless the file was rewritten since it was loaded.
+
+    Callers hold ``_CANDIDATE_INDEXES_LOCK``.
+    """
+    index_path = _faiss_index_path(database_path)
+    cached = _CANDIDATE_INDEXES.get(key)
+    if cached is None or cached[1] is not index or cached[0] != _candidate_index_stamp(index_path):
+        return
+    try:
+        index.save(index_path)
+        with sqlite3.connect(database_path) as connection:
+            _write_index_manifest(connection, database_path, index)
+            connection.commit()
+    except (OSError, RuntimeError, sqlite3.Error):
+        return
+    stamp = _candidate_index_stamp(index_path)
+    if stamp is not None:
+        _CANDIDATE_INDEXES[key] = (stamp, index)
+    _UNSAVED_INDEX_CHANGES.pop(key, None)
+
+
+def _update_candidate_index(connection: sqlite3.Connection, database_path: Path, save: bool = False) -> bool:
+    """Apply committed document changes to the saved candidate index in place.
+
+    Does nothing until ``regenerate_embeddings`` has built an index, or when the change
+    log can't bridge the gap (``check_candidate_index`` or the next regenerate rebuilds
+    the index then). ``save`` writes the index out even below the save threshold.
+    Returns whether the index now reflects the current generation.
+    """
+    index_path = _faiss_index_path(database_path)
+    index = _candidate_index(database_path)
+    if index is None:
+        return False
+    key = str(index_path.resolve())
+    with _CANDIDATE_INDEXES_LOCK:
+        cached = _CANDIDATE_INDEXES.get(key)
+        if cached is None or cached[1] is not index:
+            return False
+        current, changed = _changes_since(connection, index.generation)
+        if changed is None:
+            return False
+        if changed:
+            placeholders = ",".join("?" for _ in changed)
+            rows = connection.execute(
+                f"SELECT document_id, embedding FROM embeddings WHERE document_id IN ({placeholders})",
+                sorted(changed),
+            ).fetchall()
+            vectors = {int(row[0]): _deserialize_embedding(row[1]) for row in rows if row[1]}
+            vectors = {doc_id: vec for doc_id, vec in vectors.items() if len(vec) == index.dimensions}
+            try:
+                updated = index.remove(sorted(changed - vectors.keys())) and index.update(
+                    list(vectors), list(vectors.values())
+                )
+            except (ValueError, RuntimeError):
+                updated = False
+            if not updated:
+                return False
+            _, unsaved = _UNSAVED_INDEX_CHANGES.get(key, (database_path, 0))
+            _UNSAVED_INDEX_CHANGES[key] = (database_path, unsaved + len(changed))
+        index.generation = current
+        unsaved = _UNSAVED_INDEX_CHANGES.get(key, (database_path, 0))[1]
+        if unsaved >= _INDEX_SAVE_CHANGES or (save and unsaved):
+            _save_candidate_index(database_path, key, index)
+    return True
+
+
+def _rebuild_candidate_index(
+    connection: sqlite3.Connection,
+    database_path: Path,
+    index_config: IndexConfig | None = None,
+) -> FaissIndex:
+    """Build the candidate index from the stored embeddings, save it and record its manifest."""
+    index = FaissIndex(index_config)
+    rows = connection.execute(
+        "SELECT document_id, embedding FROM embeddings WHERE embedding IS NOT NULL ORDER BY document_id"
+    ).fetchall()
+    embeddings = [(int(row[0]), _deserialize_embedding(row[1])) for row in rows if row[1]]
+    if embeddings:
+        dimensions = len(embeddings[0][1])
+        embeddings = [(doc_id, vec) for doc_id, vec in embeddings if len(vec) == dimensions]
+    index.build(embeddings)
+    index.generation = _current_generation(connection)
+    index.model_name = _embedding_model(connection)
+    index.save(_faiss_index_path(database_path))
+    _write_index_manifest(connection, database_path, index)
+    connection.commit()
+    return index
+
+
+def _index_manifest_mismatch(
+    connection: sqlite3.Connection,
+    database_path: Path,
+    stored: dict[str, object] | None,
+) -> str | None:
+    """Why the saved index can't be trusted, or None when its manifest checks out."""
+    if stored is None:
+        return "no manifest recorded in the database"
+    if stored.get("version") != _INDEX_MANIFEST_VERSION:
+        return "manifest version changed"
+    if _read_index_manifest(database_path) != stored:
+        return "manifest file differs from the database"
+    if stored.get("checksum") != _index_checksum(_faiss_index_path(database_path)):
+        return "index checksum mismatch"
+    model_name = _embedding_model(connection)
+    if model_name and model_name != stored.get("model_name"):
+        return "embedding model changed"
+    return None
+
+
+def check_candidate_index(database_path: Path, index_config: IndexConfig | None = None) -> dict[str, object]:
+    """Bring the saved FAISS candidate index up to date at startup, as cheaply as possible.
+
+    The index's manifest (generation, document count, model name, checksum) is compared
+    with the copy recorded in the database. A matching index at the current generation
+    is reused; one a few changes behind gets just those changes applied; anything else
+    is rebuilt from the stored embeddings. ``status`` is ``absent`` (no index has been
+    built yet), ``current``, ``delta`` or ``rebuilt``.
+    """
+    with sqlite3.connect(database_path) as connection:
+        stored = _stored_index_manifest(connection)
+        if stored is None and _candidate_index_stamp(_faiss_index_path(database_path)) is None:
+            return {"status": "absent", "reason": "", "generation": _current_generation(connection), "documents": 0, "changes": 0}
+
+        status = "rebuilt"
+        changes = 0
+        reason = _index_manifest_mismatch(connection, database_path, stored)
+        index = None if reason or stored is None else _candidate_index(database_path)
+        if reason is None and stored is not None:
+            if index is None or index.generation != stored.get("generation") or len(index) != stored.get("documents"):
+                reason = "index does not match its manifest"
+        if reason is None and index is not None:
+            _, changed = _changes_since(connection, index.generation)
+            if changed is None:
+                reason = "change log does not reach the index generation"
+            elif len(changed) > _INDEX_DELTA_LIMIT:
+                reason = f"{len(changed)} changes behind"
+            elif not changed:
+                status = "current"
+            elif _update_candidate_index(connection, database_path, save=True):
+                status = "delta"
+                changes = len(changed)
+            else:
+                reason = "changes could not be applied in place"
+        if reason is not None or index is None:
+            index = _rebuild_candidate_index(connection, database_path, index_config)
+
+        return {
+            "status": status,
+            "reason": reason or "",
+            "generation": index.generation,
+            "documents": len(index),
+            "changes": changes,
+        }
+
+
+def _flush_candidate_indexes() -> None:
+    with _CANDIDATE_INDEXES_LOCK:
+        for key, (database_path, _) in list(_UNSAVED_INDEX_CHANGES.items()):
+            cached = _CANDIDATE_INDEXES.get(key)
+            if cached is not None and cached[1] is not None:
+                _save_candidate_index(database_path, key, cached[1])
+
+
+atexit.register(_flush_candidate_indexes)
+
+
+def _semantic_candidates(
+    connection: sqlite3.Connection,
+    database_path: Path,
+    query_embedding: list[float],
+    limit: int,
+) -> list[int] | None:
+    """Top document ids from the FAISS index plus documents changed since it was built.
+
+    Returns None when every document should be scored: no usable index, a corpus
+    smaller than the candidate budget, or an index the change log can't reconcile.
+    """
+    index = _candidate_index(database_path)
+    if index is None or index.dimensions != len(query_embedding):
+        return None
+    budget = max(_CANDIDATE_BUDGET, limit * 4)
+    if len(index) <= budget:
+        return None
+    _, stale_ids = _changes_since(connection, index.generation)
+    if stale_ids is None or len(stale_ids) > budget:
+        return None
+    with _CANDIDATE_INDEXES_LOCK:
+        hits = index.search(query_embedding, k=budget + len(stale_ids))
+    candidates = [doc_id for doc_id, _ in hits if doc_id not in stale_ids][:budget]
+    return candidates + sorted(stale_ids)
+
+
+def _prefix_upper_bound(prefix: str) -> str:
+    """Smallest string greater than every string starting with ``prefix``."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _filtered_document_ids(
+    connection: sqlite3.Connection,
+    filters: SearchFilters,
+    document_ids: Sequence[int] | None = None,
+) -> list[int]:
+    """Ids of documents (optionally among ``document_ids``) passing every filter.
+
+    Each condition is shaped to use an index: category equality, a path range instead
+    of ``LIKE``, an ``updated_at`` range, and tag/concept lookups keyed by name.
+    """
+    conditions: list[str] = []
+    params: list[object] = []
+    if filters.category:
+        conditions.append("d.category = ?")
+        params.append(filters.category)
+    if filters.path_prefix:
+        conditions.append("d.path >= ? AND d.path < ?")
+        params.extend([filters.path_prefix, _prefix_upper_bound(filters.path_prefix)])
+    if filters.updated_after:
+        conditions.append("d.updated_at > ?")
+        params.append(filters.updated_after)
+    for table, link_table, link_column, names in (
+        ("tags", "document_tags", "tag_id", filters.tags),
+        ("concepts", "document_concepts", "concept_id", filters.concepts),
+    ):
+        wanted = sorted({name.strip().lower() for name in names if name.strip()})
+        if not wanted:
+            continue
+        conditions.append(
+            f"""
+            d.id IN (
+                SELECT link.document_id
+                FROM {link_table} link
+                JOIN {table} named ON named.id = link.{link_column}
+                WHERE named.name IN ({",".join("?" for _ in wanted)})
+                GROUP BY link.document_id
+                HAVING COUNT(DISTINCT named.id) = ?
+            )
+            """
+        )
+        params.extend(wanted)
+        params.append(len(wanted))
+    if document_ids is not None:
+        if not document_ids:
+            return []
+        conditions.append(f"d.id IN ({','.join('?' for _ in document_ids)})")
+        params.extend(document_ids)
+
+    sql = "SELECT d.id FROM documents d"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    return [int(row[0]) for row in connection.execute(sql, params).fetchall()]
 
 
 def upsert_document(database_path: Path, file_path: Path, parsed: ParsedDocument) -> int:
@@ -183,22 +883,8 @@ def upsert_document(database_path: Path, file_path: Path, parsed: ParsedDocument
                 (document_id, concept_id),
             )
 
+        dtype = PRECISIONS[_vector_precision(connection)]
         chunks = _chunk_document(parsed)
-        chunk_rows: list[tuple[int, int, str, str, int, str]] = []
-        for idx, heading_path, content, token_count in chunks:
-            chunk_embedding, _ = compute_embedding(content)
-            chunk_rows.append(
-                (document_id, idx, heading_path, content, token_count, json.dumps(chunk_embedding))
-            )
-
-        connection.executemany(
-            """
-            INSERT INTO document_chunks(document_id, chunk_index, heading_path, content, token_count, embedding)
-            VALUES(?, ?, ?, ?, ?, ?)
-            """,
-            chunk_rows,
-        )
-
         embedding_source = " ".join(
             [
                 str(parsed.title or ""),
@@ -209,7 +895,21 @@ def upsert_document(database_path: Path, file_path: Path, parsed: ParsedDocument
                 str(parsed.category or ""),
             ]
         )
-        embedding, model_name = compute_embedding(embedding_source)
+        # Every chunk and the document itself are encoded in one batched model call.
+        vectors, model_name = compute_embeddings([chunk[2] for chunk in chunks] + [embedding_source])
+        embedding = vectors.pop()
+
+        connection.executemany(
+            """
+            INSERT INTO document_chunks(document_id, chunk_index, heading_path, content, token_count, embedding)
+            VALUES(?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (document_id, idx, heading_path, content, token_count, encode_embedding(vector, model_name, dtype))
+                for (idx, heading_path, content, token_count), vector in zip(chunks, vectors)
+            ],
+        )
+
         connection.execute(
             """
             INSERT INTO embeddings(document_id, embedding, model_name, generated_at)
@@ -219,11 +919,17 @@ def upsert_document(database_path: Path, file_path: Path, parsed: ParsedDocument
               model_name=excluded.model_name,
               generated_at=excluded.generated_at
             """,
-            (document_id, json.dumps(embedding), model_name, now),
+            (document_id, encode_embedding(embedding, model_name, dtype), model_name, now),
         )
 
-        _invalidate_cache(connection)
+        if _has_trigram_index(connection):
+            refresh_trigram_index(connection, document_id)
+
+        _record_change(connection, document_id, "upsert")
+        _CACHE_HITS.flush(connection, database_path)
         connection.commit()
+        _refresh_vector_file(connection, database_path)
+        _update_candidate_index(connection, database_path)
 
     return document_id
 
@@ -231,11 +937,17 @@ def upsert_document(database_path: Path, file_path: Path, parsed: ParsedDocument
 def delete_document_by_path(database_path: Path, file_path: Path) -> bool:
     with sqlite3.connect(database_path) as connection:
         connection.execute("PRAGMA foreign_keys = ON;")
+        row = connection.execute(
+            "SELECT id FROM documents WHERE path = ?", (str(file_path),)
+        ).fetchone()
         deleted = connection.execute(
             "DELETE FROM documents WHERE path = ?", (str(file_path),)
         ).rowcount
-        _invalidate_cache(connection)
+        if row is not None:
+            _record_change(connection, int(row[0]), "delete")
+        _CACHE_HITS.flush(connection, database_path)
         connection.commit()
+        _update_candidate_index(connection, database_path)
         return bool(deleted)
 
 
@@ -290,9 +1002,314 @@ def _cosine_similarity(left: list[float], right: list[float]) -> float:
     return cosine_similarity(left, right)
 
 
-def _fetch_cache(connection: sqlite3.Connection, query_hash: str, ttl_seconds: int = 3600) -> list[int] | None:
+# bm25() column weights for documents_fts(path, title, summary, content).
+_BM25_WEIGHTS = (1.0, 2.0, 1.5, 1.0)
+
+
+def _has_fts(connection: sqlite3.Connection) -> bool:
+    row = connection.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'documents_fts'"
+    ).fetchone()
+    return row is not None
+
+
+def _has_trigram_index(connection: sqlite3.Connection) -> bool:
+    row = connection.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'documents_trigram'"
+    ).fetchone()
+    return row is not None
+
+
+def _bm25_query(
+    select: str, query_tokens: set[str], document_ids: Sequence[int] | None
+) -> tuple[str, list[object]]:
+    match = " OR ".join(f'"{token}"' for token in sorted(query_tokens))
+    weights = ", ".join(str(weight) for weight in _BM25_WEIGHTS)
+    sql = f"SELECT {select.format(bm25=f'-bm25(documents_fts, {weights})')} FROM documents_fts WHERE documents_fts MATCH ?"
+    params: list[object] = [match]
+    if document_ids is not None:
+        sql += f" AND rowid IN ({','.join('?' for _ in document_ids)})"
+        params.extend(document_ids)
+    return sql, params
+
+
+def _lexical_best(
+    connection: sqlite3.Connection,
+    query_tokens: set[str],
+    document_ids: Sequence[int] | None = None,
+) -> float | None:
+    """Best raw BM25 score within ``document_ids``; the normalizer ``_lexical_scores`` uses."""
+    if not query_tokens or not _has_fts(connection) or (document_ids is not None and not document_ids):
+        return None
+    # bm25() cannot be aggregated, so take the best row by ordering on it instead.
+    sql, params = _bm25_query("{bm25}", query_tokens, document_ids)
+    weights = ", ".join(str(weight) for weight in _BM25_WEIGHTS)
+    row = connection.execute(f"{sql} ORDER BY bm25(documents_fts, {weights}) LIMIT 1", tuple(params)).fetchone()
+    return None if row is None or row[0] is None else float(row[0])
+
+
+def _lexical_scores(
+    connection: sqlite3.Connection,
+    query_tokens: set[str],
+    document_ids: Sequence[int] | None = None,
+    best: float | None = None,
+) -> dict[int, float]:
+    """Lexical relevance in [0, 1] for documents matching any query token.
+
+    Uses BM25 from the ``documents_fts`` index, normalized so the best match scores
+    1.0. Pass ``best`` (from ``_lexical_best``) to normalize against a wider scope than
+    ``document_ids``. Without FTS5 it falls back to the share of query tokens found in
+    the text.
+    """
+    if not query_tokens:
+        return {}
+    if not _has_fts(connection):
+        return _token_overlap_scores(connection, query_tokens, document_ids)
+    if document_ids is not None and not document_ids:
+        return {}
+
+    sql, params = _bm25_query("rowid, {bm25}", query_tokens, document_ids)
+    rows = connection.execute(sql, tuple(params)).fetchall()
+    if not rows:
+        return {}
+    if best is None:
+        best = max(float(row[1]) for row in rows)
+    if best <= 0.0:
+        return {int(row[0]): 1.0 for row in rows}
+    return {int(row[0]): min(1.0, max(0.0, float(row[1])) / best) for row in rows}
+
+
+def _token_overlap_scores(
+    connection: sqlite3.Connection,
+    query_tokens: set[str],
+    document_ids: Sequence[int] | None,
+) -> dict[int, float]:
+    sql = "SELECT id, path, title, summary, content FROM documents"
+    params: tuple[object, ...] = ()
+    if document_ids is not None:
+        if not document_ids:
+            return {}
+        sql += f" WHERE id IN ({','.join('?' for _ in document_ids)})"
+        params = tuple(document_ids)
+    scores: dict[int, float] = {}
+    for row in connection.execute(sql, params).fetchall():
+        haystack = " ".join(str(item or "") for item in row[1:])
+        overlap = len(query_tokens & _tokenize(haystack))
+        if overlap:
+            scores[int(row[0])] = overlap / len(query_tokens)
+    return scores
+
+
+def rebuild_search_index(database_path: Path) -> int:
+    """Rebuild the full-text search index from the documents table; returns documents indexed."""
+    with sqlite3.connect(database_path) as connection:
+        if not _has_fts(connection):
+            raise RuntimeError("SQLite was built without FTS5; full-text search index unavailable")
+        connection.execute("INSERT INTO documents_fts(documents_fts) VALUES('rebuild')")
+        connection.execute("INSERT INTO documents_fts(documents_fts) VALUES('optimize')")
+        if _has_trigram_index(connection):
+            refresh_trigram_index(connection)
+            connection.execute("INSERT INTO documents_trigram(documents_trigram) VALUES('optimize')")
+        count = int(connection.execute("SELECT COUNT(*) FROM documents").fetchone()[0])
+        connection.commit()
+    return count
+
+
+@dataclass(slots=True)
+class _CacheEntry:
+    id: int
+    document_ids: list[int]
+    generation: int
+    min_score: float | None
+    # Unix time the SQLite row was written; the TTL runs from here in both tiers.
+    created: float | None = None
+
+
+# A pending batch of cache hits is written once it holds this many entries or is this
+# old, so a read-only process still persists hit counts and ``last_accessed``.
+_CACHE_HIT_FLUSH_ENTRIES = 256
+_CACHE_HIT_FLUSH_SECONDS = 30.0
+
+# Result-cache counters persisted per database in ``cache_metrics``.
+_CACHE_METRICS = ("memory_hits", "sqlite_hits", "misses", "memory_evictions", "sqlite_evictions")
+# Query-embedding LRU counters persisted alongside them, by stored name.
+_QUERY_EMBEDDING_METRICS = {"hits": "query_embedding_hits", "misses": "query_embedding_misses"}
+
+
+@dataclass(slots=True)
+class _PendingCacheWrites:
+    started: float
+    # cache id -> (hits, last accessed, generation)
+    hits: dict[int, tuple[int, str, int]] = field(default_factory=dict)
+    # metric name -> increment
+    metrics: dict[str, int] = field(default_factory=dict)
+
+    def merge(self, other: "_PendingCacheWrites") -> None:
+        for cache_id, (hits, accessed, generation) in other.hits.items():
+            known_hits, known_accessed, known_generation = self.hits.get(cache_id, (0, "", generation))
+            self.hits[cache_id] = (hits + known_hits, max(accessed, known_accessed), max(generation, known_generation))
+        for name, amount in other.metrics.items():
+            self.metrics[name] = self.metrics.get(name, 0) + amount
+
+
+class _CacheHitBuffer:
+    """Cache-hit accounting held in memory so hits never take the SQLite write lock.
+
+    Pending hits, and increments of the persisted cache metrics, are flushed in one
+    batch by the next write on the same database (a cache store, an upsert or a
+    delete), by ``flush_cache_hits`` and at exit. A read path also flushes once a batch
+    is due (``_CACHE_HIT_FLUSH_ENTRIES`` entries, or ``_CACHE_HIT_FLUSH_SECONDS`` old),
+    and a timer started with each batch flushes it when no further query arrives.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._pending: dict[str, _PendingCacheWrites] = {}
+
+    def _batch(self, database: str) -> tuple[_PendingCacheWrites, bool]:
+        batch = self._pending.get(database)
+        if batch is not None:
+            return batch, False
+        batch = self._pending[database] = _PendingCacheWrites(time.monotonic())
+        return batch, True
+
+    @staticmethod
+    def _schedule(database: str) -> None:
+        timer = threading.Timer(_CACHE_HIT_FLUSH_SECONDS, _flush_cache_hits_quietly, (Path(database),))
+        timer.daemon = True
+        timer.start()
+
+    def record(self, database_path: Path, cache_id: int, generation: int) -> None:
+        database = str(database_path.resolve())
+        with self._lock:
+            batch, new_batch = self._batch(database)
+            hits, _, known_generation = batch.hits.get(cache_id, (0, "", generation))
+            batch.hits[cache_id] = (hits + 1, _utc_now_iso(), max(generation, known_generation))
+        if new_batch:
+            self._schedule(database)
+
+    def count(self, database_path: Path, name: str, amount: int = 1) -> None:
+        database = str(database_path.resolve())
+        with self._lock:
+            batch, new_batch = self._batch(database)
+            batch.metrics[name] = batch.metrics.get(name, 0) + amount
+        if new_batch:
+            self._schedule(database)
+
+    def due(self, database_path: Path) -> bool:
+        with self._lock:
+            batch = self._pending.get(str(database_path.resolve()))
+            if batch is None:
+                return False
+            return (
+                len(batch.hits) >= _CACHE_HIT_FLUSH_ENTRIES
+                or time.monotonic() - batch.started >= _CACHE_HIT_FLUSH_SECONDS
+            )
+
+    def take(self, database_path: Path) -> _PendingCacheWrites | None:
+        with self._lock:
+            return self._pending.pop(str(database_path.resolve()), None)
+
+    def restore(self, database_path: Path, taken: _PendingCacheWrites) -> None:
+        """Merge a batch from a failed flush back into the pending one."""
+        with self._lock:
+            batch, _ = self._batch(str(database_path.resolve()))
+            batch.merge(taken)
+
+    @staticmethod
+    def write(connection: sqlite3.Connection, batch: _PendingCacheWrites) -> None:
+        connection.executemany(
+            """
+            UPDATE query_cache
+            SET hit_count = hit_count + ?, last_accessed = ?, generation = MAX(generation, ?)
+            WHERE id = ?
+            """,
+            [(hits, accessed, generation, cache_id) for cache_id, (hits, accessed, generation) in batch.hits.items()],
+        )
+        connection.executemany(
+            """
+            INSERT INTO cache_metrics(name, value) VALUES(?, ?)
+            ON CONFLICT(name) DO UPDATE SET value = value + excluded.value
+            """,
+            list(batch.metrics.items()),
+        )
+
+    def flush(self, connection: sqlite3.Connection, database_path: Path) -> int:
+        """Write the pending batch through ``connection``; the caller commits. Returns hit rows updated."""
+        batch = self.take(database_path)
+        if batch is None:
+            return 0
+        self.write(connection, batch)
+        return len(batch.hits)
+
+    def databases(self) -> list[str]:
+        with self._lock:
+            return list(self._pending)
+
+
+_CACHE_HITS = _CacheHitBuffer()
+
+
+def flush_cache_hits(database_path: Path) -> int:
+    """Persist buffered cache-hit counts and cache metrics for ``database_path``.
+
+    Returns the cache entries updated. On a SQLite error the batch stays buffered for
+    the next flush and the error is raised.
+    """
+    batch = _CACHE_HITS.take(database_path)
+    if batch is None:
+        return 0
+    try:
+        with sqlite3.connect(database_path) as connection:
+            _CACHE_HITS.write(connection, batch)
+            connection.commit()
+    except sqlite3.Error:
+        _CACHE_HITS.restore(database_path, batch)
+        raise
+    return len(batch.hits)
+
+
+def _stored_cache_metrics(connection: sqlite3.Connection) -> dict[str, int]:
+    """Cache counters summed over every process that used this database."""
+    return {str(name): int(value) for name, value in connection.execute("SELECT name, value FROM cache_metrics")}
+
+
+def _flush_cache_hits_quietly(database_path: Path) -> None:
+    try:
+        flush_cache_hits(database_path)
+    except sqlite3.Error:
+        pass
+
+
+def _record_query_embedding_counts(database_path: Path) -> None:
+    """Add query-embedding LRU counts since the last call to the pending batch.
+
+    The LRU is process-wide, so a process searching several databases attributes its
+    counts to whichever database records them next.
+    """
+    for name, amount in zip(("hits", "misses"), drain_query_embedding_counts()):
+        if amount:
+            _CACHE_HITS.count(database_path, _QUERY_EMBEDDING_METRICS[name], amount)
+
+
+def _finish_search(database_path: Path) -> None:
+    """Bookkeeping for a read path once its connection is closed; flushes a due batch."""
+    _record_query_embedding_counts(database_path)
+    if _CACHE_HITS.due(database_path):
+        _flush_cache_hits_quietly(database_path)
+
+
+def _flush_all_cache_hits() -> None:
+    for database in _CACHE_HITS.databases():
+        _flush_cache_hits_quietly(Path(database))
+
+
+atexit.register(_flush_all_cache_hits)
+
+
+def _fetch_cache(connection: sqlite3.Connection, query_hash: str, ttl_seconds: int = 3600) -> _CacheEntry | None:
     row = connection.execute(
-        "SELECT id, result_json, created_at FROM query_cache WHERE query_hash = ?",
+        "SELECT id, result_json, created_at, generation, min_score FROM query_cache WHERE query_hash = ?",
         (query_hash,),
     ).fetchone()
     if row is None:
@@ -312,147 +1329,1081 @@ def _fetch_cache(connection: sqlite3.Connection, query_hash: str, ttl_seconds: i
         return None
 
     payload = json.loads(str(row[1]))
-    connection.execute(
-        "UPDATE query_cache SET hit_count = hit_count + 1, last_accessed = ? WHERE id = ?",
-        (_utc_now_iso(), cache_id),
+    return _CacheEntry(
+        id=cache_id,
+        document_ids=[int(item) for item in payload.get("document_ids", [])],
+        generation=int(row[3] if row[3] is not None else -1),
+        min_score=None if row[4] is None else float(row[4]),
+        created=created_ts,
     )
-    return [int(item) for item in payload.get("document_ids", [])]
 
 
-def _store_cache(connection: sqlite3.Connection, query_hash: str, query_text: str, document_ids: list[int]) -> None:
+def _store_cache(
+    connection: sqlite3.Connection,
+    query_hash: str,
+    query_text: str,
+    document_ids: list[int],
+    generation: int = -1,
+    min_score: float | None = None,
+) -> int:
+    """Store a result and return its row id. ``min_score`` is the lowest score a document
+    needs to enter it; None means any write makes the entry stale (e.g. lexical fallback
+    results)."""
     now = _utc_now_iso()
     connection.execute(
         """
-        INSERT INTO query_cache(query_hash, query_text, result_json, created_at, hit_count, last_accessed)
-        VALUES(?, ?, ?, ?, 0, ?)
+        INSERT INTO query_cache(query_hash, query_text, result_json, created_at, hit_count, last_accessed, generation, min_score)
+        VALUES(?, ?, ?, ?, 0, ?, ?, ?)
         ON CONFLICT(query_hash) DO UPDATE SET
           query_text=excluded.query_text,
           result_json=excluded.result_json,
           created_at=excluded.created_at,
-          last_accessed=excluded.last_accessed
+          last_accessed=excluded.last_accessed,
+          generation=excluded.generation,
+          min_score=excluded.min_score
         """,
-        (query_hash, query_text, json.dumps({"document_ids": document_ids}), now, now),
+        (query_hash, query_text, json.dumps({"document_ids": document_ids}), now, now, generation, min_score),
+    )
+    row = connection.execute("SELECT id FROM query_cache WHERE query_hash = ?", (query_hash,)).fetchone()
+    return int(row[0])
+
+
+def _prune_cache(connection: sqlite3.Connection, max_entries: int, ttl_seconds: int) -> int:
+    """Drop expired rows, then the least recently accessed rows beyond ``max_entries``."""
+    cutoff = datetime.fromtimestamp(time.time() - ttl_seconds, tz=timezone.utc).isoformat()
+    removed = connection.execute("DELETE FROM query_cache WHERE created_at < ?", (cutoff,)).rowcount
+    count = int(connection.execute("SELECT COUNT(*) FROM query_cache").fetchone()[0])
+    if count > max_entries:
+        removed += connection.execute(
+            """
+            DELETE FROM query_cache WHERE id IN (
+                SELECT id FROM query_cache ORDER BY COALESCE(last_accessed, created_at) ASC LIMIT ?
+            )
+            """,
+            (count - max(0, max_entries),),
+        ).rowcount
+    return int(removed)
+
+
+@dataclass(slots=True)
+class _MemoryCacheEntry:
+    entry: _CacheEntry
+    records: list[DocumentRecord]
+    created: float
+    size: int
+
+
+def _estimate_result_bytes(records: list[DocumentRecord]) -> int:
+    # Approximate: string payloads plus a fixed per-record and per-entry overhead.
+    return 256 + sum(
+        128 + len(record.path) + len(record.title) + len(record.summary) + len(record.category) + len(record.updated_at)
+        for record in records
     )
 
 
-def _invalidate_cache(connection: sqlite3.Connection) -> None:
-    """Clear all cached query results."""
-    connection.execute("DELETE FROM query_cache")
+class _ResultCache:
+    """In-process LRU of ranked results in front of the ``query_cache`` table.
+
+    Entries carry the ``_CacheEntry`` of their SQLite row, so they are revalidated
+    against the change log exactly like SQLite hits, then served without touching
+    ``documents``. Bounded by entry count and estimated bytes; the least recently
+    used entry is evicted first.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple[object, ...], _MemoryCacheEntry] = OrderedDict()
+        self._bytes = 0
+        self.memory_hits = 0
+        self.sqlite_hits = 0
+        self.misses = 0
+        self.memory_evictions = 0
+        self.sqlite_evictions = 0
+
+    def get(self, key: tuple[object, ...], ttl_seconds: int) -> _MemoryCacheEntry | None:
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is None:
+                return None
+            if time.time() - cached.created > ttl_seconds:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return cached
+
+    def put(
+        self,
+        key: tuple[object, ...],
+        entry: _CacheEntry,
+        records: list[DocumentRecord],
+        config: CacheConfig,
+        created: float | None = None,
+    ) -> list[tuple[object, ...]]:
+        """Insert an entry; returns the keys evicted to make room for it."""
+        size = _estimate_result_bytes(records)
+        if config.memory_max_entries <= 0 or size > config.memory_max_bytes:
+            return []
+        evicted: list[tuple[object, ...]] = []
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = _MemoryCacheEntry(entry, list(records), time.time() if created is None else created, size)
+            self._bytes += size
+            while len(self._entries) > config.memory_max_entries or self._bytes > config.memory_max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                evicted.append(oldest)
+        return evicted
+
+    def discard(self, key: tuple[object, ...]) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key: tuple[object, ...]) -> None:
+        cached = self._entries.pop(key, None)
+        if cached is not None:
+            self._bytes -= cached.size
+
+    def count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.memory_hits = 0
+            self.sqlite_hits = 0
+            self.misses = 0
+            self.memory_evictions = 0
+            self.sqlite_evictions = 0
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "memory_entries": len(self._entries),
+                "memory_bytes": self._bytes,
+                "memory_hits": self.memory_hits,
+                "sqlite_hits": self.sqlite_hits,
+                "misses": self.misses,
+                "memory_evictions": self.memory_evictions,
+                "sqlite_evictions": self.sqlite_evictions,
+            }
+
+
+_RESULT_CACHE = _ResultCache()
+
+
+def _result_cache_key(database_path: Path, query_hash: str) -> tuple[object, ...]:
+    stat = os.stat(database_path)
+    return (str(Path(database_path).resolve()), int(stat.st_dev), int(stat.st_ino), query_hash)
+
+
+def _count_cache_event(database: Path | str, name: str, amount: int = 1) -> None:
+    """Count a result-cache event for this process and in the database's ``cache_metrics``."""
+    _RESULT_CACHE.count(name, amount)
+    _CACHE_HITS.count(Path(database), name, amount)
+
 
+def _put_memory_result(
+    key: tuple[object, ...],
+    entry: _CacheEntry,
+    records: list[DocumentRecord],
+    config: CacheConfig,
+    created: float | None = None,
+) -> None:
+    for evicted in _RESULT_CACHE.put(key, entry, records, config, created=created):
+        _count_cache_event(str(evicted[0]), "memory_evictions")
 
-def semantic_search_documents(database_path: Path, query: str, limit: int = 10, ttl_seconds: int = 3600) -> list[DocumentRecord]:
+
+def result_cache_stats() -> dict[str, int]:
+    """Memory-tier size and cache counters of this process only; ``system_stats`` and
+    ``generate_health_report`` report the counters persisted for a database."""
+    return _RESULT_CACHE.stats()
+
+
+def clear_result_cache() -> None:
+    _RESULT_CACHE.clear()
+
+
+def _revalidate_cache(
+    connection: sqlite3.Connection,
+    database_path: Path,
+    entry: _CacheEntry,
+    cleaned: str,
+    filters: SearchFilters | None = None,
+) -> bool:
+    """Check a cached result against writes made since it was stored.
+
+    The entry stays valid when no changed document was in the result and none of them
+    now scores at least ``min_score``; only those changed documents are re-scored. A
+    stale entry is deleted here, so invalidation costs nothing on the write path. A
+    valid hit performs no writes; its accounting goes to the in-memory hit buffer.
+    """
+    generation, changed_ids = _changes_since(connection, entry.generation)
+    stale = changed_ids is None
+    if changed_ids:
+        if entry.min_score is None or changed_ids.intersection(entry.document_ids):
+            stale = True
+        else:
+            # Lexical scores are normalized within the re-scored set, so this can only
+            # over-estimate a changed document and err towards eviction.
+            rescore_ids = sorted(changed_ids)
+            if filters is not None and not filters.is_empty():
+                rescore_ids = _filtered_document_ids(connection, filters, rescore_ids)
+            if rescore_ids:
+                query_embedding, _ = compute_query_embedding(cleaned)
+                rescored = _score_documents(
+                    connection, database_path, _tokenize(cleaned), query_embedding, rescore_ids
+                )
+                stale = any(score >= entry.min_score for score, _ in rescored)
+
+    if stale:
+        connection.execute("DELETE FROM query_cache WHERE id = ?", (entry.id,))
+        return False
+    entry.generation = generation
+    _CACHE_HITS.record(database_path, entry.id, generation)
+    return True
+
+
+def _concept_matches(
+    connection: sqlite3.Connection,
+    query_tokens: set[str],
+    document_ids: Sequence[int] | None = None,
+) -> set[int]:
+    """Ids of documents tagged with any concept named by a query token, in one query."""
+    if not query_tokens:
+        return set()
+    tokens = sorted(query_tokens)
+    sql = f"""
+        SELECT DISTINCT dc.document_id
+        FROM document_concepts dc
+        JOIN concepts c ON c.id = dc.concept_id
+        WHERE c.name IN ({",".join("?" for _ in tokens)})
+    """
+    params: list[object] = list(tokens)
+    if document_ids is not None:
+        if not document_ids:
+            return set()
+        sql += f" AND dc.document_id IN ({','.join('?' for _ in document_ids)})"
+        params.extend(document_ids)
+    return {int(row[0]) for row in connection.execute(sql, params).fetchall()}
+
+
+_STATEMENT_TRACE = threading.local()
+
+
+def _trace_statements(connection: sqlite3.Connection) -> None:
+    """Count SQL statements on ``connection`` while a benchmark is measuring this thread.
+
+    Statements SQLite runs internally (FTS5 shadow-table reads, trigger bodies) are
+    traced with a leading ``--`` and are not counted as round trips.
+    """
+    if getattr(_STATEMENT_TRACE, "count", None) is None:
+        return
+
+    def _count(statement: str) -> None:
+        if not statement.lstrip().startswith("--"):
+            _STATEMENT_TRACE.count += 1
+
+    connection.set_trace_callback(_count)
+
+
+def semantic_search_documents(
+    database_path: Path,
+    query: str,
+    limit: int = 10,
+    ttl_seconds: int | None = None,
+    cache_config: CacheConfig | None = None,
+    filters: SearchFilters | None = None,
+    search_config: SearchConfig | None = None,
+    trace: QueryTrace | None = None,
+) -> list[DocumentRecord]:
+    """Hybrid-ranked documents for ``query``, served from the result cache when valid.
+
+    ``cache_config`` controls both cache tiers (defaults to ``CacheConfig()``);
+    ``ttl_seconds`` overrides its TTL. ``filters`` are resolved to a candidate id set
+    through the documents, tags and concepts indexes before any vector is scored.
+    ``search_config`` enables multi-process scoring for large corpora, or selects the
+    staged pipeline (see ``_staged_scores``). When ``trace`` is given, per-stage timings
+    and row/vector counts are recorded into it.
+    """
+    if search_config is not None:
+        _check_pipeline(search_config)
     cleaned = query.strip().lower()
     if not cleaned:
         return []
 
-    query_hash = hashlib.sha256(f"semantic:{cleaned}:{limit}".encode("utf-8")).hexdigest()
+    with trace_stage(trace, "total"):
+        results = _semantic_search_documents(
+            database_path, cleaned, query, limit, ttl_seconds, cache_config, filters, search_config, trace
+        )
+    _finish_search(database_path)
+    return results
+
 
-    with sqlite3.connect(database_path) as connection:
-        connection.execute("PRAGMA foreign_keys = ON;")
-        cached_ids = _fetch_cache(connection, query_hash, ttl_seconds=ttl_seconds)
-        if cached_ids:
-            placeholders = ",".join("?" for _ in cached_ids)
+def _semantic_query_hash(cleaned: str, limit: int, filters: SearchFilters | None, ranking: str = "") -> str:
+    cache_text = f"semantic:{cleaned}:{limit}"
+    if filters is not None:
+        cache_text += f":{filters.cache_key()}"
+    if ranking:
+        cache_text += f":ranking={ranking}"
+    return hashlib.sha256(cache_text.encode("utf-8")).hexdigest()
+
+
+def _cached_search(
+    connection: sqlite3.Connection,
+    database_path: Path,
+    config: CacheConfig,
+    ttl: int,
+    query_hash: str,
+    cleaned: str,
+    filters: SearchFilters | None,
+    trace: QueryTrace | None,
+) -> list[DocumentRecord] | None:
+    """Results from the memory tier or ``query_cache`` when still valid, else None."""
+    memory_key = _result_cache_key(database_path, query_hash)
+    with trace_stage(trace, "cache_lookup"):
+        cached = _RESULT_CACHE.get(memory_key, ttl)
+        if cached is not None:
+            if _revalidate_cache(connection, database_path, cached.entry, cleaned, filters):
+                _count_cache_event(database_path, "memory_hits")
+                trace_count(trace, "cache_memory_hit")
+                return list(cached.records)
+            _RESULT_CACHE.discard(memory_key)
+
+        entry = _fetch_cache(connection, query_hash, ttl_seconds=ttl)
+        if entry is not None and entry.document_ids and _revalidate_cache(
+            connection, database_path, entry, cleaned, filters
+        ):
+            placeholders = ",".join("?" for _ in entry.document_ids)
             rows = connection.execute(
                 f"""
                 SELECT id, path, title, summary, category, token_estimate, updated_at
                 FROM documents
                 WHERE id IN ({placeholders})
                 """,
-                tuple(cached_ids),
+                tuple(entry.document_ids),
             ).fetchall()
             by_id = {int(row[0]): row for row in rows}
-            ordered_rows = [by_id[item] for item in cached_ids if item in by_id]
-            connection.commit()
-            return _rows_to_records(ordered_rows)
+            ordered_rows = [by_id[item] for item in entry.document_ids if item in by_id]
+            records = _rows_to_records(ordered_rows)
+            _count_cache_event(database_path, "sqlite_hits")
+            # Keep the row's creation time so promotion does not restart the TTL.
+            _put_memory_result(memory_key, entry, records, config, created=entry.created)
+            trace_count(trace, "cache_sqlite_hit")
+            trace_count(trace, "rows_fetched", len(rows))
+            return records
+        _count_cache_event(database_path, "misses")
+    return None
+
+
+def _ranked_results(
+    database_path: Path,
+    query: str,
+    limit: int,
+    top: list[tuple[float, tuple[object, ...]]],
+    allowed_ids: Sequence[int] | None,
+    trace: QueryTrace | None,
+) -> tuple[list[DocumentRecord], float | None]:
+    """Records for ``top`` plus the cache's ``min_score``; lexical search when ``top`` is empty."""
+    if top:
+        # A full page can only be displaced by a document beating its last score; a
+        # short page admits any document that scores above zero.
+        min_score = top[-1][0] if len(top) >= max(1, limit) else 0.0
+        return _rows_to_records([row for _, row in top]), min_score
+    with trace_stage(trace, "lexical_fallback"):
+        results = list(search_documents(database_path, query, limit=limit))
+        if allowed_ids is not None:
+            allowed = set(allowed_ids)
+            results = [item for item in results if item.id in allowed]
+    return list(results), None
+
+
+def _store_search(
+    connection: sqlite3.Connection,
+    database_path: Path,
+    config: CacheConfig,
+    ttl: int,
+    query_hash: str,
+    cleaned: str,
+    results: list[DocumentRecord],
+    generation: int,
+    min_score: float | None,
+    trace: QueryTrace | None,
+) -> None:
+    with trace_stage(trace, "cache_store"):
+        result_ids = [item.id for item in results]
+        cache_id = _store_cache(connection, query_hash, cleaned, result_ids, generation, min_score)
+        pruned = _prune_cache(connection, config.max_entries, ttl)
+        if pruned:
+            _count_cache_event(database_path, "sqlite_evictions", pruned)
+        _CACHE_HITS.flush(connection, database_path)
+        connection.commit()
+        if result_ids:
+            _put_memory_result(
+                _result_cache_key(database_path, query_hash),
+                _CacheEntry(cache_id, result_ids, generation, min_score),
+                results,
+                config,
+            )
 
-        query_tokens = _tokenize(cleaned)
-        rows = connection.execute(
-            """
-            SELECT d.id, d.path, d.title, d.summary, d.category, d.token_estimate, d.updated_at, d.content, e.embedding
-            FROM documents d
-            LEFT JOIN embeddings e ON e.document_id = d.id
-            """
-        ).fetchall()
 
-        query_embedding, _ = compute_embedding(cleaned)
-        current_year = str(datetime.now(tz=timezone.utc).year)
-        scored: list[tuple[float, tuple[object, ...]]] = []
-        for row in rows:
-            document_id = int(row[0])
-            haystack = " ".join(
-                [
-                    str(row[1] or ""),
-                    str(row[2] or ""),
-                    str(row[3] or ""),
-                    str(row[7] or ""),
-                ]
+def _semantic_search_documents(
+    database_path: Path,
+    cleaned: str,
+    query: str,
+    limit: int,
+    ttl_seconds: int | None,
+    cache_config: CacheConfig | None,
+    filters: SearchFilters | None,
+    search_config: SearchConfig | None,
+    trace: QueryTrace | None,
+) -> list[DocumentRecord]:
+    config = cache_config or CacheConfig()
+    ttl = config.ttl_seconds if ttl_seconds is None else ttl_seconds
+    active_filters = filters if filters is not None and not filters.is_empty() else None
+    staged = search_config is not None and search_config.pipeline == "staged"
+    query_hash = _semantic_query_hash(
+        cleaned, limit, active_filters, search_config.ranking_key() if search_config is not None else ""
+    )
+
+    with sqlite3.connect(database_path) as connection:
+        _trace_statements(connection)
+        connection.execute("PRAGMA foreign_keys = ON;")
+        if config.enabled:
+            cached = _cached_search(
+                connection, database_path, config, ttl, query_hash, cleaned, active_filters, trace
+            )
+            if cached is not None:
+                return cached
+
+        generation = _current_generation(connection)
+        query_tokens = _tokenize(cleaned)
+        with trace_stage(trace, "encode"):
+            query_embedding, _ = compute_query_embedding(cleaned)
+        candidate_ids: list[int] | None = None
+        if active_filters is not None:
+            # The filtered set replaces FAISS candidates: an approximate top-N taken over
+            # the whole corpus could miss every document the filters allow.
+            with trace_stage(trace, "filter"):
+                candidate_ids = _filtered_document_ids(connection, active_filters)
+        elif not staged:
+            with trace_stage(trace, "candidates"):
+                candidate_ids = _semantic_candidates(connection, database_path, query_embedding, limit)
+        if candidate_ids is not None and not staged:
+            trace_count(trace, "candidates", len(candidate_ids))
+        if candidate_ids is not None and not candidate_ids:
+            top = []
+        elif staged and search_config is not None:
+            top = _staged_scores(
+                connection,
+                database_path,
+                query_tokens,
+                query_embedding,
+                candidate_ids,
+                max(1, limit),
+                search_config,
+                trace,
+            )
+        else:
+            top = _score_documents(
+                connection,
+                database_path,
+                query_tokens,
+                query_embedding,
+                candidate_ids,
+                limit=max(1, limit),
+                search_config=search_config,
+                trace=trace,
             )
-            tokens = _tokenize(haystack)
-            overlap = len(query_tokens & tokens)
-            lexical_score = overlap / max(1, len(query_tokens)) if overlap > 0 else 0.0
+        results, min_score = _ranked_results(
+            database_path, query, limit, top, candidate_ids if active_filters is not None else None, trace
+        )
+        if staged:
+            # Cache revalidation re-scores changed documents with the default blend, which
+            # says nothing about staged scores, so any later change evicts this entry.
+            min_score = None
+        if config.enabled:
+            _store_search(
+                connection, database_path, config, ttl, query_hash, cleaned, results, generation, min_score, trace
+            )
+        return results
 
-            vector_score = cosine_similarity(query_embedding, _deserialize_embedding(row[8]))
 
-            chunk_rows = connection.execute(
-                """
-                SELECT embedding
-                FROM document_chunks
-                WHERE document_id = ?
-                ORDER BY chunk_index ASC
-                """,
-                (document_id,),
-            ).fetchall()
-            chunk_scores = [
-                cosine_similarity(query_embedding, _deserialize_embedding(chunk_row[0]))
-                for chunk_row in chunk_rows
-                if chunk_row[0] is not None
+def semantic_search_many(
+    database_path: Path,
+    queries: Sequence[str],
+    limit: int = 10,
+    cache_config: CacheConfig | None = None,
+    search_config: SearchConfig | None = None,
+) -> list[list[DocumentRecord]]:
+    """``semantic_search_documents`` for several queries, one result list per query.
+
+    Cached queries are answered from the result cache. The rest are encoded in one
+    batched model call and scored against the resident vectors in a single pass (one
+    matrix-matrix product with NumPy). Each query is then pruned, blended and ranked
+    as usual. The batch scans the whole corpus rather than per-query FAISS candidates.
+    With the staged pipeline in ``search_config`` each query instead runs its own first
+    stage and blend, so it ranks exactly as it would alone.
+    """
+    if search_config is not None:
+        _check_pipeline(search_config)
+    results = _semantic_search_many(database_path, queries, limit, cache_config, search_config)
+    _finish_search(database_path)
+    return results
+
+
+def _semantic_search_many(
+    database_path: Path,
+    queries: Sequence[str],
+    limit: int,
+    cache_config: CacheConfig | None,
+    search_config: SearchConfig | None,
+) -> list[list[DocumentRecord]]:
+    config = cache_config or CacheConfig()
+    ttl = config.ttl_seconds
+    results: list[list[DocumentRecord]] = [[] for _ in queries]
+    cleaned_queries = [query.strip().lower() for query in queries]
+    staged = search_config is not None and search_config.pipeline == "staged"
+    ranking = search_config.ranking_key() if search_config is not None else ""
+
+    with sqlite3.connect(database_path) as connection:
+        _trace_statements(connection)
+        connection.execute("PRAGMA foreign_keys = ON;")
+        pending: list[int] = []
+        for position, cleaned in enumerate(cleaned_queries):
+            if not cleaned:
+                continue
+            if config.enabled:
+                query_hash = _semantic_query_hash(cleaned, limit, None, ranking)
+                cached = _cached_search(connection, database_path, config, ttl, query_hash, cleaned, None, None)
+                if cached is not None:
+                    results[position] = cached
+                    continue
+            pending.append(position)
+        if not pending:
+            return results
+
+        generation = _current_generation(connection)
+        embeddings, _ = compute_query_embeddings([cleaned_queries[position] for position in pending])
+        partials: list[dict[int, float] | None] = [None] * len(pending)
+        if not staged:
+            resident = _resident_vectors(connection, database_path)
+            with resident.lock:
+                document_scores = resident.documents.score_by_key_many(embeddings)
+                chunk_maxima = resident.chunks.max_score_by_owner_many(embeddings)
+            partials = [
+                _blend_partial(vector_scores, chunk_scores)
+                for vector_scores, chunk_scores in zip(document_scores, chunk_maxima)
             ]
-            chunk_score = max(chunk_scores) if chunk_scores else 0.0
 
-            concept_rows = connection.execute(
+        for position, embedding, partial in zip(pending, embeddings, partials):
+            cleaned = cleaned_queries[position]
+            if staged and search_config is not None:
+                top = _staged_scores(
+                    connection, database_path, _tokenize(cleaned), embedding, None, max(1, limit), search_config, None
+                )
+            else:
+                top = _score_documents(
+                    connection,
+                    database_path,
+                    _tokenize(cleaned),
+                    embedding,
+                    None,
+                    limit=max(1, limit),
+                    partial=partial,
+                )
+            records, min_score = _ranked_results(database_path, queries[position], limit, top, None, None)
+            if staged:
+                # As in semantic_search_documents: any later change evicts staged entries.
+                min_score = None
+            results[position] = records
+            if config.enabled:
+                query_hash = _semantic_query_hash(cleaned, limit, None, ranking)
+                _store_search(
+                    connection, database_path, config, ttl, query_hash, cleaned, records, generation, min_score, None
+                )
+    return results
+
+
+# Weights of the ranking blend, and the most the lexical, concept and freshness terms
+# can add on top of the vector and chunk terms.
+_VECTOR_WEIGHT = 0.45
+_CHUNK_WEIGHT = 0.30
+_LEXICAL_WEIGHT = 0.20
+_CONCEPT_WEIGHT = 0.05
+_FRESHNESS_BONUS = 0.05
+_REMAINING_SCORE_BOUND = _LEXICAL_WEIGHT + _CONCEPT_WEIGHT + _FRESHNESS_BONUS
+
+
+@dataclass(slots=True)
+class _BlendWeights:
+    vector: float = _VECTOR_WEIGHT
+    chunk: float = _CHUNK_WEIGHT
+    lexical: float = _LEXICAL_WEIGHT
+    concept: float = _CONCEPT_WEIGHT
+    freshness: float = _FRESHNESS_BONUS
+
+    @property
+    def remaining_bound(self) -> float:
+        """Most the lexical, concept and freshness terms can add to the partial score."""
+        return max(0.0, self.lexical) + max(0.0, self.concept) + max(0.0, self.freshness)
+
+
+_DEFAULT_WEIGHTS = _BlendWeights()
+
+
+def _check_pipeline(config: SearchConfig) -> None:
+    if config.pipeline not in SEARCH_PIPELINES:
+        raise ValueError(f"unknown search pipeline: {config.pipeline}")
+    if config.first_stage not in FIRST_STAGES:
+        raise ValueError(f"unknown first stage: {config.first_stage}")
+
+
+def _blend_partial(vector_scores: dict[int, float], chunk_maxima: dict[int, float]) -> dict[int, float]:
+    """Vector and chunk terms of the blend, per document."""
+    return {
+        document_id: _VECTOR_WEIGHT * vector_scores.get(document_id, 0.0) + _CHUNK_WEIGHT * chunk_maxima.get(document_id, 0.0)
+        for document_id in vector_scores.keys() | chunk_maxima.keys()
+    }
+
+
+def _vector_partial(
+    resident: _ResidentVectors,
+    query_embedding: Sequence[float],
+    document_ids: Sequence[int] | None,
+    limit: int | None,
+    search_config: SearchConfig | None,
+    trace: QueryTrace | None,
+) -> dict[int, float]:
+    if document_ids is None and limit is not None and search_config is not None:
+        partial = _parallel_partial_scores(resident, query_embedding, limit, search_config)
+        if partial is not None:
+            trace_count(trace, "parallel_workers", search_config.workers)
+            return partial
+    with resident.lock:
+        if document_ids is None:
+            vector_scores = resident.documents.score_by_key(query_embedding)
+            chunk_maxima = resident.chunks.max_score_by_owner(query_embedding)
+        else:
+            vector_scores = resident.documents.score_keys(query_embedding, document_ids)
+            chunk_maxima = resident.chunks.max_score_for_owners(query_embedding, document_ids)
+    return _blend_partial(vector_scores, chunk_maxima)
+
+
+# Documents a shared snapshot may lag behind before it is rebuilt, and how long it may
+# keep lagging at all; lagging documents are scored in-process in the meantime.
+_SNAPSHOT_STALE_LIMIT = 1024
+_SNAPSHOT_MAX_AGE_SECONDS = 60.0
+
+
+def _parallel_partial_scores(
+    resident: _ResidentVectors,
+    query_embedding: Sequence[float],
+    limit: int,
+    search_config: SearchConfig,
+) -> dict[int, float] | None:
+    """Vector+chunk partial scores from the worker pool, or None to score in-process.
+
+    Only documents that can still reach the top ``limit`` are returned (see
+    ``query.parallel.score_shard``). Documents written since the shared snapshot was
+    built are skipped by the workers and scored here instead, so a steady stream of
+    upserts does not copy the whole corpus into shared memory on every query. Any pool
+    or shared-memory failure falls back to in-process scoring.
+    """
+    workers = search_config.workers
+    if workers <= 1 or len(resident.documents) < max(1, search_config.parallel_min_documents):
+        return None
+    try:
+        with resident.lock:
+            snapshot = resident.snapshot
+            stale = resident.snapshot_stale
+            if (
+                snapshot is None
+                or snapshot.shards != workers
+                or stale is None
+                or len(stale) > _SNAPSHOT_STALE_LIMIT
+                or (stale and time.monotonic() - resident.snapshot_built > _SNAPSHOT_MAX_AGE_SECONDS)
+            ):
+                # The replaced snapshot is unlinked once no in-flight query holds it.
+                snapshot = SharedVectorSnapshot(resident.documents, resident.chunks, shards=workers)
+                resident.snapshot = snapshot
+                resident.snapshot_stale = stale = set()
+                resident.snapshot_built = time.monotonic()
+            excluded = sorted(stale)
+            fresh = _blend_partial(
+                resident.documents.score_keys(query_embedding, excluded),
+                resident.chunks.max_score_for_owners(query_embedding, excluded),
+            )
+        partial = parallel_partial_scores(
+            snapshot, query_embedding, limit, (_VECTOR_WEIGHT, _CHUNK_WEIGHT), _REMAINING_SCORE_BOUND, excluded
+        )
+    except (OSError, RuntimeError, ValueError):
+        return None
+    partial.update(fresh)
+    return partial
+
+
+def _score_documents(
+    connection: sqlite3.Connection,
+    database_path: Path,
+    query_tokens: set[str],
+    query_embedding: Sequence[float],
+    document_ids: Sequence[int] | None,
+    limit: int | None = None,
+    search_config: SearchConfig | None = None,
+    trace: QueryTrace | None = None,
+    partial: dict[int, float] | None = None,
+) -> list[tuple[float, tuple[object, ...]]]:
+    """Blend scores for ``document_ids`` (every document when None); drops scores <= 0.
+
+    With ``limit`` only the top ``limit`` results are returned, best first. The vector
+    and chunk terms are computed for every document first; documents whose partial
+    score plus ``_REMAINING_SCORE_BOUND`` cannot reach the k-th best partial score are
+    never loaded or lexically scored. Lexical scores are still normalized over the full
+    scope, so the selected results match exhaustive scoring.
+
+    Unrestricted top-k queries over a large corpus compute the partial scores on the
+    worker pool configured by ``search_config``. Callers that already scored the
+    vectors (``semantic_search_many``) pass the blended terms as ``partial``.
+    """
+    if partial is None:
+        with trace_stage(trace, "resident_sync"):
+            resident = _resident_vectors(connection, database_path)
+        with trace_stage(trace, "vector_scoring"):
+            partial = _vector_partial(resident, query_embedding, document_ids, limit, search_config, trace)
+    trace_count(trace, "vector_scored", len(partial))
+
+    scope = document_ids
+    lexical_best: float | None = None
+    if limit is not None:
+        with trace_stage(trace, "prune"):
+            kth_partial = kth_largest(partial.values(), limit)
+            # Documents without vectors have a partial score of 0, so pruning is only
+            # exact once the cut-off is above what the remaining terms alone can reach.
+            if kth_partial is not None and kth_partial - _REMAINING_SCORE_BOUND > 0.0:
+                cutoff = kth_partial - _REMAINING_SCORE_BOUND
+                lexical_best = _lexical_best(connection, query_tokens, document_ids)
+                scope = [document_id for document_id, score in partial.items() if score >= cutoff]
+
+    with trace_stage(trace, "row_fetch"):
+        if scope is None:
+            rows = connection.execute(
+                """
+                SELECT id, path, title, summary, category, token_estimate, updated_at
+                FROM documents
                 """
-                SELECT c.name
-                FROM concepts c
-                JOIN document_concepts dc ON dc.concept_id = c.id
-                WHERE dc.document_id = ?
+            ).fetchall()
+        else:
+            placeholders = ",".join("?" for _ in scope)
+            rows = connection.execute(
+                f"""
+                SELECT id, path, title, summary, category, token_estimate, updated_at
+                FROM documents
+                WHERE id IN ({placeholders})
                 """,
-                (document_id,),
+                tuple(scope),
             ).fetchall()
-            concepts = {str(item[0]) for item in concept_rows}
-            concept_score = 1.0 if query_tokens & concepts else 0.0
+            rows.sort(key=lambda row: partial.get(int(row[0]), 0.0), reverse=True)
+    trace_count(trace, "rows_fetched", len(rows))
+
+    with trace_stage(trace, "lexical"):
+        lexical_scores = _lexical_scores(connection, query_tokens, scope, best=lexical_best)
+        concept_matches = _concept_matches(connection, query_tokens, scope)
+
+    with trace_stage(trace, "rank"):
+        return _rank_rows(rows, partial, lexical_scores, concept_matches, limit, trace)
+
+
+def _rank_rows(
+    rows: list[tuple[object, ...]],
+    partial: dict[int, float],
+    lexical_scores: dict[int, float],
+    concept_matches: set[int],
+    limit: int | None,
+    trace: QueryTrace | None,
+    weights: _BlendWeights = _DEFAULT_WEIGHTS,
+) -> list[tuple[float, tuple[object, ...]]]:
+    current_year = str(datetime.now(tz=timezone.utc).year)
+    remaining_bound = weights.remaining_bound
+    top: TopK[tuple[object, ...]] | None = TopK(limit) if limit is not None else None
+    scored: list[tuple[float, tuple[object, ...]]] = []
+    blended = 0
+    for row in rows:
+        document_id = int(row[0])
+        partial_score = partial.get(document_id, 0.0)
+        if top is not None and not top.could_enter(partial_score + remaining_bound):
+            continue
+        blended += 1
+
+        lexical_score = lexical_scores.get(document_id, 0.0)
+        concept_score = 1.0 if document_id in concept_matches else 0.0
+        freshness_bonus = weights.freshness if str(row[6]).startswith(current_year) else 0.0
+
+        score = (
+            partial_score
+            + (weights.lexical * lexical_score)
+            + (weights.concept * concept_score)
+            + freshness_bonus
+        )
+        if score <= 0.0:
+            continue
+        if top is not None:
+            top.push(score, str(row[6]), row)
+        else:
+            scored.append((score, row))
+    trace_count(trace, "blended", blended)
+    return top.results() if top is not None else scored
 
-            freshness_bonus = 0.05 if str(row[6]).startswith(current_year) else 0.0
 
-            score = (
-                (0.45 * vector_score)
-                + (0.30 * chunk_score)
-                + (0.20 * lexical_score)
-                + (0.05 * concept_score)
-                + freshness_bonus
-            )
-            if score <= 0.0:
-                continue
-            scored.append((score, row[:7]))
+def _lexical_ranking(
+    connection: sqlite3.Connection,
+    query_tokens: set[str],
+    document_ids: Sequence[int] | None,
+    limit: int,
+) -> list[int]:
+    """Ids of the ``limit`` best BM25 matches, best first (token overlap without FTS5)."""
+    if not query_tokens or (document_ids is not None and not document_ids):
+        return []
+    if not _has_fts(connection):
+        overlap = _token_overlap_scores(connection, query_tokens, document_ids)
+        return [document_id for document_id, _ in sorted(overlap.items(), key=lambda item: (-item[1], item[0]))[:limit]]
+    sql, params = _bm25_query("rowid", query_tokens, document_ids)
+    weights = ", ".join(str(weight) for weight in _BM25_WEIGHTS)
+    rows = connection.execute(f"{sql} ORDER BY bm25(documents_fts, {weights}) LIMIT ?", (*params, limit)).fetchall()
+    return [int(row[0]) for row in rows]
 
-        scored.sort(key=lambda item: (item[0], str(item[1][6])), reverse=True)
-        top_rows = [row for _, row in scored[: max(1, limit)]]
-        top_ids = [int(row[0]) for row in top_rows]
 
-        if not top_rows:
-            fallback = search_documents(database_path, query, limit=limit)
-            _store_cache(connection, query_hash, cleaned, [item.id for item in fallback])
-            connection.commit()
-            return fallback
+def _first_stage(
+    connection: sqlite3.Connection,
+    database_path: Path,
+    resident: _ResidentVectors,
+    query_tokens: set[str],
+    query_embedding: Sequence[float],
+    document_ids: Sequence[int] | None,
+    budget: int,
+    config: SearchConfig,
+) -> tuple[list[int], dict[int, float]]:
+    """Up to ``budget`` candidate ids, best first, and the document-vector scores computed on the way.
+
+    ``ann`` ranks by document vector alone (through the FAISS candidate index when it
+    narrows the corpus), ``bm25`` by the FTS5 index, and ``rrf`` fuses both rankings by
+    reciprocal rank, so a document near the top of either list is kept.
+    """
+    rankings: list[list[int]] = []
+    vector_scores: dict[int, float] = {}
+    if config.first_stage in ("ann", "rrf"):
+        scope = document_ids
+        if scope is None:
+            scope = _semantic_candidates(connection, database_path, list(query_embedding), budget)
+        with resident.lock:
+            if scope is None:
+                ranked = resident.documents.top_k(query_embedding, budget)
+            else:
+                scored = resident.documents.score_keys(query_embedding, scope)
+                ranked = sorted(scored.items(), key=lambda item: item[1], reverse=True)[:budget]
+        vector_scores = dict(ranked)
+        rankings.append([document_id for document_id, _ in ranked])
+    if config.first_stage in ("bm25", "rrf"):
+        rankings.append(_lexical_ranking(connection, query_tokens, document_ids, budget))
+    if len(rankings) == 1:
+        return rankings[0], vector_scores
+
+    fused: dict[int, float] = {}
+    for ranking in rankings:
+        for rank, document_id in enumerate(ranking, start=1):
+            fused[document_id] = fused.get(document_id, 0.0) + 1.0 / (max(0, config.rrf_k) + rank)
+    ordered = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:budget]
+    return [document_id for document_id, _ in ordered], vector_scores
+
+
+def _staged_scores(
+    connection: sqlite3.Connection,
+    database_path: Path,
+    query_tokens: set[str],
+    query_embedding: Sequence[float],
+    document_ids: Sequence[int] | None,
+    limit: int,
+    config: SearchConfig,
+    trace: QueryTrace | None = None,
+) -> list[tuple[float, tuple[object, ...]]]:
+    """Top ``limit`` of ``document_ids`` (every document when None) by the staged pipeline.
+
+    The first stage keeps ``config.candidates`` documents (see ``_first_stage``). Chunk
+    similarity, lexical, concept and freshness terms are computed for those candidates
+    only, then blended with the config's weights. Lexical scores are still normalized
+    against the best match in the whole scope, as in ``_score_documents``.
+    """
+    budget = max(1, config.candidates, limit)
+    with trace_stage(trace, "resident_sync"):
+        resident = _resident_vectors(connection, database_path)
+    with trace_stage(trace, "first_stage"):
+        candidates, vector_scores = _first_stage(
+            connection, database_path, resident, query_tokens, query_embedding, document_ids, budget, config
+        )
+    trace_count(trace, "candidates", len(candidates))
+    if not candidates:
+        return []
 
-        _store_cache(connection, query_hash, cleaned, top_ids)
-        connection.commit()
-        return _rows_to_records(top_rows)
+    weights = _BlendWeights(
+        config.vector_weight, config.chunk_weight, config.lexical_weight, config.concept_weight, config.freshness_bonus
+    )
+    with trace_stage(trace, "vector_scoring"):
+        with resident.lock:
+            missing = [document_id for document_id in candidates if document_id not in vector_scores]
+            if missing:
+                vector_scores.update(resident.documents.score_keys(query_embedding, missing))
+            chunk_maxima = resident.chunks.max_score_for_owners(query_embedding, candidates)
+        partial = {
+            document_id: weights.vector * vector_scores.get(document_id, 0.0)
+            + weights.chunk * chunk_maxima.get(document_id, 0.0)
+            for document_id in candidates
+        }
+    trace_count(trace, "vector_scored", len(partial))
+
+    with trace_stage(trace, "row_fetch"):
+        placeholders = ",".join("?" for _ in candidates)
+        rows = connection.execute(
+            f"""
+            SELECT id, path, title, summary, category, token_estimate, updated_at
+            FROM documents
+            WHERE id IN ({placeholders})
+            """,
+            tuple(candidates),
+        ).fetchall()
+        rows.sort(key=lambda row: partial.get(int(row[0]), 0.0), reverse=True)
+    trace_count(trace, "rows_fetched", len(rows))
+
+    with trace_stage(trace, "lexical"):
+        lexical_best = _lexical_best(connection, query_tokens, document_ids)
+        lexical_scores = _lexical_scores(connection, query_tokens, candidates, best=lexical_best)
+        concept_matches = _concept_matches(connection, query_tokens, candidates)
+
+    with trace_stage(trace, "rank"):
+        return _rank_rows(rows, partial, lexical_scores, concept_matches, limit, trace, weights)
+
+
+def semantic_search_passages(
+    database_path: Path,
+    query: str,
+    limit: int = 10,
+    filters: SearchFilters | None = None,
+    trace: QueryTrace | None = None,
+) -> list[PassageRecord]:
+    """Top-k chunks by embedding similarity, scored directly from the resident chunk matrix.
+
+    ``filters`` restrict the chunks to those of matching documents, which are then the
+    only chunks scored. ``trace`` collects per-stage timings as for
+    ``semantic_search_documents``.
+    """
+    cleaned = query.strip().lower()
+    if not cleaned:
+        return []
+
+    active_filters = filters if filters is not None and not filters.is_empty() else None
+    with trace_stage(trace, "total"):
+        with trace_stage(trace, "encode"):
+            query_embedding, _ = compute_query_embedding(cleaned)
+        with sqlite3.connect(database_path) as connection:
+            chunk_ids: list[int] | None = None
+            if active_filters is not None:
+                with trace_stage(trace, "filter"):
+                    document_ids = _filtered_document_ids(connection, active_filters)
+                    chunk_ids = []
+                    if document_ids:
+                        placeholders = ",".join("?" for _ in document_ids)
+                        chunk_ids = [
+                            int(row[0])
+                            for row in connection.execute(
+                                f"SELECT id FROM document_chunks WHERE document_id IN ({placeholders})",
+                                tuple(document_ids),
+                            )
+                        ]
+                trace_count(trace, "candidates", len(chunk_ids))
+            with trace_stage(trace, "resident_sync"):
+                resident = _resident_vectors(connection, database_path)
+            with trace_stage(trace, "vector_scoring"):
+                with resident.lock:
+                    if chunk_ids is None:
+                        scored = resident.chunks.top_k(query_embedding, max(1, limit))
+                    else:
+                        selected: TopK[int] = TopK(max(1, limit))
+                        for key, score in resident.chunks.score_keys(query_embedding, chunk_ids).items():
+                            selected.push(score, "", key)
+                        scored = [(key, score) for score, key in selected.results()]
+                top = [(key, score) for key, score in scored if score > 0.0]
+            trace_count(trace, "vector_scored", len(top))
+            if not top:
+                return []
+
+            with trace_stage(trace, "row_fetch"):
+                placeholders = ",".join("?" for _ in top)
+                rows = connection.execute(
+                    f"""
+                    SELECT c.id, c.document_id, d.path, d.title, c.heading_path, c.chunk_index, c.content, c.token_count
+                    FROM document_chunks c
+                    JOIN documents d ON d.id = c.document_id
+                    WHERE c.id IN ({placeholders})
+                    """,
+                    tuple(key for key, _ in top),
+                ).fetchall()
+            trace_count(trace, "rows_fetched", len(rows))
+
+    by_id = {int(row[0]): row for row in rows}
+    passages: list[PassageRecord] = []
+    for chunk_id, score in top:
+        row = by_id.get(chunk_id)
+        if row is None:
+            continue
+        passages.append(
+            PassageRecord(
+                chunk_id=chunk_id,
+                document_id=int(row[1]),
+                path=str(row[2]),
+                title=str(row[3] or ""),
+                heading_path=str(row[4] or ""),
+                chunk_index=int(row[5]),
+                content=str(row[6] or ""),
+                token_count=int(row[7] or 0),
+                score=round(score, 6),
+            )
+        )
+    _finish_search(database_path)
+    return passages
 
 
+def _reencode_chunk_embeddings(connection: sqlite3.Connection, dtype: int) -> None:
+    rows = connection.execute("SELECT id, embedding FROM document_chunks WHERE embedding IS NOT NULL").fetchall()
+    updates: list[tuple[bytes, int]] = []
+    for chunk_id, raw in rows:
+        vector, chunk_model = decode_embedding(raw)
+        if len(vector) > 0:
+            updates.append((encode_embedding(vector, chunk_model, dtype), int(chunk_id)))
+    connection.executemany("UPDATE document_chunks SET embedding = ? WHERE id = ?", updates)
 
 
-def regenerate_embeddings(database_path: Path, model_name: str = "all-MiniLM-L6-v2") -> int:
+def regenerate_embeddings(
+    database_path: Path,
+    model_name: str = "all-MiniLM-L6-v2",
+    precision: str | None = None,
+    index_config: IndexConfig | None = None,
+    batch_size: int = EMBEDDING_BATCH_SIZE,
+) -> int:
+    """Recompute every document embedding; returns the number of documents embedded.
+
+    ``precision`` (``float32``, ``float16`` or ``int8``) changes the stored and in-memory
+    vector precision: it is saved as a database setting, existing chunk vectors are
+    re-encoded, and later upserts write at that precision. ``index_config`` selects the
+    FAISS candidate index type rebuilt afterwards (exact ``flat`` by default).
+    Documents are encoded ``batch_size`` at a time.
+    """
+    # Reject an unknown index type before recomputing anything.
+    FaissIndex(index_config)
     with sqlite3.connect(database_path) as connection:
+        if precision is not None:
+            _set_vector_precision(connection, precision)
+            _reencode_chunk_embeddings(connection, PRECISIONS[precision])
+        dtype = PRECISIONS[_vector_precision(connection)]
         rows = connection.execute(
             """
             SELECT id, title, summary, category, content
@@ -461,11 +2412,15 @@ def regenerate_embeddings(database_path: Path, model_name: str = "all-MiniLM-L6-
         ).fetchall()
         now = _utc_now_iso()
         updated = 0
-        for row in rows:
-            document_id = int(row[0])
-            source = " ".join([str(row[1] or ""), str(row[2] or ""), str(row[3] or ""), str(row[4] or "")])
-            embedding, resolved_model = compute_embedding(source, model_name=model_name)
-            connection.execute(
+        batch_size = max(1, batch_size)
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start : start + batch_size]
+            sources = [
+                " ".join([str(row[1] or ""), str(row[2] or ""), str(row[3] or ""), str(row[4] or "")])
+                for row in batch
+            ]
+            vectors, resolved_model = compute_embeddings(sources, model_name=model_name, batch_size=batch_size)
+            connection.executemany(
                 """
                 INSERT INTO embeddings(document_id, embedding, model_name, generated_at)
                 VALUES(?, ?, ?, ?)
@@ -474,25 +2429,16 @@ def regenerate_embeddings(database_path: Path, model_name: str = "all-MiniLM-L6-
                   model_name=excluded.model_name,
                   generated_at=excluded.generated_at
                 """,
-                (document_id, json.dumps(embedding), resolved_model, now),
+                [
+                    (int(row[0]), encode_embedding(vector, resolved_model, dtype), resolved_model, now)
+                    for row, vector in zip(batch, vectors)
+                ],
             )
-            updated += 1
-        # Rebuild FAISS index from all embeddings
-        all_embeddings: list[tuple[int, list[float]]] = []
-        for row in rows:
-            doc_id = int(row[0])
-            emb_row = connection.execute(
-                "SELECT embedding FROM embeddings WHERE document_id = ?", (doc_id,)
-            ).fetchone()
-            if emb_row and emb_row[0]:
-                all_embeddings.append((doc_id, _deserialize_embedding(emb_row[0])))
-
-        faiss_idx = FaissIndex()
-        faiss_idx.build(all_embeddings)
-        index_path = database_path.parent / "faiss.index"
-        faiss_idx.save(index_path)
-
+            updated += len(batch)
+        _record_change(connection, None, "rebuild")
         connection.commit()
+        _rebuild_candidate_index(connection, database_path, index_config)
+        _refresh_vector_file(connection, database_path, force=True)
         return updated
 
 
@@ -501,13 +2447,13 @@ def embedding_coverage(database_path: Path, model_name: str = "all-MiniLM-L6-v2"
         total = int(connection.execute("SELECT COUNT(*) FROM documents").fetchone()[0])
         embedded = int(
             connection.execute(
-                "SELECT COUNT(*) FROM embeddings WHERE embedding IS NOT NULL AND LENGTH(TRIM(embedding)) > 0"
+                "SELECT COUNT(*) FROM embeddings WHERE embedding IS NOT NULL AND LENGTH(embedding) > 0"
             ).fetchone()[0]
         )
         chunk_total = int(connection.execute("SELECT COUNT(*) FROM document_chunks").fetchone()[0])
         chunk_embedded = int(
             connection.execute(
-                "SELECT COUNT(*) FROM document_chunks WHERE embedding IS NOT NULL AND LENGTH(TRIM(embedding)) > 0"
+                "SELECT COUNT(*) FROM document_chunks WHERE embedding IS NOT NULL AND LENGTH(embedding) > 0"
             ).fetchone()[0]
         )
     return {
@@ -525,16 +2471,47 @@ def evaluate_semantic_precision(
     database_path: Path,
     cases: list[dict[str, object]],
     k: int = 5,
+    precision: str | None = None,
+    search_config: SearchConfig | None = None,
 ) -> dict[str, object]:
+    """precision@k of semantic search over ``cases``.
+
+    With ``precision``, queries are scored against a temporary in-memory copy of the
+    vectors held at that precision (bypassing the result cache), so the recall cost of
+    ``float16`` or ``int8`` storage can be measured before switching to it.
+    ``search_config`` selects the ranking pipeline being measured.
+    """
     if not cases:
         return {"cases": 0, "k": k, "precision_at_k": 0.0, "details": []}
+    if precision is not None:
+        if precision not in PRECISIONS:
+            raise ValueError(f"unknown vector precision: {precision}")
+        _PRECISION_OVERRIDE.value = precision
+        try:
+            report = _evaluate_cases(database_path, cases, k, CacheConfig(enabled=False), search_config)
+        finally:
+            _PRECISION_OVERRIDE.value = None
+            with _RESIDENT_VECTORS_LOCK:
+                _RESIDENT_VECTORS.pop(f"{Path(database_path).resolve()}#{precision}", None)
+        return {**report, "precision": precision}
+    return _evaluate_cases(database_path, cases, k, None, search_config)
+
 
+def _evaluate_cases(
+    database_path: Path,
+    cases: list[dict[str, object]],
+    k: int,
+    cache_config: CacheConfig | None,
+    search_config: SearchConfig | None = None,
+) -> dict[str, object]:
     details: list[dict[str, object]] = []
     total_hits = 0.0
     for case in cases:
         query = str(case.get("query", "")).strip()
         expected = {int(item) for item in case.get("expected_ids", []) if str(item).isdigit()}
-        results = semantic_search_documents(database_path, query, limit=max(1, k))
+        results = semantic_search_documents(
+            database_path, query, limit=max(1, k), cache_config=cache_config, search_config=search_config
+        )
         got_ids = [item.id for item in results[:k]]
         hits = len(expected & set(got_ids))
         precision = hits / max(1, k)
@@ -558,6 +2535,8 @@ def evaluate_semantic_precision(
 
 def system_stats(database_path: Path, model_name: str = "all-MiniLM-L6-v2") -> dict[str, object]:
     coverage = embedding_coverage(database_path, model_name=model_name)
+    _record_query_embedding_counts(database_path)
+    flush_cache_hits(database_path)
     with sqlite3.connect(database_path) as connection:
         queued = int(connection.execute("SELECT COUNT(*) FROM events WHERE status='queued'").fetchone()[0])
         failed = int(connection.execute("SELECT COUNT(*) FROM events WHERE status='failed'").fetchone()[0])
@@ -568,6 +2547,8 @@ def system_stats(database_path: Path, model_name: str = "all-MiniLM-L6-v2") -> d
         links = int(connection.execute("SELECT COUNT(*) FROM links").fetchone()[0])
         cache_entries = int(connection.execute("SELECT COUNT(*) FROM query_cache").fetchone()[0])
         cache_hits = int(connection.execute("SELECT COALESCE(SUM(hit_count), 0) FROM query_cache").fetchone()[0])
+        stored_metrics = _stored_cache_metrics(connection)
+        precision = _vector_precision(connection)
 
     queue_lag_seconds = 0.0
     if oldest and oldest[0]:
@@ -582,7 +2563,37 @@ def system_stats(database_path: Path, model_name: str = "all-MiniLM-L6-v2") -> d
         "links": links,
         "queue": {"queued": queued, "failed": failed, "lag_seconds": round(queue_lag_seconds, 3)},
         "embeddings": coverage,
-        "cache": {"entries": cache_entries, "total_hits": cache_hits},
+        "cache": {
+            "entries": cache_entries,
+            "total_hits": cache_hits,
+            **result_cache_stats(),
+            **{name: stored_metrics.get(name, 0) for name in _CACHE_METRICS},
+        },
+        "query_embedding_cache": {
+            **query_embedding_cache_stats(),
+            **{key: stored_metrics.get(name, 0) for key, name in _QUERY_EMBEDDING_METRICS.items()},
+        },
+        "vectors": {"precision": precision, "resident_bytes": _resident_vector_bytes(database_path)},
+    }
+
+
+def _resident_vector_bytes(database_path: Path) -> int:
+    """Bytes held by this process's resident document and chunk vectors (0 if not loaded)."""
+    with _RESIDENT_VECTORS_LOCK:
+        resident = _RESIDENT_VECTORS.get(str(Path(database_path).resolve()))
+    if resident is None:
+        return 0
+    return resident.documents.nbytes + resident.chunks.nbytes
+
+
+def _latency_summary(values: list[float]) -> dict[str, float]:
+    ordered = sorted(values)
+    p95_index = min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))
+    return {
+        "avg": round(sum(ordered) / len(ordered), 3),
+        "p50": round(statistics.median(ordered), 3),
+        "p95": round(ordered[p95_index], 3),
+        "max": round(ordered[-1], 3),
     }
 
 
@@ -591,6 +2602,7 @@ def benchmark_semantic_queries(
     cases: list[dict[str, object]],
     k: int = 5,
     iterations: int = 1,
+    search_config: SearchConfig | None = None,
 ) -> dict[str, object]:
     if not cases:
         return {
@@ -599,56 +2611,280 @@ def benchmark_semantic_queries(
             "k": max(1, k),
             "precision_at_k": 0.0,
             "latency_ms": {"avg": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0},
+            "sql_statements": {"avg": 0.0, "max": 0},
+            "stages_ms": {},
         }
 
     k = max(1, int(k))
     iterations = max(1, int(iterations))
     latencies_ms: list[float] = []
+    statement_counts: list[int] = []
+    stage_timings: dict[str, list[float]] = {}
 
-    for _ in range(iterations):
-        for case in cases:
-            query = str(case.get("query", "")).strip()
-            start = time.perf_counter()
-            semantic_search_documents(database_path, query, limit=k)
-            elapsed_ms = (time.perf_counter() - start) * 1000.0
-            latencies_ms.append(elapsed_ms)
-
-    precision_report = evaluate_semantic_precision(database_path, cases, k=k)
-
-    sorted_lat = sorted(latencies_ms)
-    p50 = statistics.median(sorted_lat)
-    p95_index = min(len(sorted_lat) - 1, int(round(0.95 * (len(sorted_lat) - 1))))
-    p95 = sorted_lat[p95_index]
+    try:
+        for _ in range(iterations):
+            for case in cases:
+                query = str(case.get("query", "")).strip()
+                _STATEMENT_TRACE.count = 0
+                trace = QueryTrace()
+                start = time.perf_counter()
+                semantic_search_documents(database_path, query, limit=k, search_config=search_config, trace=trace)
+                elapsed_ms = (time.perf_counter() - start) * 1000.0
+                latencies_ms.append(elapsed_ms)
+                statement_counts.append(_STATEMENT_TRACE.count)
+                for name, stage_ms in trace.stages.items():
+                    stage_timings.setdefault(name, []).append(stage_ms)
+    finally:
+        _STATEMENT_TRACE.count = None
+
+    precision_report = evaluate_semantic_precision(database_path, cases, k=k, search_config=search_config)
 
     return {
         "cases": len(cases),
         "iterations": iterations,
         "k": k,
         "precision_at_k": float(precision_report["precision_at_k"]),
-        "latency_ms": {
-            "avg": round(sum(sorted_lat) / len(sorted_lat), 3),
-            "p50": round(p50, 3),
-            "p95": round(p95, 3),
-            "max": round(max(sorted_lat), 3),
+        "latency_ms": _latency_summary(latencies_ms),
+        "sql_statements": {
+            "avg": round(sum(statement_counts) / len(statement_counts), 3),
+            "max": max(statement_counts),
         },
+        # Each stage is summarized over the queries that reached it (cache hits skip
+        # the scoring stages).
+        "stages_ms": {name: _latency_summary(values) for name, values in stage_timings.items()},
     }
 
 
-def search_documents(database_path: Path, query: str, limit: int = 10) -> list[DocumentRecord]:
-    pattern = f"%{query.strip()}%"
+def benchmark_candidate_indexes(
+    sizes: list[int],
+    index_config: IndexConfig | None = None,
+    dimensions: int = 384,
+) -> list[dict[str, object]]:
+    """Recall/latency of each FAISS index type on synthetic corpora of the given sizes.
+
+    Recall is measured against the flat index at the candidate budget, the number of
+    ids semantic search takes from the index before ranking.
+    """
+    return benchmark_index_types(sizes, index_config, dimensions=dimensions, k=_CANDIDATE_BUDGET)
+
+
+def benchmark_fallback_candidates(sizes: list[int], dimensions: int = 384) -> list[dict[str, object]]:
+    """Latency of the index's brute-force fallback (used without FAISS) against its
+    list-based baseline, on synthetic corpora of the given sizes at the candidate budget."""
+    return benchmark_fallback_search(sizes, dimensions=dimensions, k=_CANDIDATE_BUDGET)
+
+
+def benchmark_chunk_embeddings(
+    database_path: Path,
+    batch_sizes: list[int],
+    model_name: str = "all-MiniLM-L6-v2",
+) -> list[dict[str, object]]:
+    """Chunks embedded per second over the stored chunk texts, encoding them one call
+    per chunk (``batch_size`` 0) and batched at each of ``batch_sizes``."""
+    with sqlite3.connect(database_path) as connection:
+        texts = [
+            str(row[0] or "")
+            for row in connection.execute("SELECT content FROM document_chunks ORDER BY id").fetchall()
+        ]
+    report = benchmark_embedding_throughput(texts, batch_sizes, model_name=model_name)
+    for row in report:
+        row["chunks"] = row.pop("texts")
+        row["chunks_per_second"] = row.pop("texts_per_second")
+    return report
+
+
+_TRIGRAM_FIELDS = ("title", "summary", "path", "headings")
+_TRIGRAM_WEIGHTS = (3.0, 1.0, 1.0, 2.0)
+_FUZZY_MIN_OVERLAP = 0.5
+_HIGHLIGHT_OPEN = "\x02"
+_HIGHLIGHT_CLOSE = "\x03"
+
+
+def _trigrams(text: str) -> set[str]:
+    lowered = text.lower()
+    return {lowered[index : index + 3] for index in range(len(lowered) - 2)}
+
+
+def _fts_phrase(text: str) -> str:
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _highlight_spans(marked: str) -> tuple[str, list[tuple[int, int]]]:
+    """Strip highlight markers, returning the plain text and the marked spans in it."""
+    plain: list[str] = []
+    spans: list[tuple[int, int]] = []
+    start = 0
+    length = 0
+    for char in marked:
+        if char == _HIGHLIGHT_OPEN:
+            start = length
+        elif char == _HIGHLIGHT_CLOSE:
+            spans.append((start, length))
+        else:
+            plain.append(char)
+            length += 1
+    return "".join(plain), spans
+
+
+def _trigram_spans(text: str, query_trigrams: set[str]) -> list[tuple[int, int]]:
+    """Merged spans of ``text`` covered by any of ``query_trigrams``."""
+    spans: list[tuple[int, int]] = []
+    lowered = text.lower()
+    for index in range(len(lowered) - 2):
+        if lowered[index : index + 3] not in query_trigrams:
+            continue
+        if spans and index <= spans[-1][1]:
+            spans[-1] = (spans[-1][0], index + 3)
+        else:
+            spans.append((index, index + 3))
+    return spans
+
+
+def _trigram_hits(
+    connection: sqlite3.Connection,
+    match: str,
+    limit: int,
+    query_trigrams: set[str] | None = None,
+) -> list[tuple[int, dict[str, str], list[dict[str, object]]]]:
+    """Ranked rows for an FTS5 ``match`` with per-field text and match spans.
+
+    Phrase matches take their spans from ``highlight()``. For fuzzy OR-of-trigram
+    matches pass ``query_trigrams``; FTS5 mis-renders overlapping trigram highlights,
+    so those spans are computed from the returned text instead.
+    """
+    if query_trigrams is None:
+        columns = ", ".join(
+            f"highlight(documents_trigram, {column}, :open, :close)" for column in range(len(_TRIGRAM_FIELDS))
+        )
+    else:
+        columns = ", ".join(_TRIGRAM_FIELDS)
+    weights = ", ".join(str(weight) for weight in _TRIGRAM_WEIGHTS)
+    rows = connection.execute(
+        f"""
+        SELECT rowid, {columns}
+        FROM documents_trigram
+        WHERE documents_trigram MATCH :match
+        ORDER BY bm25(documents_trigram, {weights})
+        LIMIT :limit
+        """,
+        {"open": _HIGHLIGHT_OPEN, "close": _HIGHLIGHT_CLOSE, "match": match, "limit": limit},
+    ).fetchall()
+
+    hits: list[tuple[int, dict[str, str], list[dict[str, object]]]] = []
+    for row in rows:
+        texts: dict[str, str] = {}
+        matches: list[dict[str, object]] = []
+        for field, value in zip(_TRIGRAM_FIELDS, row[1:]):
+            if query_trigrams is None:
+                plain, spans = _highlight_spans(str(value or ""))
+            else:
+                plain = str(value or "")
+                spans = _trigram_spans(plain, query_trigrams)
+            texts[field] = plain
+            matches.extend(
+                {"field": field, "start": start, "end": end, "text": plain[start:end]} for start, end in spans
+            )
+        hits.append((int(row[0]), texts, matches))
+    return hits
+
+
+def _substring_matches(row: tuple[object, ...], needle: str) -> list[dict[str, object]]:
+    if not needle:
+        return []
+    lowered = needle.lower()
+    matches: list[dict[str, object]] = []
+    for field, value in (("title", row[2]), ("summary", row[3]), ("path", row[1])):
+        text = str(value or "")
+        start = text.lower().find(lowered)
+        while start >= 0:
+            end = start + len(needle)
+            matches.append({"field": field, "start": start, "end": end, "text": text[start:end]})
+            start = text.lower().find(lowered, end)
+    return matches
+
+
+def _row_to_match(row: tuple[object, ...], matches: list[dict[str, object]]) -> DocumentMatch:
+    return DocumentMatch(
+        id=int(row[0]),
+        path=str(row[1]),
+        title=str(row[2] or ""),
+        summary=str(row[3] or ""),
+        category=str(row[4] or ""),
+        token_estimate=int(row[5] or 0),
+        updated_at=str(row[6] or ""),
+        matches=matches,
+    )
+
+
+def _like_search(connection: sqlite3.Connection, needle: str, limit: int) -> list[DocumentMatch]:
+    pattern = f"%{needle}%"
+    rows = connection.execute(
+        """
+        SELECT id, path, title, summary, category, token_estimate, updated_at
+        FROM documents
+        WHERE title LIKE ? OR summary LIKE ? OR path LIKE ?
+        ORDER BY updated_at DESC
+        LIMIT ?
+        """,
+        (pattern, pattern, pattern, limit),
+    ).fetchall()
+    return [_row_to_match(row, _substring_matches(row, needle)) for row in rows]
+
+
+def search_documents(database_path: Path, query: str, limit: int = 10) -> list[DocumentMatch]:
+    """Substring search over title, summary, path and headings, with match positions.
+
+    Served from the trigram index: exact substring hits are ranked first by BM25, then
+    fuzzy hits sharing at least half of the query's trigrams fill the remaining slots.
+    Each result carries ``matches`` as ``{field, start, end, text}`` character spans.
+    Queries shorter than three characters, and databases without the trigram index,
+    fall back to a LIKE scan.
+    """
+    needle = query.strip()
+    limit = max(1, limit)
     with sqlite3.connect(database_path) as connection:
+        if len(needle) < 3 or not _has_trigram_index(connection):
+            return _like_search(connection, needle, limit)
+
+        hits = _trigram_hits(connection, _fts_phrase(needle), limit)
+        if len(hits) < limit:
+            query_trigrams = _trigrams(needle)
+            seen = {document_id for document_id, _, _ in hits}
+            fuzzy_match = " OR ".join(_fts_phrase(trigram) for trigram in sorted(query_trigrams))
+            fuzzy: list[tuple[float, int, tuple[int, dict[str, str], list[dict[str, object]]]]] = []
+            for order, hit in enumerate(
+                _trigram_hits(connection, fuzzy_match, max(limit * 10, 50), query_trigrams)
+            ):
+                if hit[0] in seen:
+                    continue
+                document_trigrams: set[str] = set()
+                for text in hit[1].values():
+                    document_trigrams |= _trigrams(text)
+                overlap = len(query_trigrams & document_trigrams) / len(query_trigrams)
+                if overlap >= _FUZZY_MIN_OVERLAP:
+                    fuzzy.append((overlap, order, hit))
+            fuzzy.sort(key=lambda item: (-item[0], item[1]))
+            hits.extend(hit for _, _, hit in fuzzy[: limit - len(hits)])
+
+        if not hits:
+            return []
+        ids = [document_id for document_id, _, _ in hits]
+        placeholders = ",".join("?" for _ in ids)
         rows = connection.execute(
-            """
+            f"""
             SELECT id, path, title, summary, category, token_estimate, updated_at
             FROM documents
-            WHERE title LIKE ? OR summary LIKE ? OR path LIKE ?
-            ORDER BY updated_at DESC
-            LIMIT ?
+            WHERE id IN ({placeholders})
             """,
-            (pattern, pattern, pattern, limit),
+            ids,
         ).fetchall()
 
-    return _rows_to_records(rows)
+    by_id = {int(row[0]): row for row in rows}
+    return [
+        _row_to_match(by_id[document_id], matches)
+        for document_id, _, matches in hits
+        if document_id in by_id
+    ]
 
 
 def find_documents_by_concept(database_path: Path, concept: str, limit: int = 10) -> list[DocumentRecord]:
@@ -720,6 +2956,7 @@ def _select_content(
 
 def generate_health_report(database_path: Path) -> dict[str, object]:
     """Aggregate health metrics across all subsystems."""
+    flush_cache_hits(database_path)
     with sqlite3.connect(database_path) as connection:
         total_docs = int(connection.execute("SELECT COUNT(*) FROM documents").fetchone()[0])
         total_tokens = int(connection.execute(
@@ -741,7 +2978,7 @@ def generate_health_report(database_path: Path) -> dict[str, object]:
         ).fetchone()[0])
 
         embedded = int(connection.execute(
-            "SELECT COUNT(*) FROM embeddings WHERE embedding IS NOT NULL AND LENGTH(TRIM(embedding)) > 0"
+            "SELECT COUNT(*) FROM embeddings WHERE embedding IS NOT NULL AND LENGTH(embedding) > 0"
         ).fetchone()[0])
         coverage_pct = round((embedded / total_docs * 100) if total_docs > 0 else 0.0, 1)
 
@@ -749,6 +2986,7 @@ def generate_health_report(database_path: Path) -> dict[str, object]:
         cache_hits = int(connection.execute(
             "SELECT COALESCE(SUM(hit_count), 0) FROM query_cache"
         ).fetchone()[0])
+        stored_metrics = _stored_cache_metrics(connection)
 
         queue_queued = int(connection.execute(
             "SELECT COUNT(*) FROM events WHERE status = 'queued'"
@@ -768,6 +3006,7 @@ def generate_health_report(database_path: Path) -> dict[str, object]:
         "embedded_documents": embedded,
         "cache_entries": cache_entries,
         "cache_total_hits": cache_hits,
+        "cache_tiers": {**result_cache_stats(), **{name: stored_metrics.get(name, 0) for name in _CACHE_METRICS}},
         "queue_queued": queue_queued,
         "queue_failed": queue_failed,
     }
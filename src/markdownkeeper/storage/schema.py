@@ -3,6 +3,11 @@ from __future__ import annotations
 import sqlite3
 from pathlib import Path
 
+from markdownkeeper.storage.codec import decode_embedding, encode_embedding
+
+# PRAGMA user_version after embedding columns were converted from JSON text to BLOBs.
+EMBEDDING_BLOB_VERSION = 1
+
 SCHEMA_STATEMENTS = [
     """
     CREATE TABLE IF NOT EXISTS documents (
@@ -80,14 +85,14 @@ SCHEMA_STATEMENTS = [
         heading_path TEXT,
         content TEXT NOT NULL,
         token_count INTEGER NOT NULL,
-        embedding TEXT,
+        embedding BLOB,
         FOREIGN KEY(document_id) REFERENCES documents(id) ON DELETE CASCADE
     )
     """,
     """
     CREATE TABLE IF NOT EXISTS embeddings (
         document_id INTEGER PRIMARY KEY,
-        embedding TEXT,
+        embedding BLOB,
         model_name TEXT,
         generated_at TEXT,
         FOREIGN KEY(document_id) REFERENCES documents(id) ON DELETE CASCADE
@@ -101,7 +106,9 @@ SCHEMA_STATEMENTS = [
         result_json TEXT NOT NULL,
         created_at TEXT NOT NULL,
         hit_count INTEGER DEFAULT 0,
-        last_accessed TEXT
+        last_accessed TEXT,
+        generation INTEGER DEFAULT -1,
+        min_score REAL
     )
     """,
     """
@@ -117,12 +124,41 @@ SCHEMA_STATEMENTS = [
     )
     """,
     """
+    CREATE TABLE IF NOT EXISTS document_changes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        document_id INTEGER,
+        change_type TEXT NOT NULL,
+        changed_at TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS settings (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS cache_metrics (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    """
     CREATE INDEX IF NOT EXISTS idx_documents_path ON documents(path)
     """,
     """
     CREATE INDEX IF NOT EXISTS idx_documents_category ON documents(category)
     """,
     """
+    CREATE INDEX IF NOT EXISTS idx_documents_updated_at ON documents(updated_at)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_document_tags_tag_id ON document_tags(tag_id, document_id)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_document_concepts_concept_id ON document_concepts(concept_id, document_id)
+    """,
+    """
     CREATE INDEX IF NOT EXISTS idx_headings_document_id ON headings(document_id)
     """,
     """
@@ -140,10 +176,148 @@ SCHEMA_STATEMENTS = [
 ]
 
 
+# Full-text index over documents for BM25 lexical scoring. Kept in sync by triggers;
+# created separately because some SQLite builds ship without FTS5.
+FTS_STATEMENTS = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+        path, title, summary, content,
+        content='documents', content_rowid='id', tokenize='unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS documents_fts_insert AFTER INSERT ON documents BEGIN
+        INSERT INTO documents_fts(rowid, path, title, summary, content)
+        VALUES (new.id, new.path, new.title, new.summary, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS documents_fts_delete AFTER DELETE ON documents BEGIN
+        INSERT INTO documents_fts(documents_fts, rowid, path, title, summary, content)
+        VALUES ('delete', old.id, old.path, old.title, old.summary, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS documents_fts_update AFTER UPDATE OF path, title, summary, content ON documents BEGIN
+        INSERT INTO documents_fts(documents_fts, rowid, path, title, summary, content)
+        VALUES ('delete', old.id, old.path, old.title, old.summary, old.content);
+        INSERT INTO documents_fts(rowid, path, title, summary, content)
+        VALUES (new.id, new.path, new.title, new.summary, new.content);
+    END
+    """,
+]
+
+
+def _initialize_fts(connection: sqlite3.Connection) -> bool:
+    """Create the FTS5 index and triggers. Returns False when FTS5 is unavailable."""
+    existed = connection.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'documents_fts'"
+    ).fetchone()
+    try:
+        for statement in FTS_STATEMENTS:
+            connection.execute(statement)
+    except sqlite3.OperationalError:
+        return False
+    if existed is None:
+        connection.execute("INSERT INTO documents_fts(documents_fts) VALUES('rebuild')")
+    return True
+
+
+# Trigram index over the short, user-facing fields for substring and fuzzy lookups.
+# Standalone (not external-content) because the headings column is aggregated from
+# the headings table; upsert_document refreshes a document's row explicitly.
+TRIGRAM_STATEMENTS = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS documents_trigram USING fts5(
+        title, summary, path, headings, tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS documents_trigram_delete AFTER DELETE ON documents BEGIN
+        DELETE FROM documents_trigram WHERE rowid = old.id;
+    END
+    """,
+]
+
+_TRIGRAM_ROWS_SQL = """
+    INSERT INTO documents_trigram(rowid, title, summary, path, headings)
+    SELECT
+        d.id,
+        COALESCE(d.title, ''),
+        COALESCE(d.summary, ''),
+        d.path,
+        COALESCE(
+            (
+                SELECT GROUP_CONCAT(heading_text, char(10))
+                FROM (SELECT heading_text FROM headings WHERE document_id = d.id ORDER BY position)
+            ),
+            ''
+        )
+    FROM documents d
+"""
+
+
+def refresh_trigram_index(connection: sqlite3.Connection, document_id: int | None = None) -> None:
+    """Rewrite the trigram row for one document, or for every document when None."""
+    if document_id is None:
+        connection.execute("DELETE FROM documents_trigram")
+        connection.execute(_TRIGRAM_ROWS_SQL)
+        return
+    connection.execute("DELETE FROM documents_trigram WHERE rowid = ?", (document_id,))
+    connection.execute(_TRIGRAM_ROWS_SQL + " WHERE d.id = ?", (document_id,))
+
+
+def _initialize_trigram(connection: sqlite3.Connection) -> bool:
+    """Create the trigram index. Returns False when FTS5 or its trigram tokenizer is missing."""
+    existed = connection.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'documents_trigram'"
+    ).fetchone()
+    try:
+        for statement in TRIGRAM_STATEMENTS:
+            connection.execute(statement)
+    except sqlite3.OperationalError:
+        return False
+    if existed is None:
+        refresh_trigram_index(connection)
+    return True
+
+
+def _reencode(raw: object, model_name: str) -> bytes | None:
+    vector, _ = decode_embedding(raw)
+    if len(vector) == 0:
+        return None
+    return encode_embedding(vector, model_name)
+
+
+def _migrate_embeddings_to_blob(connection: sqlite3.Connection) -> None:
+    """Rewrite JSON-text embeddings in place as packed float32 BLOBs."""
+    rows = connection.execute(
+        "SELECT document_id, embedding, model_name FROM embeddings WHERE typeof(embedding) = 'text'"
+    ).fetchall()
+    connection.executemany(
+        "UPDATE embeddings SET embedding = ? WHERE document_id = ?",
+        [(_reencode(raw, str(model or "")), document_id) for document_id, raw, model in rows],
+    )
+    chunk_rows = connection.execute(
+        """
+        SELECT c.id, c.embedding, e.model_name
+        FROM document_chunks c
+        LEFT JOIN embeddings e ON e.document_id = c.document_id
+        WHERE typeof(c.embedding) = 'text'
+        """
+    ).fetchall()
+    connection.executemany(
+        "UPDATE document_chunks SET embedding = ? WHERE id = ?",
+        [(_reencode(raw, str(model or "")), chunk_id) for chunk_id, raw, model in chunk_rows],
+    )
+
+
 def initialize_database(database_path: Path) -> None:
     database_path.parent.mkdir(parents=True, exist_ok=True)
     with sqlite3.connect(database_path) as connection:
         connection.execute("PRAGMA foreign_keys = ON;")
+        # WAL lets cache-hit reads proceed while the watcher holds the write lock.
+        connection.execute("PRAGMA journal_mode = WAL;")
         for statement in SCHEMA_STATEMENTS:
             connection.execute(statement)
 
@@ -161,7 +335,16 @@ def initialize_database(database_path: Path) -> None:
             for row in connection.execute("PRAGMA table_info(document_chunks)").fetchall()
         }
         if "embedding" not in chunk_columns:
-            connection.execute("ALTER TABLE document_chunks ADD COLUMN embedding TEXT")
+            connection.execute("ALTER TABLE document_chunks ADD COLUMN embedding BLOB")
+
+        cache_columns = {
+            row[1]
+            for row in connection.execute("PRAGMA table_info(query_cache)").fetchall()
+        }
+        if "generation" not in cache_columns:
+            connection.execute("ALTER TABLE query_cache ADD COLUMN generation INTEGER DEFAULT -1")
+        if "min_score" not in cache_columns:
+            connection.execute("ALTER TABLE query_cache ADD COLUMN min_score REAL")
 
         event_columns = {
             row[1]
@@ -178,4 +361,12 @@ def initialize_database(database_path: Path) -> None:
             "CREATE INDEX IF NOT EXISTS idx_events_status_created ON events(status, created_at)"
         )
 
+        _initialize_fts(connection)
+        _initialize_trigram(connection)
+
+        user_version = int(connection.execute("PRAGMA user_version").fetchone()[0])
+        if user_version < EMBEDDING_BLOB_VERSION:
+            _migrate_embeddings_to_blob(connection)
+            connection.execute(f"PRAGMA user_version = {EMBEDDING_BLOB_VERSION}")
+
         connection.commit()
@@ -0,0 +1,206 @@
+"""Memory-mapped sidecar file holding the resident document and chunk vectors.
+
+The file is written next to ``index.db`` so a new query process can map the vectors
+instead of decoding every embedding from SQLite. Pages are shared between processes
+that map the same file and are paged in and out by the OS.
+
+Layout (little-endian; every section starts on a 64-byte boundary):
+
+    header           64 bytes: magic b"MKVF", version uint8, dtype uint8 (as in
+                     ``storage.codec``), reserved uint16, dims uint32,
+                     n_documents uint64, n_chunks uint64, generation int64,
+                     16-byte token, zero padding
+    document keys    n_documents int64
+    chunk keys       n_chunks int64
+    chunk owners     n_chunks int64
+    document scales  n_documents float32 (int8 files only)
+    chunk scales     n_chunks float32 (int8 files only)
+    document rows    n_documents x dims values at the file's dtype
+    chunk rows       n_chunks x dims values at the file's dtype
+
+``generation`` is the ``document_changes`` generation the vectors reflect; readers
+apply later changes from SQLite on top. ``token`` ties the file to the database that
+wrote it (the database stores the same token), so a stale file left behind by another
+database is never mapped.
+"""
+
+from __future__ import annotations
+
+from array import array
+from dataclasses import dataclass
+import mmap
+import os
+from pathlib import Path
+import struct
+import sys
+
+from markdownkeeper.query.vector_store import VectorMatrix
+from markdownkeeper.storage.codec import PRECISIONS
+from markdownkeeper.storage.files import atomic_file
+
+MAGIC = b"MKVF"
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct("<4sBBHIQQq16s")
+_HEADER_SIZE = 64
+_ALIGNMENT = 64
+_ITEMSIZES = {"float32": 4, "float16": 2, "int8": 1}
+_PRECISION_NAMES = {code: name for name, code in PRECISIONS.items()}
+
+
+@dataclass(slots=True)
+class VectorFileHeader:
+    precision: str
+    dimensions: int
+    documents: int
+    chunks: int
+    generation: int
+    token: bytes
+
+
+@dataclass(slots=True)
+class VectorFile:
+    header: VectorFileHeader
+    documents: VectorMatrix
+    chunks: VectorMatrix
+
+
+def _aligned(offset: int) -> int:
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def _sections(header: VectorFileHeader) -> list[tuple[int, int]]:
+    """``(offset, size)`` of each section after the header, in layout order."""
+    n_documents, n_chunks = header.documents, header.chunks
+    scale_bytes = 4 if header.precision == "int8" else 0
+    row_bytes = header.dimensions * _ITEMSIZES[header.precision]
+    sizes = [
+        n_documents * 8,
+        n_chunks * 8,
+        n_chunks * 8,
+        n_documents * scale_bytes,
+        n_chunks * scale_bytes,
+        n_documents * row_bytes,
+        n_chunks * row_bytes,
+    ]
+    sections: list[tuple[int, int]] = []
+    offset = _HEADER_SIZE
+    for size in sizes:
+        sections.append((offset, size))
+        offset = _aligned(offset + size)
+    return sections
+
+
+def _parse_header(raw: bytes) -> VectorFileHeader | None:
+    if len(raw) < _HEADER_SIZE:
+        return None
+    magic, version, dtype, _, dims, n_documents, n_chunks, generation, token = _HEADER.unpack_from(raw)
+    if magic != MAGIC or version != FORMAT_VERSION or dtype not in _PRECISION_NAMES:
+        return None
+    return VectorFileHeader(_PRECISION_NAMES[dtype], int(dims), int(n_documents), int(n_chunks), int(generation), token)
+
+
+def read_vector_file_header(path: Path) -> VectorFileHeader | None:
+    """The header of the file at ``path``, or None when it is missing or unusable."""
+    try:
+        with open(path, "rb") as handle:
+            return _parse_header(handle.read(_HEADER_SIZE))
+    except OSError:
+        return None
+
+
+def write_vector_file(
+    path: Path,
+    documents: VectorMatrix,
+    chunks: VectorMatrix,
+    generation: int,
+    token: bytes,
+) -> None:
+    """Write both matrices to ``path`` atomically (temporary file, fsync, rename)."""
+    if sys.byteorder != "little":
+        raise OSError("vector files are only written on little-endian hosts")
+    if documents.dimensions and chunks.dimensions and documents.dimensions != chunks.dimensions:
+        chunks = VectorMatrix(documents.precision)
+    header = VectorFileHeader(
+        documents.precision,
+        documents.dimensions or chunks.dimensions,
+        len(documents),
+        len(chunks),
+        generation,
+        token.ljust(16, b"\0")[:16],
+    )
+    payloads: list[bytes | memoryview] = [
+        array("q", documents.keys()).tobytes(),
+        array("q", chunks.keys()).tobytes(),
+        array("q", chunks.owners()).tobytes(),
+        documents.raw_scales() or b"",
+        chunks.raw_scales() or b"",
+        documents.raw_rows(),
+        chunks.raw_rows(),
+    ]
+
+    with atomic_file(path) as handle:
+        handle.write(
+            _HEADER.pack(
+                MAGIC,
+                FORMAT_VERSION,
+                PRECISIONS[header.precision],
+                0,
+                header.dimensions,
+                header.documents,
+                header.chunks,
+                header.generation,
+                header.token,
+            ).ljust(_HEADER_SIZE, b"\0")
+        )
+        for (offset, size), payload in zip(_sections(header), payloads):
+            handle.seek(offset)
+            handle.write(payload[:size])
+        end = max(offset + size for offset, size in _sections(header))
+        handle.truncate(max(_HEADER_SIZE, end))
+
+
+def open_vector_file(path: Path) -> VectorFile | None:
+    """Map the file at ``path`` copy-on-write; None when it is missing or unusable.
+
+    Changes a process applies to the returned matrices stay private to it.
+    """
+    if sys.byteorder != "little":
+        return None
+    try:
+        with open(path, "rb") as handle:
+            header = _parse_header(handle.read(_HEADER_SIZE))
+            if header is None:
+                return None
+            sections = _sections(header)
+            end = max(offset + size for offset, size in sections)
+            if os.fstat(handle.fileno()).st_size < end:
+                return None
+            if end <= _HEADER_SIZE:
+                return VectorFile(header, VectorMatrix(header.precision), VectorMatrix(header.precision))
+            mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_COPY)
+    except (OSError, ValueError):
+        return None
+
+    view = memoryview(mapped)
+    document_keys, chunk_keys, chunk_owners, document_scales, chunk_scales, document_rows, chunk_rows = (
+        view[offset : offset + size] for offset, size in sections
+    )
+    keys = document_keys.cast("q").tolist()
+    documents = VectorMatrix.from_buffer(
+        header.precision,
+        header.dimensions,
+        keys,
+        keys,
+        document_rows,
+        document_scales if len(document_scales) else None,
+    )
+    chunks = VectorMatrix.from_buffer(
+        header.precision,
+        header.dimensions,
+        chunk_keys.cast("q").tolist(),
+        chunk_owners.cast("q").tolist(),
+        chunk_rows,
+        chunk_scales if len(chunk_scales) else None,
+    )
+    return VectorFile(header, documents, chunks)
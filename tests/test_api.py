@@ -12,11 +12,13 @@ import json
 import tempfile
 import threading
 import unittest
+from urllib.error import HTTPError
 from urllib.request import Request, urlopen
 
 from http.server import ThreadingHTTPServer
 
 from markdownkeeper.api.server import build_handler
+from markdownkeeper.config import SearchConfig
 from markdownkeeper.processor.parser import parse_markdown
 from markdownkeeper.storage.repository import upsert_document
 from markdownkeeper.storage.schema import initialize_database
@@ -54,6 +56,7 @@ class ApiTests(unittest.TestCase):
                     payload = json.loads(resp.read().decode("utf-8"))
                 self.assertEqual(payload["result"]["count"], 1)
                 self.assertIn("content", payload["result"]["documents"][0])
+                self.assertNotIn("timings", payload["result"])
 
                 req2 = Request(
                     f"http://127.0.0.1:{port}/api/v1/get_doc",
@@ -93,6 +96,127 @@ class ApiTests(unittest.TestCase):
                 server.shutdown()
                 server.server_close()
 
+    def test_semantic_passages_endpoint_returns_chunks(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            db = root / ".markdownkeeper" / "index.db"
+            initialize_database(db)
+            doc = root / "doc.md"
+            doc.write_text("# Runbook\nintro\n\n## Restart\nrestart the api service", encoding="utf-8")
+            doc_id = upsert_document(db, doc, parse_markdown(doc.read_text(encoding="utf-8")))
+
+            server = ThreadingHTTPServer(("127.0.0.1", 0), build_handler(db))
+            port = server.server_address[1]
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            try:
+                req = Request(
+                    f"http://127.0.0.1:{port}/api/v1/passages",
+                    data=json.dumps(
+                        {
+                            "jsonrpc": "2.0",
+                            "method": "semantic_passages",
+                            "params": {"query": "restart api service", "max_results": 1},
+                            "id": 1,
+                        }
+                    ).encode("utf-8"),
+                    headers={"Content-Type": "application/json"},
+                    method="POST",
+                )
+                with urlopen(req, timeout=5) as resp:  # noqa: S310
+                    payload = json.loads(resp.read().decode("utf-8"))
+                self.assertEqual(payload["result"]["count"], 1)
+                passage = payload["result"]["passages"][0]
+                self.assertEqual(passage["document_id"], doc_id)
+                self.assertIn("Restart", passage["heading_path"])
+                self.assertGreater(passage["token_count"], 0)
+            finally:
+                server.shutdown()
+                server.server_close()
+
+    def test_semantic_query_applies_filters(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            db = root / ".markdownkeeper" / "index.db"
+            initialize_database(db)
+            upsert_document(db, root / "ops" / "a.md", parse_markdown("---\ntags: api\n---\n# Restart\nrestart the api"))
+            kept = upsert_document(db, root / "ops" / "b.md", parse_markdown("---\ntags: api, ops\n---\n# Restart\nrestart the api"))
+            upsert_document(db, root / "dev" / "c.md", parse_markdown("---\ntags: api, ops\n---\n# Restart\nrestart the api"))
+
+            server = ThreadingHTTPServer(("127.0.0.1", 0), build_handler(db))
+            port = server.server_address[1]
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            try:
+                req = Request(
+                    f"http://127.0.0.1:{port}/api/v1/query",
+                    data=json.dumps(
+                        {
+                            "jsonrpc": "2.0",
+                            "method": "semantic_query",
+                            "params": {
+                                "query": "restart api",
+                                "tags": ["api", "ops"],
+                                "path_prefix": str(root / "ops"),
+                                "explain": True,
+                            },
+                            "id": 1,
+                        }
+                    ).encode("utf-8"),
+                    headers={"Content-Type": "application/json"},
+                    method="POST",
+                )
+                with urlopen(req, timeout=5) as resp:  # noqa: S310
+                    payload = json.loads(resp.read().decode("utf-8"))
+                self.assertEqual([doc["id"] for doc in payload["result"]["documents"]], [kept])
+                self.assertIn("filter", payload["result"]["timings"]["stages_ms"])
+                self.assertEqual(payload["result"]["timings"]["counts"]["candidates"], 1)
+            finally:
+                server.shutdown()
+                server.server_close()
+
+    def test_semantic_query_many_returns_results_per_query(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            db = root / ".markdownkeeper" / "index.db"
+            initialize_database(db)
+            k8s = upsert_document(db, root / "k8s.md", parse_markdown("# Kubernetes\nkubernetes rollout"))
+            pg = upsert_document(db, root / "pg.md", parse_markdown("# Postgres\npostgres vacuum"))
+
+            server = ThreadingHTTPServer(("127.0.0.1", 0), build_handler(db))
+            port = server.server_address[1]
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+
+            def post(params: dict[str, object]) -> dict[str, object]:
+                req = Request(
+                    f"http://127.0.0.1:{port}/api/v1/query_many",
+                    data=json.dumps({"jsonrpc": "2.0", "method": "semantic_query_many", "params": params, "id": 1}).encode(
+                        "utf-8"
+                    ),
+                    headers={"Content-Type": "application/json"},
+                    method="POST",
+                )
+                try:
+                    with urlopen(req, timeout=5) as resp:  # noqa: S310
+                        return json.loads(resp.read().decode("utf-8"))
+                except HTTPError as exc:
+                    return json.loads(exc.read().decode("utf-8"))
+
+            try:
+                payload = post({"queries": ["kubernetes rollout", "postgres vacuum"], "max_results": 1})
+                results = payload["result"]["results"]
+                self.assertEqual(payload["result"]["count"], 2)
+                self.assertEqual(results[0]["query"], "kubernetes rollout")
+                self.assertEqual([doc["id"] for doc in results[0]["documents"]], [k8s])
+                self.assertEqual([doc["id"] for doc in results[1]["documents"]], [pg])
+
+                error = post({"queries": "kubernetes"})
+                self.assertEqual(error["error"]["code"], -32602)
+            finally:
+                server.shutdown()
+                server.server_close()
+
     def test_health_endpoint_returns_ok(self) -> None:
         with tempfile.TemporaryDirectory() as tmp:
             root = Path(tmp)
@@ -217,6 +341,57 @@ class ApiTests(unittest.TestCase):
                 server.shutdown()
                 server.server_close()
 
+    def test_semantic_query_with_bad_search_config_returns_json_error(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            db = root / ".markdownkeeper" / "index.db"
+            initialize_database(db)
+
+            handler = build_handler(db, search_config=SearchConfig(pipeline="stagd"))
+            server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+            port = server.server_address[1]
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            try:
+                req = Request(
+                    f"http://127.0.0.1:{port}/api/v1/query",
+                    data=json.dumps({
+                        "jsonrpc": "2.0",
+                        "method": "semantic_query",
+                        "params": {"query": "kubernetes"},
+                        "id": 7,
+                    }).encode("utf-8"),
+                    headers={"Content-Type": "application/json"},
+                    method="POST",
+                )
+                with self.assertRaises(HTTPError) as ctx:
+                    urlopen(req, timeout=5)  # noqa: S310
+                self.assertEqual(ctx.exception.code, 500)
+                body = json.loads(ctx.exception.read().decode("utf-8"))
+                self.assertEqual(body["id"], 7)
+                self.assertEqual(body["error"]["code"], -32603)
+                self.assertIn("unknown search pipeline", body["error"]["message"])
+
+                # The batch endpoint ranks with the same search config.
+                req = Request(
+                    f"http://127.0.0.1:{port}/api/v1/query_many",
+                    data=json.dumps({
+                        "jsonrpc": "2.0",
+                        "method": "semantic_query_many",
+                        "params": {"queries": ["kubernetes"]},
+                        "id": 8,
+                    }).encode("utf-8"),
+                    headers={"Content-Type": "application/json"},
+                    method="POST",
+                )
+                with self.assertRaises(HTTPError) as ctx:
+                    urlopen(req, timeout=5)  # noqa: S310
+                self.assertEqual(ctx.exception.code, 500)
+                self.assertEqual(json.loads(ctx.exception.read().decode("utf-8"))["id"], 8)
+            finally:
+                server.shutdown()
+                server.server_close()
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -16,6 +16,7 @@ import unittest
 from unittest import mock
 
 from markdownkeeper.cli.main import main
+from markdownkeeper.storage.repository import clear_result_cache
 
 
 class CliTests(unittest.TestCase):
@@ -33,6 +34,41 @@ class CliTests(unittest.TestCase):
         payload = json.loads(buf.getvalue())
         self.assertEqual(payload["api"]["port"], 9001)
 
+    def test_serve_api_rejects_unknown_search_pipeline_at_startup(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            cfg = Path(tmp) / "markdownkeeper.toml"
+            cfg.write_text("[search]\npipeline=\"stagd\"\n", encoding="utf-8")
+
+            buf = io.StringIO()
+            with mock.patch("sys.argv", ["mdkeeper", "--config", str(cfg), "serve-api"]), mock.patch(
+                "markdownkeeper.cli.main.run_api_server"
+            ) as server_mock:
+                with contextlib.redirect_stdout(buf):
+                    code = main()
+
+        self.assertEqual(code, 1)
+        server_mock.assert_not_called()
+        self.assertIn("unknown search pipeline: stagd", buf.getvalue())
+
+    def test_commands_report_invalid_config_without_traceback(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            cfg = Path(tmp) / "markdownkeeper.toml"
+            db_path = Path(tmp) / "index.db"
+            for section in ("[search]\npipeline=\"bogus\"\n", "[index]\ntype=\"bogus\"\n"):
+                cfg.write_text(section, encoding="utf-8")
+                for command in (
+                    ["query", "kubernetes", "--db-path", str(db_path)],
+                    ["stats", "--db-path", str(db_path)],
+                    ["report", "--db-path", str(db_path)],
+                    ["show-config"],
+                ):
+                    buf = io.StringIO()
+                    with mock.patch("sys.argv", ["mdkeeper", "--config", str(cfg), *command]):
+                        with contextlib.redirect_stdout(buf):
+                            code = main()
+                    self.assertEqual(code, 1, command)
+                    self.assertIn(f"Invalid config {cfg}: unknown", buf.getvalue())
+
     def test_scan_file_indexes_document_and_outputs_json(self) -> None:
         with tempfile.TemporaryDirectory() as tmp:
             db_path = Path(tmp) / ".markdownkeeper" / "index.db"
@@ -442,6 +478,45 @@ extensions=[".md"]
             self.assertEqual(payload["search_mode"], "semantic")
             self.assertEqual(payload["count"], 1)
 
+    def test_query_filters_restrict_semantic_results(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / ".markdownkeeper" / "index.db"
+            for name, category in (("runbook.md", "runbooks"), ("guide.md", "guides")):
+                md_file = Path(tmp) / name
+                md_file.write_text(f"---\ncategory: {category}\ntags: k8s\n---\n# {name}\nkubernetes rollout", encoding="utf-8")
+                with mock.patch("sys.argv", ["mdkeeper", "scan-file", str(md_file), "--db-path", str(db_path)]):
+                    main()
+
+            out = io.StringIO()
+            argv = ["mdkeeper", "query", "kubernetes", "--db-path", str(db_path), "--format", "json"]
+            argv += ["--category", "runbooks", "--tag", "k8s", "--updated-after", "2000-01-01"]
+            with mock.patch("sys.argv", argv):
+                with contextlib.redirect_stdout(out):
+                    code = main()
+
+            self.assertEqual(code, 0)
+            payload = json.loads(out.getvalue())
+            self.assertEqual([doc["category"] for doc in payload["documents"]], ["runbooks"])
+
+    def test_query_explain_reports_stage_timings(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / ".markdownkeeper" / "index.db"
+            md_file = Path(tmp) / "doc.md"
+            md_file.write_text("# Explain\nkubernetes rollout", encoding="utf-8")
+            with mock.patch("sys.argv", ["mdkeeper", "scan-file", str(md_file), "--db-path", str(db_path)]):
+                main()
+
+            out = io.StringIO()
+            argv = ["mdkeeper", "query", "kubernetes", "--db-path", str(db_path), "--format", "json", "--explain"]
+            with mock.patch("sys.argv", argv):
+                with contextlib.redirect_stdout(out):
+                    code = main()
+
+            self.assertEqual(code, 0)
+            timings = json.loads(out.getvalue())["timings"]
+            self.assertIn("encode", timings["stages_ms"])
+            self.assertIn("total", timings["stages_ms"])
+            self.assertEqual(timings["counts"]["rows_fetched"], 1)
 
     def test_write_systemd_generates_unit_files(self) -> None:
         with tempfile.TemporaryDirectory() as tmp:
@@ -482,13 +557,22 @@ extensions=[".md"]
             gen_buf = io.StringIO()
             with mock.patch(
                 "sys.argv",
-                ["mdkeeper", "embeddings-generate", "--db-path", str(db_path)],
+                ["mdkeeper", "embeddings-generate", "--db-path", str(db_path), "--batch-size", "8"],
             ):
                 with contextlib.redirect_stdout(gen_buf):
                     gen_code = main()
             self.assertEqual(gen_code, 0)
             self.assertIn("Generated embeddings", gen_buf.getvalue())
 
+            err = io.StringIO()
+            with mock.patch("sys.argv", ["mdkeeper", "serve-api", "--db-path", str(db_path)]), mock.patch(
+                "markdownkeeper.cli.main.run_api_server"
+            ) as server_mock:
+                with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(err):
+                    self.assertEqual(main(), 0)
+            server_mock.assert_called_once()
+            self.assertIn("candidate index current", err.getvalue())
+
             status_buf = io.StringIO()
             with mock.patch(
                 "sys.argv",
@@ -549,6 +633,18 @@ extensions=[".md"]
             self.assertEqual(payload["cases"], 1)
             self.assertGreaterEqual(float(payload["precision_at_k"]), 1.0)
 
+            out = io.StringIO()
+            with mock.patch(
+                "sys.argv",
+                ["mdkeeper", "embeddings-eval", str(cases_file), "--db-path", str(db_path), "--k", "1", "--compare-precision"],
+            ):
+                with contextlib.redirect_stdout(out):
+                    code = main()
+            self.assertEqual(code, 0)
+            comparison = json.loads(out.getvalue())["precision_comparison"]
+            self.assertEqual(sorted(comparison), ["float16", "float32", "int8"])
+            self.assertEqual(comparison["float32"]["delta"], 0.0)
+
 
     def test_semantic_benchmark_json(self) -> None:
         with tempfile.TemporaryDirectory() as tmp:
@@ -598,6 +694,155 @@ extensions=[".md"]
             self.assertEqual(payload["iterations"], 2)
             self.assertIn("latency_ms", payload)
 
+            out = io.StringIO()
+            with mock.patch(
+                "sys.argv",
+                ["mdkeeper", "semantic-benchmark", str(cases_file), "--db-path", str(db_path), "--index-sizes", "300"],
+            ):
+                with contextlib.redirect_stdout(out):
+                    code = main()
+            self.assertEqual(code, 0)
+            tradeoff = json.loads(out.getvalue())["index_tradeoff"]
+            self.assertTrue(all(row["documents"] == 300 for row in tradeoff))
+
+            out = io.StringIO()
+            with mock.patch(
+                "sys.argv",
+                ["mdkeeper", "semantic-benchmark", str(cases_file), "--db-path", str(db_path), "--fallback-sizes", "250"],
+            ):
+                with contextlib.redirect_stdout(out):
+                    code = main()
+            self.assertEqual(code, 0)
+            fallback = json.loads(out.getvalue())["fallback_search"]
+            self.assertEqual([row["documents"] for row in fallback], [250])
+            self.assertEqual(fallback[0]["agreement"], 1.0)
+
+            out = io.StringIO()
+            with mock.patch(
+                "sys.argv",
+                [
+                    "mdkeeper",
+                    "semantic-benchmark",
+                    str(cases_file),
+                    "--db-path",
+                    str(db_path),
+                    "--embedding-batch-sizes",
+                    "16",
+                    "--format",
+                    "text",
+                ],
+            ):
+                with contextlib.redirect_stdout(out):
+                    code = main()
+            self.assertEqual(code, 0)
+            self.assertIn("embeddings batch_size=per-chunk", out.getvalue())
+            self.assertIn("embeddings batch_size=16", out.getvalue())
+
+            out = io.StringIO()
+            with mock.patch(
+                "sys.argv",
+                [
+                    "mdkeeper",
+                    "semantic-benchmark",
+                    str(cases_file),
+                    "--db-path",
+                    str(db_path),
+                    "--pipeline",
+                    "staged",
+                    "--compare-pipeline",
+                ],
+            ):
+                with contextlib.redirect_stdout(out):
+                    code = main()
+            self.assertEqual(code, 0)
+            payload = json.loads(out.getvalue())
+            self.assertEqual(payload["pipeline"], "staged")
+            comparison = payload["pipeline_comparison"]
+            self.assertEqual(comparison["staged"]["first_stage"], "rrf")
+            self.assertAlmostEqual(
+                comparison["staged"]["delta"],
+                comparison["staged"]["precision_at_k"] - comparison["blend"]["precision_at_k"],
+            )
+
+    def test_query_chunk_granularity_returns_passages(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / ".markdownkeeper" / "index.db"
+            md_file = Path(tmp) / "doc.md"
+            md_file.write_text("# Guide\nintro\n\n## Backups\nnightly backup schedule", encoding="utf-8")
+            with mock.patch("sys.argv", ["mdkeeper", "scan-file", str(md_file), "--db-path", str(db_path)]):
+                main()
+
+            out = io.StringIO()
+            with mock.patch(
+                "sys.argv",
+                ["mdkeeper", "query", "backup schedule", "--db-path", str(db_path), "--granularity", "chunk", "--format", "json", "--limit", "1"],
+            ):
+                with contextlib.redirect_stdout(out):
+                    code = main()
+            self.assertEqual(code, 0)
+            payload = json.loads(out.getvalue())
+            self.assertEqual(payload["granularity"], "chunk")
+            self.assertEqual(payload["count"], 1)
+            self.assertIn("Backups", payload["passages"][0]["heading_path"])
+
+    def test_query_chunk_granularity_honours_filters_and_explain(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / ".markdownkeeper" / "index.db"
+            for name, text in (
+                ("doc.md", "# Guide\nintro\n\n## Backups\nnightly backup schedule"),
+                ("ops.md", "---\ntags: ops\n---\n# Ops\n\n## Schedule\nbackup rota"),
+            ):
+                md_file = Path(tmp) / name
+                md_file.write_text(text, encoding="utf-8")
+                with mock.patch("sys.argv", ["mdkeeper", "scan-file", str(md_file), "--db-path", str(db_path)]):
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        main()
+
+            out = io.StringIO()
+            with mock.patch(
+                "sys.argv",
+                [
+                    "mdkeeper", "query", "backup schedule", "--db-path", str(db_path), "--granularity", "chunk",
+                    "--tag", "ops", "--explain", "--format", "json",
+                ],
+            ):
+                with contextlib.redirect_stdout(out):
+                    code = main()
+            self.assertEqual(code, 0)
+            payload = json.loads(out.getvalue())
+            self.assertTrue(payload["passages"])
+            self.assertEqual({passage["path"] for passage in payload["passages"]}, {str((Path(tmp) / "ops.md").resolve())})
+            self.assertIn("filter", payload["timings"]["stages_ms"])
+
+    def test_query_lexical_mode_rejects_semantic_only_options(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / ".markdownkeeper" / "index.db"
+            for extra in (["--granularity", "chunk"], ["--explain"], ["--tag", "ops"]):
+                out = io.StringIO()
+                with mock.patch(
+                    "sys.argv",
+                    ["mdkeeper", "query", "backup", "--db-path", str(db_path), "--search-mode", "lexical", *extra],
+                ):
+                    with contextlib.redirect_stdout(out):
+                        code = main()
+                self.assertEqual(code, 1)
+                self.assertIn("--search-mode semantic", out.getvalue())
+
+    def test_search_index_rebuild_reports_document_count(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / ".markdownkeeper" / "index.db"
+            md_file = Path(tmp) / "doc.md"
+            md_file.write_text("# Rebuild\nfull text", encoding="utf-8")
+            with mock.patch("sys.argv", ["mdkeeper", "scan-file", str(md_file), "--db-path", str(db_path)]):
+                main()
+
+            out = io.StringIO()
+            with mock.patch("sys.argv", ["mdkeeper", "search-index-rebuild", "--db-path", str(db_path)]):
+                with contextlib.redirect_stdout(out):
+                    code = main()
+            self.assertEqual(code, 0)
+            self.assertIn("Rebuilt search index for 1 documents", out.getvalue())
+
     def test_stats_json(self) -> None:
         with tempfile.TemporaryDirectory() as tmp:
             db_path = Path(tmp) / ".markdownkeeper" / "index.db"
@@ -712,6 +957,37 @@ extensions=[".md"]
             self.assertEqual(code, 0)
             self.assertIn("Health Report", out.getvalue())
 
+    def test_report_shows_cache_counters_from_earlier_processes(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / ".markdownkeeper" / "index.db"
+            md_file = Path(tmp) / "doc.md"
+            md_file.write_text("# Report Test\nhello world", encoding="utf-8")
+            with mock.patch("sys.argv", ["mdkeeper", "scan-file", str(md_file), "--db-path", str(db_path)]):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    main()
+
+            # Each command runs in a fresh process; clearing the result cache stands in
+            # for the process boundary.
+            for _ in range(3):
+                clear_result_cache()
+                with mock.patch("sys.argv", ["mdkeeper", "query", "hello world", "--db-path", str(db_path)]):
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        main()
+            clear_result_cache()
+
+            out = io.StringIO()
+            with mock.patch("sys.argv", ["mdkeeper", "report", "--db-path", str(db_path), "--format", "text"]):
+                with contextlib.redirect_stdout(out):
+                    code = main()
+            self.assertEqual(code, 0)
+            self.assertIn("Cache Hit/Miss: 0 mem / 2 db / 1 miss", out.getvalue())
+
+            out = io.StringIO()
+            with mock.patch("sys.argv", ["mdkeeper", "stats", "--db-path", str(db_path), "--format", "json"]):
+                with contextlib.redirect_stdout(out):
+                    main()
+            self.assertEqual(json.loads(out.getvalue())["cache"]["sqlite_hits"], 2)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+from pathlib import Path
+import sys
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+import json
+import struct
+import unittest
+
+from markdownkeeper.storage.codec import (
+    DTYPE_FLOAT16,
+    DTYPE_INT8,
+    MAGIC,
+    decode_embedding,
+    embedding_dtype,
+    encode_embedding,
+    is_encoded_embedding,
+)
+
+
+class CodecTests(unittest.TestCase):
+    def test_round_trip_preserves_values_and_model(self) -> None:
+        blob = encode_embedding([0.25, -0.5, 1.0], "token-hash-v1")
+        self.assertTrue(is_encoded_embedding(blob))
+        vector, model = decode_embedding(blob)
+        self.assertEqual(model, "token-hash-v1")
+        self.assertEqual([float(v) for v in vector], [0.25, -0.5, 1.0])
+
+    def test_payload_is_packed_little_endian_float32(self) -> None:
+        blob = encode_embedding([1.0, 2.0], "m")
+        self.assertEqual(blob[:4], MAGIC)
+        self.assertEqual(blob[-8:], struct.pack("<2f", 1.0, 2.0))
+        self.assertLess(len(blob), len(json.dumps([1.0, 2.0]).encode("utf-8")) + 24)
+
+    def test_decode_returns_view_over_row_bytes(self) -> None:
+        blob = encode_embedding([3.0, 4.0], "")
+        vector, _ = decode_embedding(blob)
+        self.assertNotIsInstance(vector, list)
+        self.assertEqual(len(vector), 2)
+
+    def test_decode_accepts_legacy_json_text(self) -> None:
+        vector, model = decode_embedding(json.dumps([1.0, 2.0]))
+        self.assertEqual(vector, [1.0, 2.0])
+        self.assertEqual(model, "")
+
+    def test_quantized_round_trips_are_close_and_smaller(self) -> None:
+        values = [0.5, -0.25, 0.125, -1.0, 0.0, 0.75]
+        full = encode_embedding(values, "m")
+        for dtype, tolerance in ((DTYPE_FLOAT16, 1e-3), (DTYPE_INT8, 1.0 / 127)):
+            blob = encode_embedding(values, "m", dtype)
+            self.assertEqual(embedding_dtype(blob), dtype)
+            self.assertLess(len(blob), len(full))
+            vector, model = decode_embedding(blob)
+            self.assertEqual(model, "m")
+            for got, expected in zip(vector, values):
+                self.assertAlmostEqual(float(got), expected, delta=tolerance)
+        with self.assertRaises(ValueError):
+            encode_embedding(values, "m", 9)
+
+    def test_decode_rejects_invalid_input(self) -> None:
+        self.assertEqual(decode_embedding(None), ([], ""))
+        self.assertEqual(decode_embedding(b"not a vector"), ([], ""))
+        self.assertEqual(decode_embedding(encode_embedding([1.0, 2.0])[:-4]), ([], ""))
+        self.assertEqual(decode_embedding(encode_embedding([1.0, 2.0], "", DTYPE_INT8)[:-1]), ([], ""))
+        self.assertEqual(decode_embedding("not json"), ([], ""))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -11,7 +11,7 @@ if str(SRC) not in sys.path:
 import tempfile
 import unittest
 
-from markdownkeeper.config import load_config
+from markdownkeeper.config import ConfigError, load_config
 
 
 class ConfigTests(unittest.TestCase):
@@ -38,6 +38,25 @@ database_path = "state/custom.db"
 [api]
 host = "0.0.0.0"
 port = 9999
+
+[cache]
+ttl_seconds = 60
+max_entries = 500
+memory_max_entries = 32
+memory_max_bytes = 65536
+
+[search]
+workers = 4
+parallel_min_documents = 5000
+pipeline = "Staged"
+first_stage = "bm25"
+candidates = 50
+lexical_weight = 0.3
+
+[index]
+type = "HNSW"
+nprobe = 16
+ef_search = 128
                 """.strip(),
                 encoding="utf-8",
             )
@@ -50,6 +69,21 @@ port = 9999
             self.assertEqual(config.storage.database_path, "state/custom.db")
             self.assertEqual(config.api.host, "0.0.0.0")
             self.assertEqual(config.api.port, 9999)
+            self.assertEqual(config.cache.ttl_seconds, 60)
+            self.assertEqual(config.cache.max_entries, 500)
+            self.assertEqual(config.cache.memory_max_entries, 32)
+            self.assertEqual(config.cache.memory_max_bytes, 65536)
+            self.assertEqual(config.search.workers, 4)
+            self.assertEqual(config.search.parallel_min_documents, 5000)
+            self.assertEqual(config.search.pipeline, "staged")
+            self.assertEqual(config.search.first_stage, "bm25")
+            self.assertEqual(config.search.candidates, 50)
+            self.assertEqual(config.search.lexical_weight, 0.3)
+            self.assertEqual(config.search.rrf_k, 60)
+            self.assertEqual(config.index.type, "hnsw")
+            self.assertEqual(config.index.nprobe, 16)
+            self.assertEqual(config.index.ef_search, 128)
+            self.assertEqual(config.index.hnsw_m, 32)
 
     def test_partial_config_falls_back_to_defaults(self) -> None:
         with tempfile.TemporaryDirectory() as tmp:
@@ -61,6 +95,21 @@ port = 9999
             self.assertEqual(config.watch.extensions, [".md", ".markdown"])
             self.assertEqual(config.api.host, "127.0.0.1")
 
+    def test_unknown_enum_values_are_rejected(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            config_path = Path(tmp) / "markdownkeeper.toml"
+            config_path.write_text("[search]\npipeline=\"stagd\"\n", encoding="utf-8")
+            with self.assertRaisesRegex(ConfigError, "unknown search pipeline: stagd"):
+                load_config(config_path)
+
+            config_path.write_text("[search]\npipeline=\"Staged\"\nfirst_stage=\"knn\"\n", encoding="utf-8")
+            with self.assertRaisesRegex(ConfigError, "unknown first stage: knn"):
+                load_config(config_path)
+
+            config_path.write_text("[index]\ntype=\"lsh\"\n", encoding="utf-8")
+            with self.assertRaisesRegex(ConfigError, "unknown index type: lsh"):
+                load_config(config_path)
+
     def test_empty_config_file_returns_defaults(self) -> None:
         with tempfile.TemporaryDirectory() as tmp:
             config_path = Path(tmp) / "markdownkeeper.toml"
@@ -13,12 +13,22 @@ import unittest
 from unittest import mock
 
 from markdownkeeper.query.embeddings import (
+    _MODEL_CACHE,
     _hash_embedding,
+    _hash_embeddings,
     _normalize,
+    _EmbeddingLRU,
     _tokenize,
+    benchmark_embedding_throughput,
+    clear_query_embedding_cache,
     compute_embedding,
+    compute_embeddings,
+    compute_query_embedding,
+    compute_query_embeddings,
     cosine_similarity,
+    drain_query_embedding_counts,
     is_model_embedding_available,
+    query_embedding_cache_stats,
 )
 
 
@@ -92,6 +102,117 @@ class EmbeddingTests(unittest.TestCase):
         self.assertEqual(model, "token-hash-v1")
         self.assertEqual(len(vector), 64)
 
+    def test_compute_query_embedding_caches_by_normalized_text(self) -> None:
+        clear_query_embedding_cache()
+        with mock.patch(
+            "markdownkeeper.query.embeddings.compute_embedding",
+            side_effect=lambda text, model_name: ([1.0, 0.0], model_name),
+        ) as encoder:
+            first = compute_query_embedding("kubernetes  rollout", model_name="stub")
+            second = compute_query_embedding(" kubernetes rollout\n", model_name="stub")
+            compute_query_embedding("kubernetes rollout", model_name="other")
+        self.assertEqual(first, second)
+        self.assertEqual(encoder.call_count, 2)
+        stats = query_embedding_cache_stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["entries"]), (1, 2, 2))
+        self.assertEqual(drain_query_embedding_counts(), (1, 2))
+        self.assertEqual(drain_query_embedding_counts(), (0, 0))
+        clear_query_embedding_cache()
+
+    def test_compute_query_embeddings_encodes_misses_in_one_batch(self) -> None:
+        clear_query_embedding_cache()
+        with mock.patch(
+            "markdownkeeper.query.embeddings.compute_embedding", return_value=([0.6, 0.8], "stub-batch")
+        ):
+            compute_query_embedding("cached query", model_name="stub-batch")
+        with mock.patch(
+            "markdownkeeper.query.embeddings.compute_embeddings",
+            return_value=([[1.0, 0.0], [0.0, 1.0]], "stub-batch"),
+        ) as encoder:
+            vectors, model = compute_query_embeddings(
+                ["alpha", "cached  query", "beta", "alpha"], model_name="stub-batch"
+            )
+        encoder.assert_called_once_with(["alpha", "beta"], model_name="stub-batch")
+        self.assertEqual(model, "stub-batch")
+        self.assertEqual(vectors[0], [1.0, 0.0])
+        self.assertEqual(vectors[2], [0.0, 1.0])
+        self.assertEqual(vectors[3], vectors[0])
+        self.assertEqual(vectors[1], [0.6, 0.8])
+        clear_query_embedding_cache()
+
+    def test_query_embedding_cache_skips_hash_fallback_vectors(self) -> None:
+        clear_query_embedding_cache()
+        model = mock.Mock()
+        model.encode.side_effect = [RuntimeError("cuda busy"), [0.0, 1.0]]
+        with mock.patch.dict(_MODEL_CACHE, {"stub-flaky": model}):
+            fallback, fallback_model = compute_query_embedding("kubernetes rollout", model_name="stub-flaky")
+            vector, resolved = compute_query_embedding("kubernetes rollout", model_name="stub-flaky")
+        self.assertEqual(fallback_model, "token-hash-v1")
+        self.assertEqual(fallback, _hash_embedding("kubernetes rollout"))
+        self.assertEqual((vector, resolved), ([0.0, 1.0], "stub-flaky"))
+        self.assertEqual(query_embedding_cache_stats()["entries"], 1)
+        clear_query_embedding_cache()
+
+    def test_compute_query_embeddings_never_mixes_models(self) -> None:
+        clear_query_embedding_cache()
+        with mock.patch(
+            "markdownkeeper.query.embeddings.compute_embedding", return_value=([0.6, 0.8], "stub-batch")
+        ):
+            compute_query_embedding("cached query", model_name="stub-batch")
+        vectors, model = compute_query_embeddings(["cached query", "fresh query"], model_name="stub-batch")
+        self.assertEqual(model, "token-hash-v1")
+        self.assertEqual(vectors, [_hash_embedding("cached query"), _hash_embedding("fresh query")])
+        self.assertEqual(query_embedding_cache_stats()["entries"], 1)
+        clear_query_embedding_cache()
+
+    def test_compute_embeddings_matches_single_encodes(self) -> None:
+        vectors, model = compute_embeddings(["kubernetes rollout", ""])
+        self.assertEqual(model, "token-hash-v1")
+        self.assertEqual(vectors, [compute_embedding("kubernetes rollout")[0], compute_embedding("")[0]])
+        self.assertEqual(compute_embeddings([]), ([], "all-MiniLM-L6-v2"))
+
+    def test_compute_embeddings_passes_batch_size_to_one_encode(self) -> None:
+        model = mock.Mock()
+        model.encode.return_value = [[3.0, 4.0], [0.0, 2.0], [1.0, 0.0]]
+        with mock.patch.dict(_MODEL_CACHE, {"stub-batch": model}):
+            vectors, resolved = compute_embeddings(["a", "", "c"], model_name="stub-batch", batch_size=2)
+        self.assertEqual(resolved, "stub-batch")
+        self.assertEqual(vectors, [[0.6, 0.8], [0.0, 1.0], [1.0, 0.0]])
+        model.encode.assert_called_once_with(["a", "", "c"], batch_size=2, normalize_embeddings=True)
+
+    def test_compute_embeddings_falls_back_for_the_whole_batch(self) -> None:
+        model = mock.Mock()
+        model.encode.side_effect = RuntimeError("out of memory")
+        with mock.patch.dict(_MODEL_CACHE, {"stub-batch": model}):
+            vectors, resolved = compute_embeddings(["kubernetes", "postgres"], model_name="stub-batch")
+        self.assertEqual(resolved, "token-hash-v1")
+        self.assertEqual(vectors, [_hash_embedding("kubernetes"), _hash_embedding("postgres")])
+
+    def test_hash_embeddings_match_single_hashes(self) -> None:
+        texts = ["kubernetes cluster rollout", "cluster backup", "", "kubernetes"]
+        self.assertEqual(_hash_embeddings(texts), [_hash_embedding(text) for text in texts])
+        self.assertEqual(_hash_embeddings(texts, dimensions=16), [_hash_embedding(text, 16) for text in texts])
+
+    def test_benchmark_embedding_throughput_reports_texts_per_second(self) -> None:
+        report = benchmark_embedding_throughput(["kubernetes cluster", "postgres backup"] * 5, [4, 0])
+        self.assertEqual([row["batch_size"] for row in report], [0, 4, 1])
+        for row in report:
+            self.assertEqual(row["texts"], 10)
+            self.assertEqual(row["model"], "token-hash-v1")
+            self.assertGreater(row["texts_per_second"], 0.0)
+        self.assertEqual(report[0]["speedup"], 1.0)
+        self.assertEqual(benchmark_embedding_throughput([], [8]), [])
+
+    def test_embedding_lru_evicts_least_recently_used(self) -> None:
+        cache = _EmbeddingLRU(2)
+        cache.put(("m", "a"), ((1.0,), "m"))
+        cache.put(("m", "b"), ((2.0,), "m"))
+        self.assertIsNotNone(cache.get(("m", "a")))
+        cache.put(("m", "c"), ((3.0,), "m"))
+        self.assertIsNone(cache.get(("m", "b")))
+        self.assertIsNotNone(cache.get(("m", "a")))
+        self.assertEqual(cache.stats()["entries"], 2)
+
 
 if __name__ == "__main__":
     unittest.main()
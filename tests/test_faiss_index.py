@@ -1,16 +1,38 @@
 from __future__ import annotations
 
 from pathlib import Path
+import os
+import stat
 import sys
 import tempfile
 import unittest
+from unittest import mock
 
 ROOT = Path(__file__).resolve().parents[1]
 SRC = ROOT / "src"
 if str(SRC) not in sys.path:
     sys.path.insert(0, str(SRC))
 
-from markdownkeeper.query.faiss_index import FaissIndex, is_faiss_available
+from markdownkeeper.config import IndexConfig
+from markdownkeeper.query.faiss_index import (
+    FALLBACK_SUFFIX,
+    META_SUFFIX,
+    FaissIndex,
+    _BruteForceVectors,
+    benchmark_fallback_search,
+    benchmark_index_types,
+    is_faiss_available,
+)
+
+
+def _clustered(count: int, dimensions: int = 16) -> list[tuple[int, list[float]]]:
+    import random
+
+    rng = random.Random(7)
+    centres = [[rng.gauss(0.0, 1.0) for _ in range(dimensions)] for _ in range(8)]
+    return [
+        (doc_id, [value + rng.gauss(0.0, 0.2) for value in centres[doc_id % 8]]) for doc_id in range(count)
+    ]
 
 
 class FaissIndexTests(unittest.TestCase):
@@ -46,6 +68,231 @@ class FaissIndexTests(unittest.TestCase):
             results = loaded.search([1.0, 0.0], k=1)
             self.assertEqual(results[0][0], 1)
 
+    @unittest.skipUnless(is_faiss_available(), "faiss-cpu not installed")
+    def test_faiss_save_is_atomic_and_rejects_mismatched_metadata(self) -> None:
+        embeddings = _clustered(40)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "test.index"
+            index = FaissIndex()
+            index.build(embeddings[:30])
+            index.save(path)
+            old_meta = path.with_suffix(META_SUFFIX).read_bytes()
+
+            index.add([doc_id for doc_id, _ in embeddings[30:]], [vec for _, vec in embeddings[30:]])
+            with mock.patch("markdownkeeper.query.faiss_index.os.replace", side_effect=OSError("disk full")):
+                with self.assertRaises(OSError):
+                    index.save(path)
+            self.assertEqual(sorted(item.name for item in Path(tmp).iterdir()), ["test.index", "test.meta.json"])
+            loaded = FaissIndex()
+            self.assertTrue(loaded.load(path))
+            self.assertEqual(len(loaded), 30)
+
+            # A reader that sees the new index next to the old labels rejects the pair.
+            index.save(path)
+            path.with_suffix(META_SUFFIX).write_bytes(old_meta)
+            with self.assertRaises(ValueError):
+                FaissIndex().load(path)
+
+    def test_save_and_load_preserves_generation(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "test.index"
+            index = FaissIndex()
+            index.build([(1, [1.0, 0.0])])
+            index.generation = 7
+            index.save(path)
+
+            loaded = FaissIndex()
+            self.assertTrue(loaded.load(path))
+            self.assertEqual(loaded.generation, 7)
+            self.assertEqual(len(loaded), 1)
+            self.assertEqual(loaded.dimensions, 2)
+            self.assertFalse(FaissIndex().load(Path(tmp) / "missing.index"))
+
+    @unittest.skipUnless(is_faiss_available(), "faiss-cpu not installed")
+    def test_approximate_index_types_find_nearest_and_persist_parameters(self) -> None:
+        embeddings = _clustered(400)
+        configs = [IndexConfig(type="ivf", nlist=4, nprobe=4), IndexConfig(type="hnsw", hnsw_m=8, ef_search=32)]
+        with tempfile.TemporaryDirectory() as tmp:
+            for config in configs:
+                path = Path(tmp) / f"{config.type}.index"
+                index = FaissIndex(config)
+                index.build(embeddings)
+                self.assertEqual(index.index_type, config.type)
+                self.assertEqual(index.search(embeddings[5][1], k=1)[0][0], 5)
+                index.save(path)
+
+                loaded = FaissIndex()
+                self.assertTrue(loaded.load(path))
+                self.assertEqual(loaded.index_type, config.type)
+                self.assertEqual(loaded.parameters, index.parameters)
+                self.assertEqual(loaded.search(embeddings[9][1], k=1)[0][0], 9)
+
+    @unittest.skipUnless(is_faiss_available(), "faiss-cpu not installed")
+    def test_ivf_on_small_corpus_builds_flat_index(self) -> None:
+        index = FaissIndex(IndexConfig(type="ivf"))
+        index.build(_clustered(40))
+        self.assertEqual(index.index_type, "flat")
+        self.assertEqual(index.parameters, {})
+
+    def test_unknown_index_type_is_rejected(self) -> None:
+        with self.assertRaises(ValueError):
+            FaissIndex(IndexConfig(type="lsh"))
+
+    def test_benchmark_reports_recall_against_flat(self) -> None:
+        report = benchmark_index_types([500], IndexConfig(nlist=4, nprobe=2, hnsw_m=8), dimensions=16, queries=5, k=5)
+        if not is_faiss_available():
+            self.assertEqual(report, [])
+            return
+        self.assertEqual([row["index_type"] for row in report], ["flat", "ivf", "hnsw"])
+        self.assertEqual(report[0]["recall_at_k"], 1.0)
+        for row in report:
+            self.assertGreater(float(row["recall_at_k"]), 0.0)
+            self.assertIn("p95", row["latency_ms"])
+
+    def test_add_remove_and_update_in_place(self) -> None:
+        configs = [IndexConfig()]
+        if is_faiss_available():
+            configs += [IndexConfig(type="ivf", nlist=4, nprobe=4), IndexConfig(type="hnsw", hnsw_m=8)]
+        embeddings = _clustered(400)
+        for config in configs:
+            index = FaissIndex(config)
+            index.build(embeddings[:300])
+            self.assertTrue(index.add([300, 301], [embeddings[300][1], embeddings[301][1]]))
+            self.assertEqual(index.search(embeddings[301][1], k=1)[0][0], 301)
+
+            self.assertTrue(index.remove([5, 999]))
+            self.assertNotIn(5, index)
+            self.assertNotIn(5, [doc_id for doc_id, _ in index.search(embeddings[5][1], k=10)])
+
+            self.assertTrue(index.update([7], [embeddings[301][1]]))
+            self.assertEqual(len(index), 301)
+            top = {doc_id for doc_id, _ in index.search(embeddings[301][1], k=2)}
+            self.assertEqual(top, {7, 301}, config.type)
+            with self.assertRaises(ValueError):
+                index.add([400], [[1.0, 0.0]])
+
+    def test_updates_persist_and_fallback_reuses_slots(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "test.index"
+            index = FaissIndex()
+            self.assertTrue(index.add([1, 2], [[1.0, 0.0], [0.0, 1.0]]))
+            index.remove([1])
+            index.add([3], [[0.8, 0.2]])
+            if not is_faiss_available():
+                self.assertEqual(index._fallback.slot_count, 2)
+            index.save(path)
+
+            loaded = FaissIndex()
+            self.assertTrue(loaded.load(path))
+            self.assertEqual(len(loaded), 2)
+            self.assertEqual(loaded.search([1.0, 0.0], k=1)[0][0], 3)
+            self.assertTrue(loaded.add([4], [[1.0, 0.0]]))
+            self.assertEqual(loaded.search([1.0, 0.0], k=1)[0][0], 4)
+            loaded.remove([2, 3, 4])
+            self.assertEqual(loaded.search([1.0, 0.0], k=1), [])
+
+    @unittest.skipUnless(is_faiss_available(), "faiss-cpu not installed")
+    def test_add_to_loaded_fallback_keeps_its_documents(self) -> None:
+        embeddings = _clustered(120)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "test.index"
+            with mock.patch("markdownkeeper.query.faiss_index.faiss", None):
+                fallback = FaissIndex()
+                fallback.build(embeddings[:100])
+                fallback.save(path)
+
+            for index_type in ("flat", "hnsw"):
+                index = FaissIndex(IndexConfig(type=index_type))
+                self.assertTrue(index.load(path))
+                self.assertTrue(index.add([doc_id for doc_id, _ in embeddings[100:]], [vec for _, vec in embeddings[100:]]))
+                self.assertTrue(index.update([5], [embeddings[5][1]]))
+                self.assertEqual(len(index), 120)
+                self.assertEqual(index.index_type, index_type)
+                for doc_id, vector in (embeddings[3], embeddings[5], embeddings[110]):
+                    self.assertEqual(index.search(vector, k=1)[0][0], doc_id)
+                index.save(path.with_name(f"{index_type}.index"))
+                reloaded = FaissIndex()
+                self.assertTrue(reloaded.load(path.with_name(f"{index_type}.index")))
+                self.assertEqual(reloaded.search(embeddings[3][1], k=1)[0][0], 3)
+
+    def test_fallback_scores_normalized_rows_across_blocks(self) -> None:
+        embeddings = _clustered(300)
+        store = _BruteForceVectors(16)
+        for doc_id, vector in embeddings:
+            store.add(doc_id, [value * 3.0 for value in vector])
+        store.remove(12)
+        with mock.patch("markdownkeeper.query.faiss_index._SEARCH_BLOCK_ROWS", 32):
+            hits = store.search(embeddings[12][1], k=5)
+        self.assertEqual(len(hits), 5)
+        self.assertNotIn(12, [doc_id for doc_id, _ in hits])
+        self.assertEqual([score for _, score in hits], sorted((score for _, score in hits), reverse=True))
+        self.assertLessEqual(hits[0][1], 1.0 + 1e-5)
+        self.assertEqual(store.search(embeddings[20][1], k=1)[0][0], 20)
+        self.assertEqual(store.add(999, embeddings[1][1]), 12)
+
+    def test_fallback_benchmark_agrees_with_baseline(self) -> None:
+        report = benchmark_fallback_search([200], dimensions=8, queries=3, k=5)
+        self.assertEqual(len(report), 1)
+        self.assertEqual(report[0]["documents"], 200)
+        self.assertEqual(report[0]["agreement"], 1.0)
+        self.assertIn("p95", report[0]["baseline_latency_ms"])
+
+    def test_fallback_saves_binary_file_atomically(self) -> None:
+        embeddings = _clustered(50)
+        with tempfile.TemporaryDirectory() as tmp, mock.patch("markdownkeeper.query.faiss_index.faiss", None):
+            path = Path(tmp) / "test.index"
+            path.with_suffix(".json").write_text("{}", encoding="utf-8")
+            index = FaissIndex()
+            index.build(embeddings)
+            index.remove([3])
+            index.generation = 11
+            index.model_name = "all-MiniLM-L6-v2"
+            index.save(path)
+            self.assertTrue(path.with_suffix(FALLBACK_SUFFIX).exists())
+            self.assertFalse(path.with_suffix(".json").exists())
+            # Created like a plain open(), not owner-only like mkstemp.
+            umask = os.umask(0)
+            os.umask(umask)
+            self.assertEqual(stat.S_IMODE(path.with_suffix(FALLBACK_SUFFIX).stat().st_mode), 0o666 & ~umask)
+
+            loaded = FaissIndex()
+            self.assertTrue(loaded.load(path))
+            self.assertEqual((len(loaded), loaded.dimensions, loaded.generation), (49, 16, 11))
+            self.assertEqual(loaded.model_name, "all-MiniLM-L6-v2")
+            self.assertNotIn(3, loaded)
+            self.assertEqual(loaded.search(embeddings[8][1], k=3), index.search(embeddings[8][1], k=3))
+
+            with mock.patch("markdownkeeper.query.faiss_index.os.replace", side_effect=OSError("disk full")):
+                with self.assertRaises(OSError):
+                    FaissIndex().save(path)
+            self.assertEqual(sorted(item.name for item in Path(tmp).iterdir()), ["test.fallback"])
+            self.assertTrue(FaissIndex().load(path))
+
+    def test_fallback_rejects_corrupt_file_and_reads_legacy_json(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp, mock.patch("markdownkeeper.query.faiss_index.faiss", None):
+            path = Path(tmp) / "test.index"
+            index = FaissIndex()
+            index.build([(1, [1.0, 0.0]), (2, [0.0, 1.0])])
+            index.save(path)
+            binary = path.with_suffix(FALLBACK_SUFFIX)
+            data = bytearray(binary.read_bytes())
+            data[-1] ^= 0xFF
+            binary.write_bytes(bytes(data))
+            with self.assertRaises(ValueError):
+                FaissIndex().load(path)
+            binary.write_bytes(bytes(data[:20]))
+            with self.assertRaises(ValueError):
+                FaissIndex().load(path)
+
+            binary.unlink()
+            path.with_suffix(".json").write_text(
+                '{"dimensions": 2, "generation": 4, "embeddings": [[7, [0.0, 2.0]]]}', encoding="utf-8"
+            )
+            legacy = FaissIndex()
+            self.assertTrue(legacy.load(path))
+            self.assertEqual(legacy.search([0.0, 1.0], k=1)[0][0], 7)
+            self.assertEqual(legacy.generation, 4)
+
     def test_is_faiss_available_returns_bool(self) -> None:
         self.assertIsInstance(is_faiss_available(), bool)
 
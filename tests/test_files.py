@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+from pathlib import Path
+import sys
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+import os
+import stat
+import tempfile
+import unittest
+
+from markdownkeeper.storage.files import atomic_file
+
+
+@unittest.skipIf(os.name != "posix", "file modes are POSIX-only")
+class AtomicFileTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self._umask = os.umask(0o022)
+
+    def tearDown(self) -> None:
+        os.umask(self._umask)
+
+    def test_replaces_file_with_umask_mode(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "nested" / "data.bin"
+            with atomic_file(path) as handle:
+                handle.write(b"first")
+            with atomic_file(path) as handle:
+                handle.write(b"second")
+            self.assertEqual(path.read_bytes(), b"second")
+            self.assertEqual(stat.S_IMODE(path.stat().st_mode), 0o644)
+            self.assertEqual([item.name for item in path.parent.iterdir()], ["data.bin"])
+
+    def test_failed_write_leaves_original_untouched(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "data.bin"
+            path.write_bytes(b"original")
+            with self.assertRaises(RuntimeError):
+                with atomic_file(path) as handle:
+                    handle.write(b"partial")
+                    raise RuntimeError("interrupted")
+            self.assertEqual(path.read_bytes(), b"original")
+            self.assertEqual([item.name for item in Path(tmp).iterdir()], ["data.bin"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+from pathlib import Path
+import sys
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+import random
+import unittest
+
+from markdownkeeper.query.parallel import SharedVectorSnapshot, parallel_partial_scores, score_shard
+from markdownkeeper.query.vector_store import VectorMatrix
+
+
+def _matrices(documents: int, dims: int = 8) -> tuple[VectorMatrix, VectorMatrix]:
+    rng = random.Random(7)
+    document_matrix = VectorMatrix()
+    chunk_matrix = VectorMatrix()
+    chunk_id = 1000
+    for document_id in range(1, documents + 1):
+        if document_id % 5:
+            document_matrix.set(document_id, [rng.uniform(-1, 1) for _ in range(dims)])
+        for _ in range(document_id % 3):
+            chunk_matrix.set(chunk_id, [rng.uniform(-1, 1) for _ in range(dims)], owner=document_id)
+            chunk_id += 1
+    return document_matrix, chunk_matrix
+
+
+def _expected(documents: VectorMatrix, chunks: VectorMatrix, query: list[float]) -> dict[int, float]:
+    vector_scores = documents.score_by_key(query)
+    chunk_maxima = chunks.max_score_by_owner(query)
+    return {
+        document_id: 0.45 * vector_scores.get(document_id, 0.0) + 0.30 * chunk_maxima.get(document_id, 0.0)
+        for document_id in vector_scores.keys() | chunk_maxima.keys()
+    }
+
+
+class ParallelScoringTests(unittest.TestCase):
+    def test_shards_cover_every_document_once(self) -> None:
+        documents, chunks = _matrices(40)
+        query = [0.5] * 8
+        snapshot = SharedVectorSnapshot(documents, chunks, shards=3)
+        try:
+            merged: dict[int, float] = {}
+            for shard in range(3):
+                # A bound larger than any score disables shard pruning.
+                part = score_shard(snapshot.descriptor, query, shard, 1, (0.45, 0.30), 10.0)
+                self.assertFalse(merged.keys() & {document_id for document_id, _ in part})
+                merged.update(part)
+        finally:
+            snapshot.close()
+
+        expected = _expected(documents, chunks, query)
+        self.assertEqual(merged.keys(), expected.keys())
+        for document_id, score in expected.items():
+            self.assertAlmostEqual(merged[document_id], score, places=5)
+
+    def test_shard_pruning_keeps_everything_that_can_place(self) -> None:
+        documents, chunks = _matrices(60)
+        query = [1.0] + [0.0] * 7
+        snapshot = SharedVectorSnapshot(documents, chunks, shards=2)
+        try:
+            kept: dict[int, float] = {}
+            for shard in range(2):
+                kept.update(score_shard(snapshot.descriptor, query, shard, 3, (0.45, 0.30), 0.05))
+        finally:
+            snapshot.close()
+
+        expected = _expected(documents, chunks, query)
+        cutoff = sorted(expected.values(), reverse=True)[2] - 0.05
+        self.assertLess(len(kept), len(expected))
+        self.assertTrue({document_id for document_id, score in expected.items() if score >= cutoff} <= kept.keys())
+
+    def test_excluded_documents_are_skipped_and_do_not_raise_the_cutoff(self) -> None:
+        documents, chunks = _matrices(60)
+        query = [1.0] + [0.0] * 7
+        expected = _expected(documents, chunks, query)
+        leaders = sorted(expected, key=expected.__getitem__, reverse=True)[:3]
+        snapshot = SharedVectorSnapshot(documents, chunks, shards=1)
+        try:
+            kept = dict(score_shard(snapshot.descriptor, query, 0, 3, (0.45, 0.30), 0.05, leaders))
+        finally:
+            snapshot.close()
+
+        self.assertFalse(kept.keys() & set(leaders))
+        remaining = {document_id: score for document_id, score in expected.items() if document_id not in leaders}
+        cutoff = sorted(remaining.values(), reverse=True)[2] - 0.05
+        self.assertTrue({document_id for document_id, score in remaining.items() if score >= cutoff} <= kept.keys())
+
+    def test_process_pool_matches_in_process_scores(self) -> None:
+        documents, chunks = _matrices(30)
+        query = [0.25, -0.5, 1.0, 0.0, 0.3, 0.1, -0.2, 0.7]
+        snapshot = SharedVectorSnapshot(documents, chunks, shards=2)
+        try:
+            merged = parallel_partial_scores(snapshot, query, 30, (0.45, 0.30), 10.0)
+        finally:
+            snapshot.close()
+
+        expected = _expected(documents, chunks, query)
+        self.assertEqual(merged.keys(), expected.keys())
+        for document_id, score in expected.items():
+            self.assertAlmostEqual(merged[document_id], score, places=5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+from pathlib import Path
+import sys
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+import random
+import unittest
+
+from markdownkeeper.query.ranking import TopK, kth_largest
+
+
+class TopKTests(unittest.TestCase):
+    def test_matches_full_sort_including_ties(self) -> None:
+        rng = random.Random(7)
+        items = [(round(rng.random(), 2), f"2026-01-{rng.randint(1, 3):02d}", index) for index in range(200)]
+
+        top: TopK[int] = TopK(10)
+        for score, tiebreak, index in items:
+            top.push(score, tiebreak, index)
+
+        expected = sorted(items, key=lambda item: (item[0], item[1]), reverse=True)[:10]
+        self.assertEqual(top.results(), [(score, index) for score, _, index in expected])
+
+    def test_threshold_and_could_enter(self) -> None:
+        top: TopK[str] = TopK(2)
+        self.assertIsNone(top.threshold())
+        self.assertTrue(top.could_enter(0.0))
+        top.push(0.9, "", "a")
+        top.push(0.5, "", "b")
+        self.assertEqual(top.threshold(), 0.5)
+        self.assertFalse(top.could_enter(0.4))
+        self.assertTrue(top.could_enter(0.5))
+        self.assertFalse(top.push(0.1, "", "c"))
+        self.assertTrue(top.push(0.7, "", "d"))
+        self.assertEqual([item for _, item in top.results()], ["a", "d"])
+
+    def test_kth_largest(self) -> None:
+        self.assertEqual(kth_largest([0.1, 0.9, 0.5], 2), 0.5)
+        self.assertIsNone(kth_largest([0.1], 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -8,15 +8,31 @@ SRC = ROOT / "src"
 if str(SRC) not in sys.path:
     sys.path.insert(0, str(SRC))
 
+from datetime import datetime, timezone
 import json
+import os
 import sqlite3
 import tempfile
+import time
 import unittest
+from unittest import mock
 
+from markdownkeeper.config import CacheConfig, IndexConfig, SearchConfig
 from markdownkeeper.processor.parser import parse_markdown
 from markdownkeeper.storage.repository import (
+    _CACHE_HITS,
     _chunk_document,
+    _candidate_index_stamp,
+    _lexical_scores,
+    _RESIDENT_VECTORS,
+    _load_resident_rows,
+    _resident_vectors,
+    _score_documents,
+    _semantic_candidates,
+    _staged_scores,
     _deserialize_embedding,
+    _filtered_document_ids,
+    SearchFilters,
     delete_document_by_path,
     find_documents_by_concept,
     get_document,
@@ -24,14 +40,27 @@ from markdownkeeper.storage.repository import (
     search_documents,
     _compute_text_embedding,
     embedding_coverage,
+    benchmark_chunk_embeddings,
     benchmark_semantic_queries,
+    check_candidate_index,
+    clear_result_cache,
     evaluate_semantic_precision,
+    flush_cache_hits,
+    rebuild_search_index,
     regenerate_embeddings,
+    result_cache_stats,
     semantic_search_documents,
+    semantic_search_many,
+    semantic_search_passages,
     system_stats,
     upsert_document,
     generate_health_report,
 )
+from markdownkeeper.query.embeddings import clear_query_embedding_cache, compute_embeddings
+from markdownkeeper.query.faiss_index import FaissIndex, is_faiss_available
+from markdownkeeper.query.parallel import SharedVectorSnapshot, parallel_partial_scores
+from markdownkeeper.query.trace import QueryTrace
+from markdownkeeper.storage.codec import DTYPE_INT8, decode_embedding, embedding_dtype
 from markdownkeeper.storage.schema import initialize_database
 
 
@@ -77,6 +106,47 @@ class RepositoryTests(unittest.TestCase):
             self.assertEqual(len(results), 1)
             self.assertEqual(results[0].title, "Deployment")
 
+    def test_search_documents_reports_substring_match_positions(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / ".markdownkeeper" / "index.db"
+            initialize_database(db_path)
+            upsert_document(
+                db_path,
+                Path(tmp) / "guide.md",
+                parse_markdown("# Operations Guide\nIntro\n\n## Kubernetes Rollback\nSteps"),
+            )
+
+            results = search_documents(db_path, "rollback", limit=5)
+            self.assertEqual(len(results), 1)
+            heading_matches = [match for match in results[0].matches if match["field"] == "headings"]
+            self.assertEqual(len(heading_matches), 1)
+            self.assertEqual(heading_matches[0]["text"], "Rollback")
+            headings = "Operations Guide\nKubernetes Rollback"
+            self.assertEqual(
+                headings[heading_matches[0]["start"] : heading_matches[0]["end"]], "Rollback"
+            )
+
+    def test_search_documents_fuzzy_match_and_short_query_fallback(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / ".markdownkeeper" / "index.db"
+            initialize_database(db_path)
+            # Fixed relative paths: the short-query fallback also matches paths, and a
+            # random temporary directory name could contain the query.
+            upsert_document(db_path, Path("docs/a.md"), parse_markdown("# Deployment\nguide"))
+            upsert_document(db_path, Path("docs/b.md"), parse_markdown("# Unrelated\nnotes"))
+
+            fuzzy = search_documents(db_path, "Deplyment", limit=5)
+            self.assertEqual([item.title for item in fuzzy], ["Deployment"])
+            title_spans = [(m["start"], m["end"]) for m in fuzzy[0].matches if m["field"] == "title"]
+            self.assertEqual(title_spans, [(0, 4), (5, 10)])
+
+            short = search_documents(db_path, "Un", limit=5)
+            self.assertEqual([item.title for item in short], ["Unrelated"])
+            self.assertIn({"field": "title", "start": 0, "end": 2, "text": "Un"}, short[0].matches)
+
+            delete_document_by_path(db_path, Path("docs/a.md"))
+            self.assertEqual(search_documents(db_path, "Deployment", limit=5), [])
+
     def test_get_document_returns_detail_and_none_when_missing(self) -> None:
         with tempfile.TemporaryDirectory() as tmp:
             db_path = Path(tmp) / ".markdownkeeper" / "index.db"
@@ -141,6 +211,7 @@ class RepositoryTests(unittest.TestCase):
             self.assertEqual(len(first), 1)
             self.assertEqual(len(second), 1)
 
+            self.assertEqual(flush_cache_hits(db_path), 1)
             with sqlite3.connect(db_path) as connection:
                 row = connection.execute(
                     "SELECT hit_count FROM query_cache WHERE query_text = ?",
@@ -168,6 +239,10 @@ class RepositoryTests(unittest.TestCase):
             assert row is not None
             self.assertEqual(str(row[1]), "token-hash-v1")
             self.assertTrue(len(str(row[0])) > 2)
+            self.assertIsInstance(row[0], bytes)
+            vector, model = decode_embedding(row[0])
+            self.assertEqual(len(vector), 64)
+            self.assertEqual(model, "token-hash-v1")
 
     def test_semantic_search_can_use_embedding_when_lexical_overlap_missing(self) -> None:
         with tempfile.TemporaryDirectory() as tmp:
@@ -220,6 +295,64 @@ class RepositoryTests(unittest.TestCase):
             self.assertEqual(coverage_after["missing"], 0)
 
 
+    def test_upsert_encodes_chunks_and_document_in_one_batch(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / ".markdownkeeper" / "index.db"
+            initialize_database(db_path)
+            body = "\n\n".join(f"Paragraph {index} about cluster rollout step {index}." for index in range(300))
+            with mock.patch(
+                "markdownkeeper.storage.repository.compute_embeddings", wraps=compute_embeddings
+            ) as batched:
+                doc_id = upsert_document(db_path, Path(tmp) / "big.md", parse_markdown(f"# Rollout\n\n{body}"))
+            self.assertEqual(batched.call_count, 1)
+            with sqlite3.connect(db_path) as connection:
+                chunks = connection.execute(
+                    "SELECT content, embedding FROM document_chunks WHERE document_id = ? ORDER BY chunk_index",
+                    (doc_id,),
+                ).fetchall()
+                stored = connection.execute("SELECT embedding FROM embeddings WHERE document_id = ?", (doc_id,)).fetchone()
+            self.assertGreater(len(chunks), 1)
+            self.assertEqual(len(batched.call_args.args[0]), len(chunks) + 1)
+            for content, blob in chunks:
+                expected = compute_embeddings([content])[0][0]
+                for stored_value, expected_value in zip(decode_embedding(blob)[0], expected):
+                    self.assertAlmostEqual(float(stored_value), expected_value, places=6)
+            self.assertIsNotNone(stored)
+
+    def test_regenerate_embeddings_encodes_in_batches(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / ".markdownkeeper" / "index.db"
+            initialize_database(db_path)
+            for name in ("a", "b", "c"):
+                upsert_document(db_path, Path(tmp) / f"{name}.md", parse_markdown(f"# Doc {name}\n\nbody {name}"))
+            with sqlite3.connect(db_path) as connection:
+                before = dict(connection.execute("SELECT document_id, embedding FROM embeddings").fetchall())
+                connection.execute("DELETE FROM embeddings")
+                connection.commit()
+
+            with mock.patch(
+                "markdownkeeper.storage.repository.compute_embeddings", wraps=compute_embeddings
+            ) as batched:
+                self.assertEqual(regenerate_embeddings(db_path, batch_size=2), 3)
+            self.assertEqual([len(call.args[0]) for call in batched.call_args_list], [2, 1])
+            with sqlite3.connect(db_path) as connection:
+                after = dict(connection.execute("SELECT document_id, embedding FROM embeddings").fetchall())
+            self.assertEqual(sorted(after), sorted(before))
+
+    def test_benchmark_chunk_embeddings_reports_chunks_per_second(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / ".markdownkeeper" / "index.db"
+            initialize_database(db_path)
+            self.assertEqual(benchmark_chunk_embeddings(db_path, [8]), [])
+            upsert_document(db_path, Path(tmp) / "k.md", parse_markdown("# Kubernetes\n\ncluster rollout\n\nnode drain"))
+            report = benchmark_chunk_embeddings(db_path, [8])
+            self.assertEqual([row["batch_size"] for row in report], [0, 8])
+            with sqlite3.connect(db_path) as connection:
+                chunk_count = int(connection.execute("SELECT COUNT(*) FROM document_chunks").fetchone()[0])
+            self.assertEqual([row["chunks"] for row in report], [chunk_count, chunk_count])
+            self.assertGreater(report[1]["chunks_per_second"], 0.0)
+            self.assertNotIn("texts", report[1])
+
     def test_evaluate_semantic_precision_returns_scores(self) -> None:
         with tempfile.TemporaryDirectory() as tmp:
             db_path = Path(tmp) / ".markdownkeeper" / "index.db"
@@ -236,6 +369,275 @@ class RepositoryTests(unittest.TestCase):
             self.assertEqual(report["cases"], 1)
             self.assertGreaterEqual(float(report["precision_at_k"]), 1.0)
 
+    def test_regenerate_embeddings_switches_vector_precision(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / ".markdownkeeper" / "index.db"
+            initialize_database(db_path)
+            doc_id = upsert_document(db_path, Path(tmp) / "k.md", parse_markdown("# Kubernetes Guide\n\ncluster rollout"))
+            upsert_document(db_path, Path(tmp) / "p.md", parse_markdown("# Postgres Backup\n\nnightly dumps"))
+            float_bytes = system_stats(db_path)["vectors"]
+
+            regenerate_embeddings(db_path, precision="int8")
+            later_id = upsert_document(db_path, Path(tmp) / "n.md", parse_markdown("# Nginx Proxy\n\nreverse proxy"))
+            with sqlite3.connect(db_path) as connection:
+                blobs = connection.execute("SELECT embedding FROM embeddings").fetchall()
+                blobs += connection.execute("SELECT embedding FROM document_chunks").fetchall()
+            self.assertTrue(all(embedding_dtype(row[0]) == DTYPE_INT8 for row in blobs))
+
+            results = semantic_search_documents(db_path, "kubernetes cluster", limit=1)
+            self.assertEqual(results[0].id, doc_id)
+            stats = system_stats(db_path)["vectors"]
+            self.assertEqual(stats["precision"], "int8")
+            self.assertGreater(stats["resident_bytes"], 0)
+            self.assertEqual(float_bytes["precision"], "float32")
+            self.assertIn(later_id, [item.id for item in semantic_search_documents(db_path, "nginx proxy", limit=3)])
+            with self.assertRaises(ValueError):
+                regenerate_embeddings(db_path, precision="int4")
+
+    def test_evaluate_semantic_precision_at_each_precision(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / ".markdownkeeper" / "index.db"
+            initialize_database(db_path)
+            doc_id = upsert_document(db_path, Path(tmp) / "q.md", parse_markdown("# Kubernetes Guide\ncluster rollout"))
+            upsert_document(db_path, Path(tmp) / "p.md", parse_markdown("# Postgres Backup\nnightly dumps"))
+            cases = [{"query": "kubernetes cluster", "expected_ids": [doc_id]}]
+
+            for precision in ("float32", "float16", "int8"):
+                report = evaluate_semantic_precision(db_path, cases, k=1, precision=precision)
+                self.assertEqual(report["precision"], precision)
+                self.assertEqual(report["precision_at_k"], 1.0)
+            self.assertEqual([key for key in _RESIDENT_VECTORS if "#" in key], [])
+            with self.assertRaises(ValueError):
+                evaluate_semantic_precision(db_path, cases, k=1, precision="int4")
+
+    def test_bounded_top_k_matches_exhaustive_scoring(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / ".markdownkeeper" / "index.db"
+            initialize_database(db_path)
+            for index in range(4):
+                upsert_document(
+                    db_path, Path(tmp) / f"hit{index}.md", parse_markdown(f"# Kubernetes Rollout\nkubernetes rollout {index}")
+                )
+            for index in range(20):
+                upsert_document(
+                    db_path, Path(tmp) / f"miss{index}.md", parse_markdown(f"# Topic {index}\nunrelated words number{index}")
+                )
+
+            tokens = {"kubernetes", "rollout"}
+            query = _compute_text_embedding("kubernetes rollout")
+            with sqlite3.connect(db_path) as connection:
+                exhaustive = _score_documents(connection, db_path, tokens, query, None)
+                exhaustive.sort(key=lambda item: (item[0], str(item[1][6])), reverse=True)
+                with mock.patch(
+                    "markdownkeeper.storage.repository._lexical_scores", wraps=_lexical_scores
+                ) as lexical:
+                    bounded = _score_documents(connection, db_path, tokens, query, None, limit=3)
+
+            self.assertEqual(
+                [(round(score, 9), row[0]) for score, row in bounded],
+                [(round(score, 9), row[0]) for score, row in exhaustive[:3]],
+            )
+            scope = lexical.call_args.args[2]
+            self.assertIsNotNone(scope)
+            self.assertLess(len(scope), 24)
+
+    def test_parallel_scoring_matches_in_process_scoring(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / ".markdownkeeper" / "index.db"
+            initialize_database(db_path)
+            for index in range(4):
+                upsert_document(
+                    db_path, Path(tmp) / f"hit{index}.md", parse_markdown(f"# Kubernetes Rollout\nkubernetes rollout {index}")
+                )
+            for index in range(12):
+                upsert_document(
+                    db_path, Path(tmp) / f"miss{index}.md", parse_markdown(f"# Topic {index}\nunrelated words number{index}")
+                )
+
+            tokens = {"kubernetes", "rollout"}
+            query = _compute_text_embedding("kubernetes rollout")
+            parallel = SearchConfig(workers=2, parallel_min_documents=1)
+            with sqlite3.connect(db_path) as connection:
+                in_process = _score_documents(connection, db_path, tokens, query, None, limit=3)
+                with mock.patch(
+                    "markdownkeeper.storage.repository.parallel_partial_scores", wraps=parallel_partial_scores
+                ) as pool:
+                    pooled = _score_documents(connection, db_path, tokens, query, None, limit=3, search_config=parallel)
+                    # Below the document threshold the pool is not used.
+                    _score_documents(
+                        connection, db_path, tokens, query, None, limit=3, search_config=SearchConfig(workers=2)
+                    )
+
+            self.assertEqual(pool.call_count, 1)
+            self.assertEqual(
+                [(round(score, 6), row[0]) for score, row in pooled],
+                [(round(score, 6), row[0]) for score, row in in_process],
+            )
+
+    def test_parallel_scoring_reuses_snapshot_across_writes(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / ".markdownkeeper" / "index.db"
+            initialize_database(db_path)
+            paths = []
+            for index in range(12):
+                paths.append(Path(tmp) / f"doc{index}.md")
+                upsert_document(db_path, paths[-1], parse_markdown(f"# Topic {index}\nunrelated words number{index}"))
+
+            tokens = {"kubernetes", "rollout"}
+            query = _compute_text_embedding("kubernetes rollout")
+            parallel = SearchConfig(workers=2, parallel_min_documents=1)
+            with sqlite3.connect(db_path) as connection:
+                _score_documents(connection, db_path, tokens, query, None, limit=3, search_config=parallel)
+
+            # A new best match and a deleted document are both newer than the snapshot.
+            hit = upsert_document(db_path, Path(tmp) / "hit.md", parse_markdown("# Kubernetes Rollout\nkubernetes rollout"))
+            delete_document_by_path(db_path, paths[0])
+            with sqlite3.connect(db_path) as connection:
+                with mock.patch(
+                    "markdownkeeper.storage.repository.SharedVectorSnapshot", wraps=SharedVectorSnapshot
+                ) as snapshots:
+                    pooled = _score_documents(connection, db_path, tokens, query, None, limit=3, search_config=parallel)
+                in_process = _score_documents(connection, db_path, tokens, query, None, limit=3)
+                resident = _resident_vectors(connection, db_path)
+
+            self.assertEqual(snapshots.call_count, 0)
+            self.assertEqual(len(resident.snapshot_stale or ()), 2)
+            self.assertEqual(pooled[0][1][0], hit)
+            self.assertEqual(
+                [(round(score, 6), row[0]) for score, row in pooled],
+                [(round(score, 6), row[0]) for score, row in in_process],
+            )
+
+            # Past the age limit a lagging snapshot is rebuilt.
+            resident.snapshot_built -= 3600.0
+            with sqlite3.connect(db_path) as connection:
+                _score_documents(connection, db_path, tokens, query, None, limit=3, search_config=parallel)
+            self.assertEqual(resident.snapshot_stale, set())
+
+    def test_semantic_search_many_matches_individual_queries(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / ".markdownkeeper" / "index.db"
+            initialize_database(db_path)
+            upsert_document(db_path, Path(tmp) / "k8s.md", parse_markdown("# Kubernetes\nkubernetes rollout plan"))
+            upsert_document(db_path, Path(tmp) / "pg.md", parse_markdown("# Postgres\npostgres vacuum tuning"))
+            upsert_document(db_path, Path(tmp) / "dns.md", parse_markdown("# DNS\ndns resolver cache"))
+            queries = ["kubernetes rollout", "postgres vacuum", "", "dns cache"]
+            uncached = CacheConfig(enabled=False)
+
+            expected = [[d.id for d in semantic_search_documents(db_path, q, limit=2, cache_config=uncached)] for q in queries]
+            with mock.patch(
+                "markdownkeeper.storage.repository.compute_query_embedding",
+                side_effect=AssertionError("queries must be encoded in one batch"),
+            ):
+                batched = semantic_search_many(db_path, queries, limit=2)
+            self.assertEqual([[d.id for d in docs] for docs in batched], expected)
+            self.assertEqual(batched[2], [])
+
+            # The batch stores its results, so single queries hit the cache afterwards.
+            clear_result_cache()
+            trace = QueryTrace()
+            semantic_search_documents(db_path, "postgres vacuum", limit=2, trace=trace)
+            self.assertEqual(trace.counts.get("cache_sqlite_hit"), 1)
+
+    def test_semantic_search_many_honours_staged_search_config(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / ".markdownkeeper" / "index.db"
+            initialize_database(db_path)
+            upsert_document(db_path, Path(tmp) / "k8s.md", parse_markdown("# Kubernetes\nkubernetes rollout plan"))
+            upsert_document(db_path, Path(tmp) / "pg.md", parse_markdown("# Postgres\npostgres vacuum tuning"))
+            upsert_document(db_path, Path(tmp) / "dns.md", parse_markdown("# DNS\ndns resolver cache rollout"))
+            staged = SearchConfig(pipeline="staged", first_stage="bm25", candidates=1, lexical_weight=1.0)
+            queries = ["kubernetes rollout", "dns cache rollout"]
+            uncached = CacheConfig(enabled=False)
+
+            expected = [
+                [d.id for d in semantic_search_documents(db_path, q, limit=3, cache_config=uncached, search_config=staged)]
+                for q in queries
+            ]
+            with mock.patch(
+                "markdownkeeper.storage.repository._staged_scores", wraps=_staged_scores
+            ) as staged_scores:
+                batched = semantic_search_many(db_path, queries, limit=3, search_config=staged)
+            self.assertEqual(staged_scores.call_count, 2)
+            self.assertEqual([[d.id for d in docs] for docs in batched], expected)
+
+            # Batch entries are keyed by the ranking: the default blend does not reuse them.
+            clear_result_cache()
+            trace = QueryTrace()
+            semantic_search_documents(db_path, "kubernetes rollout", limit=3, trace=trace)
+            self.assertIsNone(trace.counts.get("cache_sqlite_hit"))
+            trace = QueryTrace()
+            semantic_search_documents(db_path, "dns cache rollout", limit=3, search_config=staged, trace=trace)
+            self.assertEqual(trace.counts.get("cache_sqlite_hit"), 1)
+
+            with self.assertRaises(ValueError):
+                semantic_search_many(db_path, queries, search_config=SearchConfig(pipeline="stagd"))
+
+    def test_semantic_search_passages_returns_best_chunks(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / ".markdownkeeper" / "index.db"
+            initialize_database(db_path)
+            doc_id = upsert_document(
+                db_path,
+                Path(tmp) / "runbook.md",
+                parse_markdown("# Runbook\nintro text\n\n## Database Failover\npromote the replica database"),
+            )
+            upsert_document(db_path, Path(tmp) / "other.md", parse_markdown("# Other\nunrelated gardening notes"))
+
+            passages = semantic_search_passages(db_path, "promote replica database", limit=2)
+            self.assertEqual(len(passages), 2)
+            self.assertEqual(passages[0].document_id, doc_id)
+            self.assertIn("Database Failover", passages[0].heading_path)
+            self.assertIn("promote the replica", passages[0].content)
+            self.assertGreater(passages[0].token_count, 0)
+            self.assertGreaterEqual(passages[0].score, passages[1].score)
+            self.assertEqual(semantic_search_passages(db_path, "   "), [])
+
+    def test_semantic_search_passages_applies_filters_and_trace(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / ".markdownkeeper" / "index.db"
+            initialize_database(db_path)
+            upsert_document(
+                db_path,
+                Path(tmp) / "runbook.md",
+                parse_markdown("# Runbook\nintro text\n\n## Database Failover\npromote the replica database"),
+            )
+            tagged_id = upsert_document(
+                db_path,
+                Path(tmp) / "ops.md",
+                parse_markdown("---\ntags: ops\n---\n# Ops\n\n## Replica\nreplica database notes"),
+            )
+
+            trace = QueryTrace()
+            passages = semantic_search_passages(
+                db_path, "promote replica database", limit=5, filters=SearchFilters(tags=("ops",)), trace=trace
+            )
+            self.assertTrue(passages)
+            self.assertEqual({passage.document_id for passage in passages}, {tagged_id})
+            self.assertIn("filter", trace.stages)
+            self.assertIn("vector_scoring", trace.stages)
+            self.assertEqual(trace.counts["rows_fetched"], len(passages))
+
+            self.assertEqual(
+                semantic_search_passages(db_path, "promote replica database", filters=SearchFilters(tags=("missing",))),
+                [],
+            )
+
+    def test_semantic_search_statement_count_is_flat_in_corpus_size(self) -> None:
+        def statements_for_corpus(size: int) -> int:
+            with tempfile.TemporaryDirectory() as tmp:
+                db_path = Path(tmp) / ".markdownkeeper" / "index.db"
+                initialize_database(db_path)
+                for index in range(size):
+                    parsed = parse_markdown(
+                        f"---\nconcepts: rollout\n---\n# Rollout {index}\nrollout plan {index}\n\n## Step\nmore"
+                    )
+                    upsert_document(db_path, Path(tmp) / f"doc{index}.md", parsed)
+                report = benchmark_semantic_queries(db_path, [{"query": "rollout plan", "expected_ids": [1]}], k=3)
+                return int(report["sql_statements"]["max"])
+
+        self.assertEqual(statements_for_corpus(3), statements_for_corpus(30))
+
 
     def test_system_stats_contains_queue_and_embedding_sections(self) -> None:
         with tempfile.TemporaryDirectory() as tmp:
@@ -250,6 +652,27 @@ class RepositoryTests(unittest.TestCase):
             self.assertIn("queue", payload)
             self.assertIn("embeddings", payload)
             self.assertIn("cache", payload)
+            self.assertIn("hits", payload["query_embedding_cache"])
+
+    def test_system_stats_reports_query_embedding_counts_from_earlier_processes(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / ".markdownkeeper" / "index.db"
+            initialize_database(db_path)
+            upsert_document(db_path, Path(tmp) / "a.md", parse_markdown("# Encode\nencode once"))
+            clear_query_embedding_cache()
+            off = CacheConfig(enabled=False)
+            with mock.patch(
+                "markdownkeeper.query.embeddings.compute_embedding",
+                side_effect=lambda text, model_name: ([1.0, 0.0], model_name),
+            ):
+                semantic_search_documents(db_path, "encode once", cache_config=off)
+                semantic_search_documents(db_path, "encode once", cache_config=off)
+
+            # A fresh process has an empty LRU but reads the stored counts.
+            clear_query_embedding_cache()
+            counts = system_stats(db_path)["query_embedding_cache"]
+            self.assertEqual((counts["hits"], counts["misses"]), (1, 1))
+            self.assertEqual(counts["entries"], 0)
 
 
     def test_benchmark_semantic_queries_reports_latency_and_precision(self) -> None:
@@ -270,6 +693,33 @@ class RepositoryTests(unittest.TestCase):
             self.assertEqual(report["iterations"], 2)
             self.assertIn("latency_ms", report)
             self.assertGreaterEqual(float(report["precision_at_k"]), 1.0)
+            self.assertGreater(report["sql_statements"]["max"], 0)
+            # The first iteration is scored, the second is a cache hit.
+            self.assertEqual(set(report["stages_ms"]["total"]), {"avg", "p50", "p95", "max"})
+            self.assertIn("vector_scoring", report["stages_ms"])
+            self.assertIn("cache_lookup", report["stages_ms"])
+
+    def test_semantic_search_trace_records_stages_and_counts(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / ".markdownkeeper" / "index.db"
+            initialize_database(db_path)
+            for index in range(3):
+                upsert_document(db_path, Path(tmp) / f"{index}.md", parse_markdown(f"# Doc {index}\nrollout step {index}"))
+
+            trace = QueryTrace()
+            results = semantic_search_documents(db_path, "rollout", limit=2, trace=trace)
+            self.assertEqual(len(results), 2)
+            for name in ("encode", "vector_scoring", "row_fetch", "lexical", "rank", "cache_store", "total"):
+                self.assertIn(name, trace.stages)
+            self.assertGreaterEqual(trace.stages["total"], trace.stages["vector_scoring"])
+            self.assertEqual(trace.counts["vector_scored"], 3)
+            self.assertEqual(trace.counts["rows_fetched"], 3)
+
+            cached = QueryTrace()
+            semantic_search_documents(db_path, "rollout", limit=2, trace=cached)
+            self.assertEqual(cached.counts, {"cache_memory_hit": 1})
+            self.assertNotIn("vector_scoring", cached.stages)
+            self.assertEqual(set(cached.to_dict()), {"stages_ms", "counts"})
 
     def test_delete_document_by_path_removes_document(self) -> None:
         with tempfile.TemporaryDirectory() as tmp:
@@ -423,6 +873,315 @@ class RepositoryTests(unittest.TestCase):
                 self.assertEqual(conn.execute("SELECT COUNT(*) FROM document_concepts WHERE document_id=?", (doc_id,)).fetchone()[0], 0)
 
 
+class ResidentVectorTests(unittest.TestCase):
+    def test_resident_vectors_follow_upserts_and_deletes(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / "index.db"
+            initialize_database(db_path)
+            first = Path(tmp) / "first.md"
+            second = Path(tmp) / "second.md"
+            first_id = upsert_document(db_path, first, parse_markdown("# First\n\nalpha paragraph"))
+
+            with sqlite3.connect(db_path) as connection:
+                resident = _resident_vectors(connection, db_path)
+            self.assertEqual(resident.documents.keys(), [first_id])
+            generation = resident.generation
+
+            second_id = upsert_document(db_path, second, parse_markdown("# Second\n\nbeta paragraph"))
+            delete_document_by_path(db_path, first)
+
+            with sqlite3.connect(db_path) as connection:
+                refreshed = _resident_vectors(connection, db_path)
+            self.assertIs(refreshed, resident)
+            self.assertEqual(refreshed.generation, generation + 2)
+            self.assertEqual(refreshed.documents.keys(), [second_id])
+            self.assertEqual(set(refreshed.chunks.max_score_by_owner([0.0] * refreshed.chunks.dimensions)), {second_id})
+
+    def test_regenerate_embeddings_forces_full_reload(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / "index.db"
+            initialize_database(db_path)
+            doc_id = upsert_document(db_path, Path(tmp) / "a.md", parse_markdown("# A\n\nalpha"))
+            with sqlite3.connect(db_path) as connection:
+                resident = _resident_vectors(connection, db_path)
+                connection.execute("UPDATE embeddings SET embedding = '' WHERE document_id = ?", (doc_id,))
+                connection.commit()
+
+            regenerate_embeddings(db_path)
+            with sqlite3.connect(db_path) as connection:
+                refreshed = _resident_vectors(connection, db_path)
+            self.assertIs(refreshed, resident)
+            self.assertEqual(refreshed.documents.keys(), [doc_id])
+
+
+    def test_new_process_maps_vector_file_and_applies_later_changes(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / "index.db"
+            initialize_database(db_path)
+            first_id = upsert_document(db_path, Path(tmp) / "a.md", parse_markdown("# Kubernetes\n\ncluster rollout"))
+            regenerate_embeddings(db_path)
+            second_id = upsert_document(db_path, Path(tmp) / "b.md", parse_markdown("# Postgres\n\nnightly backup"))
+            self.assertTrue((Path(tmp) / "vectors.bin").exists())
+
+            _RESIDENT_VECTORS.pop(str(db_path.resolve()), None)
+            with mock.patch(
+                "markdownkeeper.storage.repository._load_resident_rows", wraps=_load_resident_rows
+            ) as load_rows:
+                with sqlite3.connect(db_path) as connection:
+                    resident = _resident_vectors(connection, db_path)
+            # Only the document upserted after the file was written is read from SQLite.
+            self.assertEqual([call.args[2] for call in load_rows.call_args_list], [[second_id]])
+            self.assertEqual(sorted(resident.documents.keys()), [first_id, second_id])
+            results = semantic_search_documents(db_path, "postgres backup", limit=1)
+            self.assertEqual(results[0].id, second_id)
+
+    def test_foreign_vector_file_is_ignored(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / "index.db"
+            initialize_database(db_path)
+            doc_id = upsert_document(db_path, Path(tmp) / "a.md", parse_markdown("# Kubernetes\n\ncluster rollout"))
+            with sqlite3.connect(db_path) as connection:
+                connection.execute("UPDATE settings SET value = ? WHERE key = 'vector_file_token'", ("00" * 16,))
+                connection.commit()
+                _RESIDENT_VECTORS.pop(str(db_path.resolve()), None)
+                with mock.patch(
+                    "markdownkeeper.storage.repository._load_resident_rows", wraps=_load_resident_rows
+                ) as load_rows:
+                    resident = _resident_vectors(connection, db_path)
+            self.assertEqual(len(load_rows.call_args_list[0].args), 2)
+            self.assertEqual(resident.documents.keys(), [doc_id])
+
+
+class CandidateIndexTests(unittest.TestCase):
+    def _build_corpus(self, tmp: str) -> Path:
+        db_path = Path(tmp) / "index.db"
+        initialize_database(db_path)
+        topics = ["kubernetes cluster", "postgres backup", "nginx proxy", "python testing", "dns records"]
+        for topic in topics:
+            fp = Path(tmp) / f"{topic.split()[0]}.md"
+            upsert_document(db_path, fp, parse_markdown(f"# {topic.title()}\n\nNotes about {topic}."))
+        regenerate_embeddings(db_path)
+        return db_path
+
+    def test_semantic_search_uses_saved_index_for_candidates(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = self._build_corpus(tmp)
+            with mock.patch("markdownkeeper.storage.repository._CANDIDATE_BUDGET", 2):
+                with sqlite3.connect(db_path) as connection:
+                    candidates = _semantic_candidates(connection, db_path, _compute_text_embedding("postgres backup"), 1)
+                results = semantic_search_documents(db_path, "postgres backup", limit=1)
+            self.assertIsNotNone(candidates)
+            assert candidates is not None
+            self.assertLessEqual(len(candidates), 10)
+            self.assertEqual(results[0].title, "Postgres Backup")
+
+    def test_candidate_index_reloads_when_only_metadata_changes(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = self._build_corpus(tmp)
+            index_path = Path(tmp) / "faiss.index"
+            meta_path = index_path.with_suffix(".meta.json")
+            meta_path.write_text("{}", encoding="utf-8")
+            stamp = _candidate_index_stamp(index_path)
+            os.utime(meta_path, ns=(1, 1))
+            self.assertNotEqual(_candidate_index_stamp(index_path), stamp)
+            self.assertIsNone(_candidate_index_stamp(Path(tmp) / "missing.index"))
+
+    def test_regenerate_builds_configured_index_type(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = self._build_corpus(tmp)
+            regenerate_embeddings(db_path, index_config=IndexConfig(type="hnsw", hnsw_m=8))
+            index = FaissIndex()
+            self.assertTrue(index.load(Path(tmp) / "faiss.index"))
+            self.assertEqual(index.index_type, "hnsw" if is_faiss_available() else "flat")
+            with mock.patch("markdownkeeper.storage.repository._CANDIDATE_BUDGET", 2):
+                results = semantic_search_documents(db_path, "postgres backup", limit=1)
+            self.assertEqual(results[0].title, "Postgres Backup")
+            with self.assertRaises(ValueError):
+                regenerate_embeddings(db_path, index_config=IndexConfig(type="annoy"))
+
+    def test_candidates_follow_upserts_and_deletes_after_index_build(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = self._build_corpus(tmp)
+            with mock.patch("markdownkeeper.storage.repository._CANDIDATE_BUDGET", 2):
+                before = semantic_search_documents(db_path, "nginx proxy", limit=1)
+                self.assertEqual(before[0].title, "Nginx Proxy")
+
+                delete_document_by_path(db_path, Path(tmp) / "nginx.md")
+                added = Path(tmp) / "haproxy.md"
+                upsert_document(db_path, added, parse_markdown("# Haproxy Proxy\n\nNotes about nginx proxy replacement."))
+
+                after = semantic_search_documents(db_path, "nginx proxy", limit=1)
+            self.assertEqual(after[0].title, "Haproxy Proxy")
+
+    def test_writes_update_the_saved_index_in_place(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = self._build_corpus(tmp)
+            added = Path(tmp) / "haproxy.md"
+            with mock.patch("markdownkeeper.storage.repository._INDEX_SAVE_CHANGES", 1):
+                new_id = upsert_document(db_path, added, parse_markdown("# Haproxy\n\nLoad balancer notes."))
+                delete_document_by_path(db_path, Path(tmp) / "nginx.md")
+            with sqlite3.connect(db_path) as connection:
+                generation = int(connection.execute("SELECT MAX(id) FROM document_changes").fetchone()[0])
+
+            index = FaissIndex()
+            self.assertTrue(index.load(Path(tmp) / "faiss.index"))
+            self.assertEqual(index.generation, generation)
+            self.assertEqual(len(index), 5)
+            self.assertIn(new_id, index)
+
+    def test_startup_check_reuses_updates_or_rebuilds_index(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = self._build_corpus(tmp)
+            self.assertEqual(check_candidate_index(db_path)["status"], "current")
+
+            upsert_document(db_path, Path(tmp) / "haproxy.md", parse_markdown("# Haproxy\n\nLoad balancer notes."))
+            # A new process starts from the saved index, one change behind.
+            with mock.patch.dict("markdownkeeper.storage.repository._CANDIDATE_INDEXES", clear=True), mock.patch.dict(
+                "markdownkeeper.storage.repository._UNSAVED_INDEX_CHANGES", clear=True
+            ):
+                status = check_candidate_index(db_path)
+                self.assertEqual((status["status"], status["changes"], status["documents"]), ("delta", 1, 6))
+                self.assertEqual(check_candidate_index(db_path)["status"], "current")
+
+            manifest_path = Path(tmp) / "faiss.manifest.json"
+            manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+            self.assertEqual(manifest["generation"], status["generation"])
+            self.assertEqual(manifest["documents"], 6)
+            manifest_path.write_text(json.dumps({**manifest, "documents": 99}), encoding="utf-8")
+            status = check_candidate_index(db_path)
+            self.assertEqual((status["status"], status["reason"]), ("rebuilt", "manifest file differs from the database"))
+
+            saved = max(Path(tmp).glob("faiss.*"), key=lambda path: path.stat().st_size)
+            saved.write_bytes(saved.read_bytes() + b"\0")
+            status = check_candidate_index(db_path, IndexConfig(type="flat"))
+            self.assertEqual((status["status"], status["reason"]), ("rebuilt", "index checksum mismatch"))
+            self.assertEqual(check_candidate_index(db_path)["status"], "current")
+
+    def test_startup_check_without_index_does_nothing(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / "index.db"
+            initialize_database(db_path)
+            upsert_document(db_path, Path(tmp) / "a.md", parse_markdown("# A\n\nalpha"))
+            self.assertEqual(check_candidate_index(db_path)["status"], "absent")
+            self.assertFalse((Path(tmp) / "faiss.manifest.json").exists())
+
+    def test_small_corpus_scores_every_document(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = self._build_corpus(tmp)
+            with sqlite3.connect(db_path) as connection:
+                self.assertIsNone(
+                    _semantic_candidates(connection, db_path, _compute_text_embedding("dns"), 5)
+                )
+
+
+class StagedPipelineTests(unittest.TestCase):
+    def _build_corpus(self, tmp: str) -> Path:
+        db_path = Path(tmp) / "index.db"
+        initialize_database(db_path)
+        topics = [
+            ("kubernetes", "Kubernetes Cluster", "kubernetes cluster upgrades and node pools"),
+            ("postgres", "Postgres Backup", "postgres backup with wal archiving"),
+            ("nginx", "Nginx Proxy", "nginx reverse proxy and tls termination"),
+            ("python", "Python Testing", "python unit testing with pytest fixtures"),
+            ("dns", "DNS Records", "dns records, zones and resolvers"),
+            ("backup", "Backup Policy", "retention policy for every backup job"),
+        ]
+        for name, title, body in topics:
+            upsert_document(db_path, Path(tmp) / f"{name}.md", parse_markdown(f"# {title}\n\n{body}."))
+        return db_path
+
+    def test_staged_pipeline_ranks_first_stage_candidates(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = self._build_corpus(tmp)
+            no_cache = CacheConfig(enabled=False)
+            for first_stage in ("ann", "bm25", "rrf"):
+                config = SearchConfig(pipeline="staged", first_stage=first_stage, candidates=2)
+                trace = QueryTrace()
+                results = semantic_search_documents(
+                    db_path, "postgres backup", limit=2, cache_config=no_cache, search_config=config, trace=trace
+                )
+                self.assertEqual(results[0].title, "Postgres Backup", first_stage)
+                self.assertIn("first_stage", trace.stages)
+                self.assertLessEqual(trace.counts["candidates"], 2)
+                self.assertLessEqual(trace.counts["rows_fetched"], 2)
+
+            filtered = semantic_search_documents(
+                db_path,
+                "backup",
+                limit=5,
+                cache_config=no_cache,
+                filters=SearchFilters(path_prefix=str(Path(tmp) / "backup")),
+                search_config=SearchConfig(pipeline="staged"),
+            )
+            self.assertEqual([item.title for item in filtered], ["Backup Policy"])
+
+    def test_staged_pipeline_over_whole_corpus_matches_blend(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = self._build_corpus(tmp)
+            no_cache = CacheConfig(enabled=False)
+            staged = SearchConfig(pipeline="staged", first_stage="ann", candidates=100)
+            for query in ("postgres backup", "reverse proxy tls", "testing"):
+                blend = semantic_search_documents(db_path, query, limit=4, cache_config=no_cache)
+                ranked = semantic_search_documents(db_path, query, limit=4, cache_config=no_cache, search_config=staged)
+                self.assertEqual([item.id for item in ranked], [item.id for item in blend], query)
+
+    def test_staged_results_are_cached_separately(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = self._build_corpus(tmp)
+            lexical_only = SearchConfig(
+                pipeline="staged", first_stage="bm25", vector_weight=0.0, chunk_weight=0.0, freshness_bonus=0.0
+            )
+            blend = semantic_search_documents(db_path, "backup", limit=3)
+            staged = semantic_search_documents(db_path, "backup", limit=3, search_config=lexical_only)
+            self.assertEqual(semantic_search_documents(db_path, "backup", limit=3, search_config=lexical_only), staged)
+            self.assertEqual(semantic_search_documents(db_path, "backup", limit=3), blend)
+            self.assertEqual({item.title for item in staged}, {"Postgres Backup", "Backup Policy"})
+            with self.assertRaises(ValueError):
+                semantic_search_documents(db_path, "backup", search_config=SearchConfig(pipeline="cascade"))
+            with self.assertRaises(ValueError):
+                semantic_search_documents(db_path, "backup", search_config=SearchConfig(pipeline="staged", first_stage="splade"))
+
+
+class LexicalIndexTests(unittest.TestCase):
+    def test_lexical_scores_use_bm25_and_track_updates(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / "index.db"
+            initialize_database(db_path)
+            strong = upsert_document(
+                db_path, Path(tmp) / "strong.md", parse_markdown("# Kubernetes Rollout\n\nkubernetes rollout steps")
+            )
+            weak = upsert_document(
+                db_path, Path(tmp) / "weak.md", parse_markdown("# Notes\n\nmentions rollout once among many other words")
+            )
+
+            with sqlite3.connect(db_path) as connection:
+                scores = _lexical_scores(connection, {"kubernetes", "rollout"})
+            self.assertEqual(scores[strong], 1.0)
+            self.assertGreater(scores[weak], 0.0)
+            self.assertLess(scores[weak], scores[strong])
+
+            delete_document_by_path(db_path, Path(tmp) / "strong.md")
+            with sqlite3.connect(db_path) as connection:
+                scores = _lexical_scores(connection, {"kubernetes", "rollout"})
+                restricted = _lexical_scores(connection, {"rollout"}, [strong])
+            self.assertEqual(set(scores), {weak})
+            self.assertEqual(restricted, {})
+
+    def test_rebuild_search_index_restores_missing_rows(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / "index.db"
+            initialize_database(db_path)
+            doc_id = upsert_document(db_path, Path(tmp) / "a.md", parse_markdown("# Alpha\n\nzebra crossing"))
+            with sqlite3.connect(db_path) as connection:
+                connection.execute("INSERT INTO documents_fts(documents_fts) VALUES('delete-all')")
+                connection.commit()
+                self.assertEqual(_lexical_scores(connection, {"zebra"}), {})
+
+            self.assertEqual(rebuild_search_index(db_path), 1)
+            with sqlite3.connect(db_path) as connection:
+                self.assertEqual(_lexical_scores(connection, {"zebra"}), {doc_id: 1.0})
+
+
 class QueryCacheTests(unittest.TestCase):
     def test_semantic_search_cache_hit_returns_same_results(self) -> None:
         with tempfile.TemporaryDirectory() as tmp:
@@ -444,20 +1203,283 @@ class QueryCacheTests(unittest.TestCase):
             md.write_text("# Alpha\nalpha content", encoding="utf-8")
             upsert_document(db_path, md, parse_markdown(md.read_text(encoding="utf-8")))
 
-            semantic_search_documents(db_path, "alpha")
+            self.assertEqual([d.title for d in semantic_search_documents(db_path, "alpha")], ["Alpha"])
 
-            # Verify cache has entries
+            # Writes no longer wipe the table; the entry is checked lazily on lookup.
+            md.write_text("# Beta\nbeta content", encoding="utf-8")
+            upsert_document(db_path, md, parse_markdown(md.read_text(encoding="utf-8")))
             with sqlite3.connect(db_path) as conn:
                 count = conn.execute("SELECT COUNT(*) FROM query_cache").fetchone()[0]
-            self.assertGreater(count, 0)
+            self.assertEqual(count, 1)
 
-            # Upsert should invalidate
-            md.write_text("# Beta\nbeta content", encoding="utf-8")
-            upsert_document(db_path, md, parse_markdown(md.read_text(encoding="utf-8")))
+            results = semantic_search_documents(db_path, "alpha")
+            self.assertNotIn("Alpha", [d.title for d in results])
+            with sqlite3.connect(db_path) as conn:
+                hits = conn.execute("SELECT hit_count FROM query_cache WHERE query_text = 'alpha'").fetchone()[0]
+            self.assertEqual(hits, 0)
 
+    def test_cache_survives_unrelated_upsert(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / "index.db"
+            initialize_database(db_path)
+            upsert_document(db_path, Path(tmp) / "a.md", parse_markdown("# Kubernetes\nkubernetes rollout"))
+            upsert_document(db_path, Path(tmp) / "b.md", parse_markdown("# Postgres\npostgres vacuum"))
+            first = semantic_search_documents(db_path, "kubernetes rollout", limit=1)
+
+            upsert_document(db_path, Path(tmp) / "c.md", parse_markdown("# Gardening\ntomato watering"))
+            second = semantic_search_documents(db_path, "kubernetes rollout", limit=1)
+            self.assertEqual([d.id for d in first], [d.id for d in second])
+            flush_cache_hits(db_path)
+            with sqlite3.connect(db_path) as conn:
+                hits, generation = conn.execute(
+                    "SELECT hit_count, generation FROM query_cache WHERE query_text = 'kubernetes rollout'"
+                ).fetchone()
+                current = conn.execute("SELECT MAX(id) FROM document_changes").fetchone()[0]
+            self.assertEqual(hits, 1)
+            self.assertEqual(generation, current)
+
+            # A new document that outranks the cached result evicts it.
+            upsert_document(
+                db_path, Path(tmp) / "d.md", parse_markdown("# Kubernetes Rollout\nkubernetes rollout kubernetes rollout")
+            )
+            third = semantic_search_documents(db_path, "kubernetes rollout", limit=1)
+            self.assertEqual(third[0].title, "Kubernetes Rollout")
+
+    def test_semantic_search_filters_are_applied_before_scoring(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / "index.db"
+            initialize_database(db_path)
+            docs = {
+                "runbooks/restart.md": "---\ncategory: runbooks\ntags: api, ops\nconcepts: restart\n---\n# Restart API\nrestart the api service",
+                "runbooks/rotate.md": "---\ncategory: runbooks\ntags: ops\nconcepts: rotation\n---\n# Rotate Keys\nrestart the api after rotation",
+                "guides/api.md": "---\ncategory: guides\ntags: api, ops\nconcepts: reference\n---\n# API Guide\nrestart the api service",
+            }
+            ids = {
+                name: upsert_document(db_path, Path(tmp) / name, parse_markdown(text)) for name, text in docs.items()
+            }
+
+            def search(**kwargs: object) -> list[int]:
+                return [d.id for d in semantic_search_documents(db_path, "restart api", filters=SearchFilters(**kwargs))]
+
+            self.assertEqual(len(search()), 3)
+            self.assertEqual(
+                sorted(search(category="runbooks")), sorted([ids["runbooks/restart.md"], ids["runbooks/rotate.md"]])
+            )
+            self.assertEqual(search(category="runbooks", tags=("API", "ops")), [ids["runbooks/restart.md"]])
+            self.assertEqual(search(concepts=("restart",)), [ids["runbooks/restart.md"]])
+            self.assertEqual(search(path_prefix=str(Path(tmp) / "guides")), [ids["guides/api.md"]])
+            self.assertEqual(search(updated_after="9999-01-01"), [])
+            self.assertEqual(search(category="missing"), [])
+
+            # Filters are part of the cache key, so a filtered query never reuses the
+            # unfiltered result for the same text.
+            with sqlite3.connect(db_path) as conn:
+                cached = conn.execute("SELECT COUNT(*) FROM query_cache WHERE query_text = 'restart api'").fetchone()[0]
+            self.assertGreaterEqual(cached, 5)
+
+            with mock.patch(
+                "markdownkeeper.storage.repository._score_documents", wraps=_score_documents
+            ) as score:
+                clear_result_cache()
+                semantic_search_documents(db_path, "restart api", filters=SearchFilters(tags=("api",)), cache_config=CacheConfig(enabled=False))
+            self.assertEqual(sorted(score.call_args.args[4]), sorted([ids["runbooks/restart.md"], ids["guides/api.md"]]))
+
+    def test_filtered_document_ids_uses_indexes(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / "index.db"
+            initialize_database(db_path)
+            upsert_document(db_path, Path(tmp) / "a.md", parse_markdown("---\ntags: ops\n---\n# A\nbody"))
+            filters = SearchFilters(category="ops", tags=("ops",), path_prefix=str(tmp), updated_after="2000-01-01")
+            with sqlite3.connect(db_path) as conn:
+                statements: list[str] = []
+                conn.set_trace_callback(statements.append)
+                _filtered_document_ids(conn, filters)
+                plan = " ".join(
+                    str(row[-1]) for row in conn.execute("EXPLAIN QUERY PLAN " + statements[-1].replace("?", "NULL"))
+                )
+            self.assertNotIn("SCAN d", plan)
+            self.assertIn("idx_document_tags_tag_id", plan)
+
+    def test_cache_hit_performs_no_writes(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / "index.db"
+            initialize_database(db_path)
+            upsert_document(db_path, Path(tmp) / "a.md", parse_markdown("# Reads\nread only hits"))
+            semantic_search_documents(db_path, "read only")
+
+            statements: list[str] = []
+            connect = sqlite3.connect
+
+            def traced_connect(*args: object, **kwargs: object) -> sqlite3.Connection:
+                connection = connect(*args, **kwargs)  # type: ignore[arg-type]
+                connection.set_trace_callback(statements.append)
+                return connection
+
+            with mock.patch("markdownkeeper.storage.repository.sqlite3.connect", traced_connect):
+                self.assertEqual(len(semantic_search_documents(db_path, "read only")), 1)
+            writes = [
+                sql for sql in statements
+                if sql.lstrip().split(None, 1)[0].upper() in {"INSERT", "UPDATE", "DELETE", "BEGIN", "COMMIT"}
+            ]
+            self.assertEqual(writes, [])
+
+            # The buffered hit is written by the next write on the database.
+            upsert_document(db_path, Path(tmp) / "b.md", parse_markdown("# Other\nother"))
+            with sqlite3.connect(db_path) as conn:
+                hits = conn.execute("SELECT hit_count FROM query_cache WHERE query_text = 'read only'").fetchone()[0]
+            self.assertEqual(hits, 1)
+
+    def test_due_cache_hits_are_flushed_without_a_write(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / "index.db"
+            initialize_database(db_path)
+            upsert_document(db_path, Path(tmp) / "a.md", parse_markdown("# Reads\nread only hits"))
+            semantic_search_documents(db_path, "read only")
+
+            def stored_hits() -> int:
+                with sqlite3.connect(db_path) as conn:
+                    return int(
+                        conn.execute("SELECT hit_count FROM query_cache WHERE query_text = 'read only'").fetchone()[0]
+                    )
+
+            # A batch that reaches the entry limit is flushed once the query returns.
+            with mock.patch("markdownkeeper.storage.repository._CACHE_HIT_FLUSH_ENTRIES", 1):
+                semantic_search_documents(db_path, "read only")
+            self.assertEqual(stored_hits(), 1)
+
+            # An idle process flushes a batch from its timer.
+            with mock.patch("markdownkeeper.storage.repository._CACHE_HIT_FLUSH_SECONDS", 0.05):
+                semantic_search_documents(db_path, "read only")
+                deadline = time.monotonic() + 5.0
+                while stored_hits() < 2 and time.monotonic() < deadline:
+                    time.sleep(0.02)
+            self.assertEqual(stored_hits(), 2)
+
+    def test_failed_cache_hit_flush_keeps_hits_buffered(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / "index.db"
+            initialize_database(db_path)
+            upsert_document(db_path, Path(tmp) / "a.md", parse_markdown("# Reads\nread only hits"))
+            semantic_search_documents(db_path, "read only")
+            semantic_search_documents(db_path, "read only")
+
+            with mock.patch.object(_CACHE_HITS, "write", side_effect=sqlite3.OperationalError("database is locked")):
+                with self.assertRaises(sqlite3.OperationalError):
+                    flush_cache_hits(db_path)
+            self.assertEqual(flush_cache_hits(db_path), 1)
+
+    def test_memory_tier_serves_repeat_queries_without_reading_documents(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / "index.db"
+            initialize_database(db_path)
+            upsert_document(db_path, Path(tmp) / "a.md", parse_markdown("# Memory\nmemory tier"))
+            clear_result_cache()
+            first = semantic_search_documents(db_path, "memory tier")
+
+            statements: list[str] = []
+            connect = sqlite3.connect
+
+            def traced_connect(*args: object, **kwargs: object) -> sqlite3.Connection:
+                connection = connect(*args, **kwargs)  # type: ignore[arg-type]
+                connection.set_trace_callback(statements.append)
+                return connection
+
+            with mock.patch("markdownkeeper.storage.repository.sqlite3.connect", traced_connect):
+                second = semantic_search_documents(db_path, "memory tier")
+            self.assertEqual([d.id for d in first], [d.id for d in second])
+            self.assertFalse(any("FROM documents" in sql for sql in statements))
+            stats = result_cache_stats()
+            self.assertEqual((stats["memory_hits"], stats["misses"]), (1, 1))
+
+            # Dropping the memory tier falls back to the SQLite row.
+            clear_result_cache()
+            semantic_search_documents(db_path, "memory tier")
+            self.assertEqual(result_cache_stats()["sqlite_hits"], 1)
+
+    def test_cache_counters_persist_across_processes(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / "index.db"
+            initialize_database(db_path)
+            upsert_document(db_path, Path(tmp) / "a.md", parse_markdown("# Shared\nshared counters"))
+            clear_result_cache()
+            semantic_search_documents(db_path, "shared counters")
+            semantic_search_documents(db_path, "shared counters")
+            clear_result_cache()
+            semantic_search_documents(db_path, "shared counters")
+
+            # A fresh process starts with zeroed counters but reads the stored ones.
+            clear_result_cache()
+            stats = system_stats(db_path)["cache"]
+            self.assertEqual(
+                (stats["memory_hits"], stats["sqlite_hits"], stats["misses"]), (1, 1, 1)
+            )
+            tiers = generate_health_report(db_path)["cache_tiers"]
+            self.assertEqual((tiers["memory_hits"], tiers["sqlite_hits"], tiers["misses"]), (1, 1, 1))
+            self.assertEqual(result_cache_stats()["sqlite_hits"], 0)
+
+    def test_promoted_cache_entry_keeps_sqlite_deadline(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / "index.db"
+            initialize_database(db_path)
+            upsert_document(db_path, Path(tmp) / "a.md", parse_markdown("# Deadline\ndeadline tier"))
+            semantic_search_documents(db_path, "deadline tier", ttl_seconds=10)
+            now = time.time()
+            with sqlite3.connect(db_path) as conn:
+                conn.execute(
+                    "UPDATE query_cache SET created_at = ?",
+                    (datetime.fromtimestamp(now - 8, tz=timezone.utc).isoformat(),),
+                )
+                conn.commit()
+            clear_result_cache()
+            semantic_search_documents(db_path, "deadline tier", ttl_seconds=10)
+            self.assertEqual(result_cache_stats()["sqlite_hits"], 1)
+
+            # 13 seconds after the row was written, the promoted copy has expired too.
+            with mock.patch("markdownkeeper.storage.repository.time.time", return_value=now + 5):
+                semantic_search_documents(db_path, "deadline tier", ttl_seconds=10)
+            stats = result_cache_stats()
+            self.assertEqual((stats["memory_hits"], stats["sqlite_hits"], stats["misses"]), (0, 1, 1))
+
+    def test_cache_limits_evict_least_recently_used_entries(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / "index.db"
+            initialize_database(db_path)
+            upsert_document(db_path, Path(tmp) / "a.md", parse_markdown("# Limits\nalpha beta gamma"))
+            clear_result_cache()
+            config = CacheConfig(max_entries=2, memory_max_entries=2)
+            for query in ("alpha", "beta", "gamma"):
+                semantic_search_documents(db_path, query, cache_config=config)
+
+            stats = result_cache_stats()
+            self.assertEqual(stats["memory_entries"], 2)
+            self.assertEqual(stats["memory_evictions"], 1)
+            self.assertEqual(stats["sqlite_evictions"], 1)
+            with sqlite3.connect(db_path) as conn:
+                cached = {row[0] for row in conn.execute("SELECT query_text FROM query_cache")}
+            self.assertEqual(cached, {"beta", "gamma"})
+
+            tiny = CacheConfig(memory_max_bytes=1)
+            semantic_search_documents(db_path, "delta alpha", cache_config=tiny)
+            self.assertEqual(result_cache_stats()["memory_entries"], 2)
+
+            clear_result_cache()
+            stored = system_stats(db_path)["cache"]
+            self.assertEqual(stored["memory_evictions"], 1)
+            self.assertGreaterEqual(stored["sqlite_evictions"], 1)
+
+    def test_disabled_cache_config_bypasses_both_tiers(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / "index.db"
+            initialize_database(db_path)
+            upsert_document(db_path, Path(tmp) / "a.md", parse_markdown("# Off\ncache off"))
+            clear_result_cache()
+            config = CacheConfig(enabled=False)
+            semantic_search_documents(db_path, "cache off", cache_config=config)
+            semantic_search_documents(db_path, "cache off", cache_config=config)
             with sqlite3.connect(db_path) as conn:
                 count = conn.execute("SELECT COUNT(*) FROM query_cache").fetchone()[0]
             self.assertEqual(count, 0)
+            self.assertEqual(result_cache_stats()["memory_entries"], 0)
 
     def test_cache_invalidated_on_delete(self) -> None:
         with tempfile.TemporaryDirectory() as tmp:
@@ -469,10 +1491,11 @@ class QueryCacheTests(unittest.TestCase):
             semantic_search_documents(db_path, "deletable")
 
             delete_document_by_path(db_path, md)
+            semantic_search_documents(db_path, "deletable")
 
             with sqlite3.connect(db_path) as conn:
-                count = conn.execute("SELECT COUNT(*) FROM query_cache").fetchone()[0]
-            self.assertEqual(count, 0)
+                row = conn.execute("SELECT result_json FROM query_cache WHERE query_text = 'deletable'").fetchone()
+            self.assertEqual(json.loads(row[0])["document_ids"], [])
 
     def test_cache_ttl_expired_entry_ignored(self) -> None:
         with tempfile.TemporaryDirectory() as tmp:
@@ -484,10 +1507,11 @@ class QueryCacheTests(unittest.TestCase):
 
             semantic_search_documents(db_path, "ttl test")
 
-            # Manually backdate the cache entry
+            # Manually backdate the cache entry; the in-process tier keeps its own clock.
             with sqlite3.connect(db_path) as conn:
                 conn.execute("UPDATE query_cache SET created_at = '2020-01-01T00:00:00+00:00'")
                 conn.commit()
+            clear_result_cache()
 
             # Search again — should not use expired cache (re-executes search)
             results = semantic_search_documents(db_path, "ttl test")
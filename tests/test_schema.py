@@ -8,10 +8,12 @@ SRC = ROOT / "src"
 if str(SRC) not in sys.path:
     sys.path.insert(0, str(SRC))
 
+import json
 import sqlite3
 import tempfile
 import unittest
 
+from markdownkeeper.storage.codec import decode_embedding
 from markdownkeeper.storage.schema import initialize_database
 
 
@@ -42,6 +44,7 @@ class SchemaTests(unittest.TestCase):
                 "document_chunks",
                 "embeddings",
                 "query_cache",
+                "document_changes",
             }.issubset(tables)
         )
 
@@ -99,6 +102,40 @@ class SchemaTests(unittest.TestCase):
 
         self.assertTrue({"updated_at", "attempts", "last_error"}.issubset(columns))
 
+    def test_initialize_database_migrates_query_cache_columns(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / ".markdownkeeper" / "index.db"
+            db_path.parent.mkdir(parents=True, exist_ok=True)
+            with sqlite3.connect(db_path) as connection:
+                connection.execute(
+                    """
+                    CREATE TABLE query_cache (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        query_hash TEXT NOT NULL UNIQUE,
+                        query_text TEXT NOT NULL,
+                        result_json TEXT NOT NULL,
+                        created_at TEXT NOT NULL,
+                        hit_count INTEGER DEFAULT 0,
+                        last_accessed TEXT
+                    )
+                    """
+                )
+                connection.execute(
+                    "INSERT INTO query_cache(query_hash, query_text, result_json, created_at) VALUES('h', 'q', '{}', 'now')"
+                )
+                connection.commit()
+
+            initialize_database(db_path)
+
+            with sqlite3.connect(db_path) as connection:
+                generation, min_score = connection.execute(
+                    "SELECT generation, min_score FROM query_cache"
+                ).fetchone()
+
+        # Entries cached before generations existed are treated as stale.
+        self.assertEqual(generation, -1)
+        self.assertIsNone(min_score)
+
 
     def test_initialize_database_migrates_chunk_embedding_column(self) -> None:
         with tempfile.TemporaryDirectory() as tmp:
@@ -140,6 +177,79 @@ class SchemaTests(unittest.TestCase):
 
         self.assertIn("embedding", columns)
 
+    def test_initialize_database_converts_json_embeddings_to_blobs(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / ".markdownkeeper" / "index.db"
+            initialize_database(db_path)
+            with sqlite3.connect(db_path) as connection:
+                connection.execute(
+                    "INSERT INTO documents(id, path, updated_at) VALUES(1, '/a.md', '2026-01-01T00:00:00+00:00')"
+                )
+                connection.execute(
+                    "INSERT INTO embeddings(document_id, embedding, model_name) VALUES(1, ?, 'token-hash-v1')",
+                    (json.dumps([0.5, 0.5]),),
+                )
+                connection.execute(
+                    """
+                    INSERT INTO document_chunks(document_id, chunk_index, heading_path, content, token_count, embedding)
+                    VALUES(1, 0, '', 'text', 1, ?), (1, 1, '', 'text', 1, 'not json')
+                    """,
+                    (json.dumps([1.0, 0.0]),),
+                )
+                connection.execute("PRAGMA user_version = 0")
+                connection.commit()
+
+            initialize_database(db_path)
+
+            with sqlite3.connect(db_path) as connection:
+                doc_blob = connection.execute("SELECT embedding FROM embeddings").fetchone()[0]
+                chunk_rows = connection.execute(
+                    "SELECT embedding FROM document_chunks ORDER BY chunk_index"
+                ).fetchall()
+
+        vector, model = decode_embedding(doc_blob)
+        self.assertEqual([float(v) for v in vector], [0.5, 0.5])
+        self.assertEqual(model, "token-hash-v1")
+        chunk_vector, chunk_model = decode_embedding(chunk_rows[0][0])
+        self.assertEqual([float(v) for v in chunk_vector], [1.0, 0.0])
+        self.assertEqual(chunk_model, "token-hash-v1")
+        self.assertIsNone(chunk_rows[1][0])
+
+    def test_initialize_database_indexes_existing_documents_for_full_text_search(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / ".markdownkeeper" / "index.db"
+            db_path.parent.mkdir(parents=True, exist_ok=True)
+            with sqlite3.connect(db_path) as connection:
+                connection.execute(
+                    """
+                    CREATE TABLE documents (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        path TEXT NOT NULL UNIQUE,
+                        title TEXT,
+                        summary TEXT,
+                        category TEXT,
+                        content TEXT,
+                        updated_at TEXT NOT NULL
+                    )
+                    """
+                )
+                connection.execute(
+                    "INSERT INTO documents(path, title, summary, updated_at) VALUES('/a.md', 'Zebra', '', 'now')"
+                )
+                connection.commit()
+
+            initialize_database(db_path)
+
+            with sqlite3.connect(db_path) as connection:
+                rows = connection.execute(
+                    "SELECT rowid FROM documents_fts WHERE documents_fts MATCH 'zebra'"
+                ).fetchall()
+                trigram_rows = connection.execute(
+                    "SELECT rowid FROM documents_trigram WHERE documents_trigram MATCH 'ebr'"
+                ).fetchall()
+        self.assertEqual(rows, [(1,)])
+        self.assertEqual(trigram_rows, [(1,)])
+
 
 if __name__ == "__main__":
     unittest.main()
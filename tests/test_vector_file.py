@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+from pathlib import Path
+import sys
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+import os
+import stat
+import tempfile
+import unittest
+
+from markdownkeeper.query.vector_store import VectorMatrix
+from markdownkeeper.storage.vector_file import open_vector_file, read_vector_file_header, write_vector_file
+
+
+def _matrices(precision: str) -> tuple[VectorMatrix, VectorMatrix]:
+    documents = VectorMatrix(precision)
+    documents.set(1, [1.0, 0.0, 0.0])
+    documents.set(2, [0.0, 0.6, 0.8])
+    chunks = VectorMatrix(precision)
+    chunks.set(10, [0.5, 0.5, 0.0], owner=1)
+    chunks.set(11, [0.0, 0.0, 1.0], owner=2)
+    chunks.set(12, [0.9, 0.1, 0.0], owner=2)
+    return documents, chunks
+
+
+class VectorFileTests(unittest.TestCase):
+    def test_round_trip_maps_rows_keys_and_owners(self) -> None:
+        for precision in ("float32", "float16", "int8"):
+            with tempfile.TemporaryDirectory() as tmp:
+                path = Path(tmp) / "vectors.bin"
+                documents, chunks = _matrices(precision)
+                write_vector_file(path, documents, chunks, generation=7, token=b"t" * 16)
+
+                header = read_vector_file_header(path)
+                assert header is not None
+                self.assertEqual((header.precision, header.dimensions, header.generation), (precision, 3, 7))
+                mapped = open_vector_file(path)
+                assert mapped is not None
+                self.assertEqual(mapped.header.token, b"t" * 16)
+                self.assertEqual(mapped.documents.keys(), [1, 2])
+                self.assertEqual(mapped.chunks.owners(), [1, 2, 2])
+                query = [0.6, 0.0, 0.8]
+                for key, score in documents.score_by_key(query).items():
+                    self.assertAlmostEqual(mapped.documents.score_by_key(query)[key], score, places=5)
+                for owner, score in chunks.max_score_by_owner(query).items():
+                    self.assertAlmostEqual(mapped.chunks.max_score_by_owner(query)[owner], score, places=5)
+
+    @unittest.skipIf(os.name != "posix", "file modes are POSIX-only")
+    def test_written_file_is_readable_by_other_users_under_the_umask(self) -> None:
+        umask = os.umask(0o022)
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                path = Path(tmp) / "vectors.bin"
+                write_vector_file(path, *_matrices("float32"), generation=1, token=b"t" * 16)
+                self.assertEqual(stat.S_IMODE(path.stat().st_mode), 0o644)
+        finally:
+            os.umask(umask)
+
+    def test_mapped_matrix_changes_stay_private(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "vectors.bin"
+            documents, chunks = _matrices("float32")
+            write_vector_file(path, documents, chunks, generation=1, token=b"")
+            mapped = open_vector_file(path)
+            assert mapped is not None
+            mapped.documents.remove(1)
+            mapped.documents.set(3, [0.0, 1.0, 0.0])
+            mapped.chunks.remove_owner(2)
+
+            reopened = open_vector_file(path)
+            assert reopened is not None
+            self.assertEqual(sorted(mapped.documents.keys()), [2, 3])
+            self.assertEqual(mapped.chunks.keys(), [10])
+            self.assertEqual(reopened.documents.keys(), [1, 2])
+            self.assertEqual(len(reopened.chunks), 3)
+
+    def test_missing_or_corrupt_files_are_rejected(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "vectors.bin"
+            self.assertIsNone(open_vector_file(path))
+            path.write_bytes(b"MKVF" + b"\0" * 10)
+            self.assertIsNone(read_vector_file_header(path))
+            documents, chunks = _matrices("float32")
+            write_vector_file(path, documents, chunks, generation=1, token=b"")
+            path.write_bytes(path.read_bytes()[:-8])
+            self.assertIsNone(open_vector_file(path))
+
+            write_vector_file(path, VectorMatrix(), VectorMatrix(), generation=0, token=b"")
+            empty = open_vector_file(path)
+            assert empty is not None
+            self.assertEqual(len(empty.documents), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
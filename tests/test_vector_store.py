@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+from pathlib import Path
+import sys
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+from array import array
+import unittest
+from unittest import mock
+
+from markdownkeeper.query.vector_store import VectorMatrix, is_numpy_available
+
+
+class VectorMatrixTests(unittest.TestCase):
+    def test_scores_match_dot_product_per_key(self) -> None:
+        matrix = VectorMatrix()
+        matrix.set(1, [1.0, 0.0, 0.0])
+        matrix.set(2, [0.0, 1.0, 0.0])
+        matrix.set(3, [0.6, 0.8, 0.0])
+
+        scores = matrix.score_by_key([1.0, 0.0, 0.0])
+        self.assertAlmostEqual(scores[1], 1.0, places=5)
+        self.assertAlmostEqual(scores[2], 0.0, places=5)
+        self.assertAlmostEqual(scores[3], 0.6, places=5)
+
+    def test_set_replaces_existing_row(self) -> None:
+        matrix = VectorMatrix()
+        matrix.set(1, [1.0, 0.0])
+        matrix.set(1, [0.0, 1.0])
+        self.assertEqual(len(matrix), 1)
+        self.assertAlmostEqual(matrix.score_by_key([0.0, 1.0])[1], 1.0, places=5)
+
+    def test_remove_keeps_remaining_rows_addressable(self) -> None:
+        matrix = VectorMatrix()
+        for key in range(1, 6):
+            matrix.set(key, [float(key), 0.0])
+        self.assertTrue(matrix.remove(2))
+        self.assertFalse(matrix.remove(2))
+
+        scores = matrix.score_by_key([1.0, 0.0])
+        self.assertEqual(sorted(scores), [1, 3, 4, 5])
+        for key, score in scores.items():
+            self.assertAlmostEqual(score, float(key), places=5)
+
+    def test_max_score_by_owner_groups_rows(self) -> None:
+        matrix = VectorMatrix()
+        matrix.set(10, [1.0, 0.0], owner=1)
+        matrix.set(11, [0.5, 0.5], owner=1)
+        matrix.set(20, [0.0, 1.0], owner=2)
+
+        best = matrix.max_score_by_owner([1.0, 0.0])
+        self.assertAlmostEqual(best[1], 1.0, places=5)
+        self.assertAlmostEqual(best[2], 0.0, places=5)
+
+        self.assertEqual(matrix.remove_owner(1), 2)
+        self.assertEqual(matrix.keys(), [20])
+
+    def test_top_k_returns_best_keys_in_order(self) -> None:
+        matrix = VectorMatrix()
+        for key, value in ((1, 0.1), (2, 0.9), (3, 0.5), (4, 0.7)):
+            matrix.set(key, [value, 0.0])
+
+        top = matrix.top_k([1.0, 0.0], 2)
+        self.assertEqual([key for key, _ in top], [2, 4])
+        self.assertAlmostEqual(top[0][1], 0.9, places=5)
+        self.assertEqual([key for key, _ in matrix.top_k([1.0, 0.0], 10)], [2, 4, 3, 1])
+        self.assertEqual(matrix.top_k([1.0, 0.0, 0.0], 2), [])
+
+    def test_batched_scores_match_single_query_scores(self) -> None:
+        matrix = VectorMatrix()
+        matrix.set(10, [1.0, 0.0], owner=1)
+        matrix.set(11, [0.6, 0.8], owner=1)
+        matrix.set(20, [0.0, 1.0], owner=2)
+        queries = [[1.0, 0.0], [0.0, 1.0], [0.5, 0.5]]
+
+        by_key = matrix.score_by_key_many(queries)
+        by_owner = matrix.max_score_by_owner_many(queries)
+        self.assertEqual(len(by_key), 3)
+        for query, keyed, owned in zip(queries, by_key, by_owner):
+            for key, score in matrix.score_by_key(query).items():
+                self.assertAlmostEqual(keyed[key], score, places=5)
+            for owner, score in matrix.max_score_by_owner(query).items():
+                self.assertAlmostEqual(owned[owner], score, places=5)
+        self.assertEqual(matrix.score_by_key_many([]), [])
+        self.assertEqual(VectorMatrix().max_score_by_owner_many(queries), [{}, {}, {}])
+
+    def test_mismatched_dimensions_are_rejected(self) -> None:
+        matrix = VectorMatrix()
+        self.assertTrue(matrix.set(1, [1.0, 0.0]))
+        self.assertFalse(matrix.set(2, [1.0, 0.0, 0.0]))
+        self.assertFalse(matrix.set(3, []))
+        self.assertEqual(len(matrix), 1)
+        self.assertEqual(matrix.scores([1.0, 0.0, 0.0]), [0.0])
+
+    def test_quantized_precisions_score_close_to_float32(self) -> None:
+        rows = {1: [0.9, 0.1, -0.3], 2: [-0.2, 0.7, 0.4], 3: [0.5, -0.5, 0.5], 4: [0.0, 0.2, -0.9]}
+        query = [0.6, -0.2, 0.3]
+        exact = VectorMatrix()
+        for key, vector in rows.items():
+            exact.set(key, vector, owner=key % 2)
+        expected = exact.score_by_key(query)
+        for precision in ("float16", "int8"):
+            matrix = VectorMatrix(precision)
+            for key, vector in rows.items():
+                matrix.set(key, vector, owner=key % 2)
+            matrix.remove(2)
+            matrix.set(2, rows[2], owner=0)
+            self.assertEqual(matrix.precision, precision)
+            self.assertLess(matrix.nbytes, exact.nbytes)
+            for key, score in matrix.score_by_key(query).items():
+                self.assertAlmostEqual(score, expected[key], delta=0.02)
+            self.assertEqual([key for key, _ in matrix.top_k(query, 2)], [key for key, _ in exact.top_k(query, 2)])
+            self.assertAlmostEqual(matrix.max_score_by_owner(query)[1], exact.max_score_by_owner(query)[1], delta=0.02)
+            self.assertAlmostEqual(matrix.score_keys(query, [3])[3], expected[3], delta=0.02)
+            self.assertEqual(len(matrix.buffer()), len(exact.buffer()))
+        with self.assertRaises(ValueError):
+            VectorMatrix("float64")
+
+    def test_float16_scores_without_numpy(self) -> None:
+        rows = {1: [0.9, 0.1, -0.3], 2: [-0.2, 0.7, 0.4], 3: [0.5, -0.5, 0.5]}
+        query = [0.6, -0.2, 0.3]
+        with mock.patch("markdownkeeper.query.vector_store.np", None):
+            matrix = VectorMatrix("float16")
+            for key, vector in rows.items():
+                matrix.set(key, vector, owner=1 if key < 3 else 3)
+            scores = matrix.score_by_key(query)
+            many = matrix.score_by_key_many([query])[0]
+            owners = matrix.max_score_by_owner(query)
+            mapped = VectorMatrix.from_buffer("float16", 3, matrix.keys(), matrix.owners(), matrix.raw_rows())
+            mapped_scores = mapped.score_by_key(query)
+            widened = array("f", bytes(matrix.buffer()))
+        for key, vector in rows.items():
+            expected = sum(a * b for a, b in zip(vector, query))
+            self.assertAlmostEqual(scores[key], expected, delta=0.005)
+            self.assertAlmostEqual(many[key], expected, delta=0.005)
+            self.assertAlmostEqual(mapped_scores[key], expected, delta=0.005)
+        self.assertAlmostEqual(owners[1], max(scores[1], scores[2]), places=6)
+        self.assertEqual(len(widened), 9)
+        self.assertAlmostEqual(widened[0], 0.9, delta=0.001)
+
+    def test_is_numpy_available_returns_bool(self) -> None:
+        self.assertIsInstance(is_numpy_available(), bool)
+
+
+if __name__ == "__main__":
+    unittest.main()